@@ -0,0 +1,54 @@
+"""
+Exports the prompt-injection signatures defined in the harness payload
+set as a rules file for the policy service.
+
+Run from the repository root:
+    python3 data/scripts/export_policy_rules.py
+"""
+
+import json
+import argparse
+import sys
+from pathlib import Path
+
+# Allow importing the harness package when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from harness.attacks.pi.payloads import get_signatures
+
+
+def build_rules():
+    """
+    One rule per distinct signature, listing every generator that emits it.
+    """
+    sources = {}
+    for generator, signatures in get_signatures().items():
+        for signature in signatures:
+            sources.setdefault(signature, []).append(generator)
+
+    return [
+        {
+            "id": f"pi-{index:03d}",
+            "pattern": pattern,
+            "category": "prompt_injection",
+            "sources": generators,
+            "action": "block",
+        }
+        for index, (pattern, generators) in enumerate(sources.items(), start=1)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", type=str, default="services/policy/rules/default_rules.json")
+    args = parser.parse_args()
+
+    rules = build_rules()
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump({"version": 1, "rules": rules}, f, indent=2)
+        f.write("\n")
+
+    print(f"Exported {len(rules)} rules to {args.output}")
@@ -69,6 +69,7 @@ class PromptInjectionExperiment(BaseExperiment, ABC):
                         "k": 1,
                         "topology": self.config["topology"],
                         "profile": self.config["profile"],
+                        "collection": self.collection,
                     },
                     timeout=90,
                 )
@@ -1,6 +1,7 @@
+import json
+import time
 from abc import ABC, abstractmethod
 import requests
-import time
 
 
 class BaseExperiment(ABC):
@@ -10,6 +11,9 @@ class BaseExperiment(ABC):
         self.retriever_host = "http://localhost:8001"
         self.gateway_host = "http://localhost:8000"
 
+        # Each run can target its own collection so experiments share the stack
+        self.collection = config.get("collection", "default")
+
     @abstractmethod
     def run(self):
         """
@@ -17,16 +21,47 @@ class BaseExperiment(ABC):
         """
         pass
 
+    def wait_until_ready(self, timeout=300):
+        """
+        Waits for the ingestion and retriever services to report ready,
+        i.e. their models are loaded and warmed up, so the first timed
+        requests of a run do not pay for service startup.
+        """
+        deadline = time.monotonic() + timeout
+
+        for host in (self.ingest_host, self.retriever_host):
+            while True:
+                try:
+                    if requests.get(f"{host}/health/ready", timeout=5).status_code == 200:
+                        break
+                except requests.RequestException:
+                    pass
+
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"{host} not ready after {timeout}s")
+                time.sleep(2)
+
     def reset_and_ingest(self, documents):
         """
-        Resets the vector database and ingests a new set of documents.
+        Resets the experiment's collection and ingests a new set of documents.
         """
+        self.wait_until_ready()
 
-        # Reset the vector database
+        # Highest change-feed generation produced by this call
+        generation = 0
+
+        # Reset only this experiment's collection
         reset_url = f"{self.ingest_host}/reset"
         try:
-            response = requests.post(reset_url, timeout=10)
-            response.raise_for_status()
+            # Collections are created on first ingest, so a missing one is already clean
+            response = requests.post(
+                reset_url,
+                params={"collection": self.collection},
+                timeout=10,
+            )
+            if response.status_code != 404:
+                response.raise_for_status()
+                generation = response.json().get("generation", 0)
         except Exception as exc:
             print(f"Critical error: failed to reset database. Error: {exc}")
             raise
@@ -38,6 +73,7 @@ class BaseExperiment(ABC):
         for start in range(0, len(documents), batch_size):
             batch = documents[start:start + batch_size]
             payload = {
+                "collection": self.collection,
                 "documents": [
                     {
                         "id": doc["id"],
@@ -55,20 +91,49 @@ class BaseExperiment(ABC):
                     timeout=30,
                 )
                 response.raise_for_status()
+                generation = max(generation, response.json().get("generation", 0))
             except Exception as exc:
                 print(f"Ingestion failed for batch starting at index {start}. Error: {exc}")
                 raise
 
-        # Notify the retriever to refresh its index so new documents are visible
+        # Block until the retriever has applied every change made above
         try:
-            requests.post(
-                f"{self.retriever_host}/refresh",
-                timeout=5,
+            response = requests.post(
+                f"{self.retriever_host}/wait",
+                json={
+                    "generation": generation,
+                    "collection": self.collection,
+                    "timeout": 60,
+                },
+                timeout=65,
             )
-            # Allow time for the background index build to complete
-            time.sleep(0.5)
+            response.raise_for_status()
         except Exception as exc:
-            # Index refresh failure should not abort the experiment
-            print(f"Warning: failed to refresh retriever index: {exc}")
+            # Index sync failure should not abort the experiment
+            print(f"Warning: retriever index not confirmed up to date: {exc}")
 
         print("Ingestion and indexing completed successfully.")
+
+    def chat_batch(self, chat_requests, timeout=600):
+        """
+        Sends many chat requests through the gateway's /chat/batch endpoint.
+        Each request must carry a unique "id". Returns a dict mapping each
+        id to its result line ({"status", "response"} or {"status", "detail"}).
+        """
+        results = {}
+
+        with requests.post(
+            f"{self.gateway_host}/chat/batch",
+            json={"requests": chat_requests},
+            stream=True,
+            timeout=timeout,
+        ) as response:
+            response.raise_for_status()
+
+            # Results arrive as NDJSON in completion order
+            for line in response.iter_lines():
+                if line:
+                    result = json.loads(line)
+                    results[result["id"]] = result
+
+        return results
@@ -1,7 +1,6 @@
 import os
 import random
 import pandas as pd
-import requests
 from abc import ABC
 from tqdm import tqdm
 
@@ -61,6 +60,7 @@ class UnifiedPIExperiment(BaseExperiment, ABC):
         if not target_samples or not injected_samples:
             return
 
+        attacks = []
         for idx, (target_item, injected_item) in enumerate(zip(target_samples, injected_samples)):
             name, generator = self.payload_generators[idx % len(self.payload_generators)]
 
@@ -69,62 +69,63 @@ class UnifiedPIExperiment(BaseExperiment, ABC):
             full_injection = f"{injected_instruction} {injected_text}"
 
             poisoned_context = generator.inject(full_injection)
+            attacks.append((injected_item, poisoned_context, name))
+
+        # Golden and attack runs for the whole pair go out as one batch
+        chat_requests = []
+        for idx, (injected_item, poisoned_context, _) in enumerate(attacks):
+            chat_requests.append({
+                "id": f"golden-{idx}",
+                "system_prompt": TASK_CONFIGS[injected_task]["instruction"],
+                "query": f"Context: {injected_item['text']}",
+                "topology": "pi",
+                "profile": self.config["profile"],
+            })
+            chat_requests.append({
+                "id": f"attack-{idx}",
+                "system_prompt": TASK_CONFIGS[target_task]["instruction"],
+                "query": f"Context: {poisoned_context}",
+                "topology": "pi",
+                "profile": self.config["profile"],
+            })
+
+        try:
+            responses = self.chat_batch(chat_requests)
+        except Exception as exc:
+            print(f"Error executing {target_task}-{injected_task}: {exc}")
+            return
+
+        for idx, (injected_item, _, name) in enumerate(attacks):
+            golden = responses.get(f"golden-{idx}", {})
+            attack = responses.get(f"attack-{idx}", {})
 
-            self._execute_chat(
+            if attack.get("status") != 200:
+                print(
+                    f"Error executing {target_task}-{injected_task}: "
+                    f"{attack.get('status')} {attack.get('detail')}"
+                )
+                continue
+
+            self._evaluate_attack(
                 target_task=target_task,
                 injected_task=injected_task,
-                target_item=target_item,
                 injected_item=injected_item,
-                poisoned_context=poisoned_context,
+                attack_output=attack["response"].get("response", ""),
+                golden_response=(
+                    golden["response"].get("response", "")
+                    if golden.get("status") == 200
+                    else None
+                ),
                 attack_method=name,
             )
 
-    def _execute_chat(self, target_task, injected_task, target_item, injected_item, poisoned_context, attack_method):
+    def _evaluate_attack(self, target_task, injected_task, injected_item, attack_output, golden_response, attack_method):
         """
-        Performs the two-step evaluation:
+        Scores one attack run against the golden run:
         1. Golden run for injected-task capability.
         2. Attack run with target task as system and poisoned context as user.
         """
         try:
-            golden_response = None
-
-            # Golden run (only needed for generative injected tasks)
-            try:
-                golden_req = {
-                    "system_prompt": TASK_CONFIGS[injected_task]["instruction"],
-                    "query": f"Context: {injected_item['text']}",
-                    "topology": "pi",
-                    "profile": self.config["profile"],
-                }
-
-                golden_res = requests.post(
-                    f"{self.gateway_host}/chat",
-                    json=golden_req,
-                    timeout=120,
-                )
-
-                if golden_res.status_code == 200:
-                    golden_response = golden_res.json().get("response", "")
-
-            except Exception:
-                pass
-
-            attack_req = {
-                "system_prompt": TASK_CONFIGS[target_task]["instruction"],
-                "query": f"Context: {poisoned_context}",
-                "topology": "pi",
-                "profile": self.config["profile"],
-            }
-
-            attack_res = requests.post(
-                f"{self.gateway_host}/chat",
-                json=attack_req,
-                timeout=120,
-            )
-            attack_res.raise_for_status()
-
-            attack_output = attack_res.json().get("response", "")
-
             # Label normalization
             raw_label = injected_item.get("label")
             label_map = TASK_CONFIGS[injected_task].get("label_map")
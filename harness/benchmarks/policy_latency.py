@@ -0,0 +1,138 @@
+import os
+import time
+import uuid
+import numpy as np
+import pandas as pd
+import requests
+import fire
+from tqdm import tqdm
+
+
+class PolicyLatencyBenchmark:
+    """
+    Measures /inspect/batch latency of the policy service as batch size
+    grows, with the embedding classifier enabled.
+
+    "vectors" sends the query vector with each item, as the gateway does
+    after retrieval; "encode" leaves it out so the policy service encodes
+    all queries of the batch in one retriever call. Every document is
+    new, so its signature scan and classification are always measured.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.policy_host = config["policy_host"]
+        self.rng = np.random.default_rng(config["seed"])
+
+    def run(self):
+        stats = requests.get(f"{self.policy_host}/stats", timeout=10).json()
+        classifier = stats.get("classifier")
+        if classifier is None:
+            raise RuntimeError("Policy classifier is not loaded yet")
+        dimension = classifier["dimension"]
+
+        results = []
+        for batch_size in tqdm(self.config["batch_sizes"], desc="Batch sizes"):
+            for mode in self.config["modes"]:
+                for round_index in range(self.config["rounds"]):
+                    payload = self._payload(batch_size, dimension, mode)
+                    latency, status = self._send(payload)
+                    results.append(
+                        {
+                            "batch_size": batch_size,
+                            "mode": mode,
+                            "round": round_index,
+                            "status": status,
+                            "latency": latency,
+                            "per_item_ms": 1000 * latency / batch_size,
+                        }
+                    )
+
+        self._report(pd.DataFrame(results))
+
+    def _vector(self, dimension):
+        vector = self.rng.standard_normal(dimension)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _payload(self, batch_size, dimension, mode):
+        items = []
+        for _ in range(batch_size):
+            item = {
+                "query": f"What does the report say about topic {uuid.uuid4().hex[:8]}?",
+                "documents": [
+                    {
+                        "id": f"doc-{uuid.uuid4().hex[:8]}",
+                        "hash": uuid.uuid4().hex,
+                        "content": f"Synthetic passage {uuid.uuid4().hex}. " * 20,
+                        "embedding": self._vector(dimension),
+                    }
+                    for _ in range(self.config["documents"])
+                ],
+            }
+            if mode == "vectors":
+                item["query_embedding"] = self._vector(dimension)
+            items.append(item)
+        return {"items": items}
+
+    def _send(self, payload):
+        start_time = time.time()
+        try:
+            response = requests.post(
+                f"{self.policy_host}/inspect/batch",
+                json=payload,
+                timeout=60,
+            )
+            status = response.status_code
+        except Exception as exc:
+            print(f"Request failed: {exc}")
+            status = None
+
+        return time.time() - start_time, status
+
+    def _report(self, df):
+        ok = df[df["status"] == 200]
+        summary = ok.groupby(["batch_size", "mode"]).agg(
+            p50=("latency", "median"),
+            p95=("latency", lambda s: s.quantile(0.95)),
+            per_item_ms=("per_item_ms", "median"),
+        )
+
+        print("\nPolicy /inspect/batch latency (seconds):")
+        print(summary.round(4).to_string())
+
+        os.makedirs(self.config["output_dir"], exist_ok=True)
+        csv_path = f"{self.config['output_dir']}/benchmark_policy_latency.csv"
+        df.to_csv(csv_path, index=False)
+
+        print(f"Results saved to: {csv_path}")
+
+
+def main(
+    batch_sizes=(1, 8, 32, 128),
+    modes=("vectors", "encode"),
+    documents=3,
+    rounds=20,
+    seed=42,
+    policy_host="http://localhost:8002",
+    output_dir="results",
+):
+    if isinstance(batch_sizes, str):
+        batch_sizes = batch_sizes.split(",")
+    if isinstance(modes, str):
+        modes = modes.split(",")
+
+    config = {
+        "batch_sizes": [int(size) for size in batch_sizes],
+        "modes": list(modes),
+        "documents": documents,
+        "rounds": rounds,
+        "seed": seed,
+        "policy_host": policy_host,
+        "output_dir": output_dir,
+    }
+
+    PolicyLatencyBenchmark(config).run()
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import requests
+import pandas as pd
+import fire
+from tqdm import tqdm
+
+from harness.attacks.pi.base_experiment import BaseExperiment
+
+
+class TopologyLatencyBenchmark(BaseExperiment):
+    """
+    Compares end-to-end /chat latency across gateway topologies.
+
+    Requests alternate between topologies so drift in LLM load affects
+    every topology equally. Each request uses its own seed, so no two
+    requests share an LLM cache entry.
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.topologies = config["topologies"]
+
+    def run(self):
+        with open(self.config["corpus"], "r") as f:
+            documents = json.load(f)["documents"]
+
+        print(f"Ingesting {len(documents)} documents into '{self.collection}'...")
+        self.reset_and_ingest(documents)
+
+        queries = [
+            f"What is the specific fact ID in the document about {doc['metadata']['topic']}?"
+            for doc in documents
+        ][: self.config["limit"]]
+
+        results = []
+        seed = self.config["seed"]
+
+        # Warm up connection pools and model weights before measuring
+        for topology in self.topologies:
+            self._send(queries[0], topology, seed=-1)
+
+        for round_index in tqdm(range(self.config["rounds"]), desc="Rounds"):
+            for query in queries:
+                for topology in self.topologies:
+                    seed += 1
+                    latency, status = self._send(query, topology, seed)
+                    results.append(
+                        {
+                            "round": round_index,
+                            "topology": topology,
+                            "query": query,
+                            "status": status,
+                            "latency": latency,
+                        }
+                    )
+
+        self._report(pd.DataFrame(results))
+
+    def _send(self, query, topology, seed):
+        start_time = time.time()
+        try:
+            response = requests.post(
+                f"{self.gateway_host}/chat",
+                json={
+                    "query": query,
+                    "topology": topology,
+                    "profile": self.config["profile"],
+                    "collection": self.collection,
+                    "seed": seed,
+                },
+                timeout=90,
+            )
+            status = response.status_code
+        except Exception as exc:
+            print(f"Request failed (topology={topology}): {exc}")
+            status = None
+
+        return time.time() - start_time, status
+
+    def _report(self, df):
+        ok = df[df["status"] == 200]
+        summary = ok.groupby("topology")["latency"].describe(percentiles=[0.5, 0.95, 0.99])
+        summary["errors"] = df[df["status"] != 200].groupby("topology").size()
+        summary["errors"] = summary["errors"].fillna(0).astype(int)
+
+        print("\nLatency by topology (seconds):")
+        print(summary.round(3).to_string())
+
+        os.makedirs(self.config["output_dir"], exist_ok=True)
+        csv_path = f"{self.config['output_dir']}/benchmark_topology_latency.csv"
+        df.to_csv(csv_path, index=False)
+
+        print(f"Results saved to: {csv_path}")
+
+
+def main(
+    topologies=("sequential", "parallel"),
+    corpus="data/corpus/synthetic.json",
+    profile="P1",
+    rounds=3,
+    limit=10,
+    seed=42,
+    output_dir="results",
+    collection="bench_topology",
+):
+    """
+    Disable the semantic cache for the benchmark profile, otherwise
+    paraphrased queries are answered without touching the LLM.
+    """
+    if isinstance(topologies, str):
+        topologies = topologies.split(",")
+
+    config = {
+        "topologies": list(topologies),
+        "corpus": corpus,
+        "profile": profile,
+        "rounds": rounds,
+        "limit": limit,
+        "seed": seed,
+        "output_dir": output_dir,
+        "collection": collection,
+    }
+
+    TopologyLatencyBenchmark(config).run()
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
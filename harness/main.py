@@ -10,12 +10,14 @@ EXPERIMENTS = {
 
 def main(
     attack="pi-direct",       # Attack family
+    defense="baseline",       # Recorded with results; the stack's POLICY_MODE must match
     payload_type="combined",  # Attack variant (PI-specific)
     topology="sequential",
     profile="P1",
     seed=42,
     limit=10,
     output_dir="results",
+    collection="default",
 ):
     # Validate selected attack
     if attack not in EXPERIMENTS:
@@ -25,12 +27,14 @@ def main(
     # Build experiment configuration
     config = {
         "attack_type": attack,
+        "defense": defense,
         "payload_type": payload_type,
         "topology": topology,
         "profile": profile,
         "seed": seed,
         "limit": limit,
         "output_dir": output_dir,
+        "collection": collection,
     }
 
     # Instantiate and run the selected experiment
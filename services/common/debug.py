@@ -0,0 +1,260 @@
+import os
+import gc
+import sys
+import hmac
+import time
+import types
+import asyncio
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------
+# Profiling and memory endpoints
+# ------------------------------------------------------------------
+#
+# GET /debug/profile samples every thread's Python stack for N seconds
+# from a background thread and returns the stacks in the folded format
+# read by flamegraph.pl, speedscope and inferno. Sampling only reads
+# frames, so the overhead is bounded by the interval, and one profile
+# runs at a time for at most DEBUG_PROFILE_MAX_SECONDS.
+#
+# GET /debug/memory reports process memory, tracemalloc's top
+# allocation sites while tracing is on (POST /debug/tracemalloc to
+# toggle it), and the sizes of the components the service registers,
+# such as indexes, caches and models.
+#
+# The endpoints answer 404 unless DEBUG_ENDPOINTS=true and DEBUG_TOKEN
+# is set (they stay off, with a warning, without a token), and 403
+# without a matching X-Debug-Token header.
+
+DEBUG_ENDPOINTS = os.getenv("DEBUG_ENDPOINTS", "false").lower() == "true"
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+DEBUG_PROFILE_MAX_SECONDS = float(os.getenv("DEBUG_PROFILE_MAX_SECONDS", "60"))
+
+# Most entries per list in /debug/memory
+DEBUG_MEMORY_MAX_TOP = 200
+
+if DEBUG_ENDPOINTS and not DEBUG_TOKEN:
+    logger.warning("DEBUG_ENDPOINTS is set without DEBUG_TOKEN; debug endpoints stay disabled.")
+
+# Leaf frames in these modules are threads waiting, not working
+IDLE_MODULES = ("selectors.py", "threading.py", "queue.py")
+
+# Objects visited per deep_size call, so sizing a huge index stays bounded
+DEEP_SIZE_LIMIT = 2_000_000
+
+_components: Dict[str, Callable[[], Any]] = {}
+_profile_lock = threading.Lock()
+
+
+def require_debug(x_debug_token: Optional[str] = Header(None)):
+    if not DEBUG_ENDPOINTS or not DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_debug_token or "", DEBUG_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+
+router = APIRouter(prefix="/debug", dependencies=[Depends(require_debug)])
+
+
+def register_component(name: str, describe: Callable[[], Any]):
+    """
+    Adds a component to /debug/memory. `describe` is called on request
+    (in a worker thread) and returns a JSON-serializable summary.
+    """
+    _components[name] = describe
+
+
+# ------------------------------------------------------------------
+# CPU profiling
+# ------------------------------------------------------------------
+
+def sample_stacks(seconds: float, interval: float, include_idle: bool) -> Counter:
+    """
+    Samples all other threads' stacks every `interval` seconds.
+    Returns folded stacks (root first, ';'-separated) with counts.
+    """
+    me = threading.get_ident()
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if not include_idle and os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            counts[";".join(reversed(stack))] += 1
+
+        time.sleep(interval)
+
+    return counts
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(seconds: float = 10.0, interval: float = 0.01, idle: bool = False):
+    """
+    Samples for `seconds` and returns folded stacks, one
+    "frame;frame;... count" line each, for flame graph tools.
+    """
+    if not 0 < seconds <= DEBUG_PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be in (0, {DEBUG_PROFILE_MAX_SECONDS:g}]",
+        )
+    interval = max(interval, 0.001)
+
+    if not _profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        logger.info(f"CPU profile started ({seconds:g}s, interval={interval:g}s).")
+        counts = await asyncio.to_thread(sample_stacks, seconds, interval, idle)
+    finally:
+        _profile_lock.release()
+
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+# ------------------------------------------------------------------
+# Memory
+# ------------------------------------------------------------------
+
+def process_memory() -> dict:
+    rss = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+
+        # ru_maxrss is in KiB on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        peak = None
+
+    return {
+        "rss_bytes": rss,
+        "peak_rss_bytes": peak,
+        "threads": threading.active_count(),
+        "gc_counts": gc.get_count(),
+    }
+
+
+def deep_size(obj: Any, limit: int = DEEP_SIZE_LIMIT) -> dict:
+    """
+    Approximate bytes reachable from `obj` (each object counted once),
+    by sys.getsizeof over gc referents. Modules, classes and functions
+    are not followed. Stops after `limit` objects.
+    """
+    seen = set()
+    pending = [obj]
+    total = 0
+
+    while pending and len(seen) < limit:
+        current = pending.pop()
+        if id(current) in seen or isinstance(
+            current, (type, types.ModuleType, types.FunctionType, types.MethodType)
+        ):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current, 0)
+        pending.extend(gc.get_referents(current))
+
+    return {"bytes": total, "objects": len(seen), "truncated": bool(pending)}
+
+
+def module_size(module: Any) -> dict:
+    """
+    Parameter and buffer bytes of a torch module (e.g. an embedding
+    model), which deep_size cannot see since tensor storage is native.
+    """
+    parameters = list(module.parameters())
+    return {
+        "parameters": sum(p.numel() for p in parameters),
+        "parameter_bytes": sum(p.numel() * p.element_size() for p in parameters),
+        "buffer_bytes": sum(b.numel() * b.element_size() for b in module.buffers()),
+    }
+
+
+def top_types(limit: int) -> list:
+    counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+    return [{"type": name, "count": count} for name, count in counts.most_common(limit)]
+
+
+def tracemalloc_report(limit: int) -> dict:
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+
+    current, peak = tracemalloc.get_traced_memory()
+    stats = tracemalloc.take_snapshot().statistics("lineno")
+    return {
+        "tracing": True,
+        "frames": tracemalloc.get_traceback_limit(),
+        "current_bytes": current,
+        "peak_bytes": peak,
+        "top": [
+            {"location": str(stat.traceback), "bytes": stat.size, "count": stat.count}
+            for stat in stats[:limit]
+        ],
+    }
+
+
+def memory_report(top: int, objects: bool) -> dict:
+    components = {}
+    for name, describe in _components.items():
+        try:
+            components[name] = describe()
+        except Exception as exc:
+            components[name] = {"error": str(exc)}
+
+    return {
+        "process": process_memory(),
+        "tracemalloc": tracemalloc_report(top),
+        "types": top_types(top) if objects else None,
+        "components": components,
+    }
+
+
+@router.get("/memory")
+async def memory(top: int = 20, objects: bool = False):
+    """
+    Process memory, tracemalloc top sites and component sizes. With
+    objects=true, also the most common object types (walks the heap).
+    """
+    top = max(1, min(top, DEBUG_MEMORY_MAX_TOP))
+    return await asyncio.to_thread(memory_report, top, objects)
+
+
+@router.post("/tracemalloc")
+async def toggle_tracemalloc(enable: bool = True, frames: int = 1):
+    """
+    Starts or stops tracemalloc. Tracing slows allocations down, so it
+    is off until asked for; more frames per trace cost more.
+    """
+    if enable and not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, min(frames, 25)))
+    elif not enable and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return {"tracing": tracemalloc.is_tracing()}
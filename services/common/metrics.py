@@ -0,0 +1,235 @@
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# ------------------------------------------------------------------
+# Live metrics
+# ------------------------------------------------------------------
+#
+# Counters, gauges and histograms kept in process and rendered in the
+# Prometheus text format by GET /metrics. Histograms use HDR-style
+# log-linear buckets: `per_octave` buckets between each power of two,
+# so every recorded value is known to within a fixed relative error
+# (about 19% at the default of 4) across the whole range. Finding a
+# bucket is one log2, and recording is an index increment under a
+# lock, cheap enough for every request and safe from worker threads.
+# Values outside the range land in the first or the +Inf bucket.
+#
+# Every label value set opens a new series (a histogram's is some 70
+# buckets), so label values must come from a small fixed set; callers
+# map anything client-supplied onto one first.
+
+LabelValues = Tuple[str, ...]
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+
+    def register(self, metric: "_Metric"):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+        if not self.labelnames:
+            self.labels()
+
+    def labels(self, *values: str):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._child())
+        return child
+
+    def remove(self, *values: str):
+        self._children.pop(tuple(str(value) for value in values), None)
+
+    def _child(self):
+        raise NotImplementedError
+
+    def _unlabelled(self):
+        return self.labels()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+# ------------------------------------------------------------------
+# Counters and gauges
+# ------------------------------------------------------------------
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """
+        Reads the value from `function` at scrape time instead.
+        """
+        self.function = function
+
+    def get(self) -> float:
+        return float(self.function()) if self.function is not None else self.value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._unlabelled().set_function(function)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_format(child.get())}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self._unlabelled().set(value)
+
+
+# ------------------------------------------------------------------
+# Histograms
+# ------------------------------------------------------------------
+
+class _Buckets:
+    def __init__(self, bounds: List[float], low: float, per_octave: int):
+        self.bounds = bounds
+        self.low = low
+        self.per_octave = per_octave
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        if value <= self.low:
+            index = 0
+        else:
+            index = math.ceil(math.log2(value / self.low) * self.per_octave - 1e-9)
+            # Float rounding can put a value just past its bucket bound
+            if index < len(self.bounds) and value > self.bounds[index]:
+                index += 1
+            index = min(index, len(self.bounds))
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        low: float = 1e-4,
+        high: float = 100.0,
+        per_octave: int = 4,
+        registry: Registry = REGISTRY,
+    ):
+        octaves = math.ceil(math.log2(high / low))
+        self.low = low
+        self.per_octave = per_octave
+        self.bounds = [low * 2 ** (i / per_octave) for i in range(octaves * per_octave + 1)]
+        super().__init__(name, help, labelnames, registry)
+
+    def _child(self):
+        return _Buckets(self.bounds, self.low, self.per_octave)
+
+    def observe(self, value: float):
+        self._unlabelled().observe(value)
+
+    def time(self):
+        return self._unlabelled().time()
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+
+            cumulative = 0
+            for bound, count in zip(self.bounds + [math.inf], counts):
+                cumulative += count
+                le = 'le="' + _format(float(f"{bound:.6g}")) + '"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------
+# Request coalescing
+# ------------------------------------------------------------------
+#
+# Concurrent calls with the same key share one execution: the first
+# caller starts it and later callers await the same task. Nothing is
+# kept once the task finishes, so this deduplicates bursts without
+# acting as a cache. The shared task is shielded, so one caller
+# disconnecting does not cancel the work for the others.
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Runs fn() unless a call with the same key is already in flight.
+        Returns (result, shared), where shared is True for callers that
+        joined an existing execution. Exceptions reach every caller.
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.executions += 1
+
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
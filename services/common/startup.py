@@ -0,0 +1,133 @@
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------
+# Startup phases
+# ------------------------------------------------------------------
+#
+# Heavy initialization (importing torch, loading and warming the model,
+# building indexes) runs as named phases in background tasks once the
+# server is already listening, so /health/live answers at once and
+# /health/ready turns 200 only when every required phase has finished.
+# A phase starts when the phases it runs `after` are done, so
+# independent ones (the model and the database, say) overlap. Each
+# phase's duration is recorded; a failed phase stays visible with its
+# error and is retried after `retry_delay` seconds.
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Phase:
+    def __init__(self, name: str, run: Callable[[], Awaitable[None]], after: Sequence[str], required: bool):
+        self.name = name
+        self.run = run
+        self.after = tuple(after)
+        self.required = required
+        self.finished: Optional[asyncio.Event] = None
+
+        self.state = PENDING
+        self.seconds: Optional[float] = None
+        self.attempts = 0
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "required": self.required,
+            "seconds": self.seconds,
+            "attempts": self.attempts,
+            "error": self.error,
+        }
+
+
+class StartupPhases:
+    def __init__(self, retry_delay: float = 5.0):
+        self.retry_delay = retry_delay
+        self.phases: Dict[str, Phase] = {}
+        self._started = time.monotonic()
+        self._tasks: List[asyncio.Task] = []
+
+        # Seconds from start() until every required phase was done
+        self.ready_seconds: Optional[float] = None
+
+    def add(
+        self,
+        name: str,
+        run: Callable[[], Awaitable[None]],
+        after: Sequence[str] = (),
+        required: bool = True,
+    ):
+        """
+        Registers a phase, to run once the phases named in `after`
+        (registered earlier) are done.
+        """
+        for dependency in after:
+            if dependency not in self.phases:
+                raise ValueError(f"Unknown startup phase '{dependency}'")
+        self.phases[name] = Phase(name, run, after, required)
+
+    def start(self):
+        self._started = time.monotonic()
+        for phase in self.phases.values():
+            phase.finished = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(phase)) for phase in self.phases.values()]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, phase: Phase):
+        for dependency in phase.after:
+            await self.phases[dependency].finished.wait()
+
+        while phase.state != DONE:
+            phase.state = RUNNING
+            phase.attempts += 1
+            started = time.perf_counter()
+            try:
+                await phase.run()
+            except Exception as exc:
+                phase.state = FAILED
+                phase.error = str(exc)
+                logger.warning(
+                    f"Startup phase '{phase.name}' failed "
+                    f"(attempt {phase.attempts}): {exc}"
+                )
+                await asyncio.sleep(self.retry_delay)
+                continue
+
+            phase.state = DONE
+            phase.error = None
+            phase.seconds = time.perf_counter() - started
+            logger.info(f"Startup phase '{phase.name}' done in {phase.seconds:.2f}s.")
+
+        phase.finished.set()
+        if phase.required and self.ready:
+            self.ready_seconds = time.monotonic() - self._started
+            logger.info(f"Startup complete in {self.ready_seconds:.2f}s.")
+
+    def done(self, name: str) -> bool:
+        return self.phases[name].state == DONE
+
+    @property
+    def ready(self) -> bool:
+        return all(p.state == DONE for p in self.phases.values() if p.required)
+
+    def pending(self) -> List[str]:
+        return [p.name for p in self.phases.values() if p.required and p.state != DONE]
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "ready_seconds": self.ready_seconds,
+            "uptime": time.monotonic() - self._started,
+            "phases": {name: phase.to_dict() for name, phase in self.phases.items()},
+        }
@@ -0,0 +1,381 @@
+import os
+import json
+import time
+import random
+import ipaddress
+import asyncio
+import logging
+import threading
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------
+# Request tracing
+# ------------------------------------------------------------------
+#
+# Trace context travels between services in the W3C `traceparent`
+# header. Each incoming request opens a server span; `span()` opens
+# nested spans around pipeline stages, in the request's task and in
+# worker threads started with asyncio.to_thread, which copy the
+# context. Sampled spans are batched and exported in the Zipkin v2 JSON
+# format, either to an HTTP collector (the logger service by default,
+# or any Zipkin-compatible endpoint) or to a local JSONL file.
+#
+# With SERVER_TIMING enabled, stage durations are also summed per
+# request and returned in a `Server-Timing` header, sampled or not.
+# When neither applies, spans cost one context variable lookup.
+#
+# A service facing clients passes `trusted_callers`: an incoming trace
+# is then continued but sampled at the local rate unless the caller's
+# address is in one of those networks, so clients cannot force tracing.
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.0"))
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "http://logger:8003/api/v2/spans")
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+# Networks whose sampled flag an edge service honours, e.g. "10.0.0.0/8"
+TRACE_TRUSTED_CALLERS = [
+    network.strip()
+    for network in os.getenv("TRACE_TRUSTED_CALLERS", "").split(",")
+    if network.strip()
+]
+
+# Scrapes and probes, which are never traced
+UNTRACED_PATHS = {"/metrics", "/health/live", "/health/ready"}
+
+
+class _Trace:
+    __slots__ = ("trace_id", "sampled", "timings")
+
+    def __init__(self, trace_id: str, sampled: bool, timings: Optional[Dict[str, float]]):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        # Stage durations for the Server-Timing header, if enabled
+        self.timings = timings
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "kind", "start", "duration", "tags")
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], kind: Optional[str], tags: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start = time.time()
+        self.duration = 0.0
+        self.tags = tags
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace.trace_id}-{self.span_id}-{'01' if self.trace.sampled else '00'}"
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def _new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """
+    Returns (trace_id, parent_span_id, sampled), or None if the header
+    is missing or malformed.
+    """
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def inject(headers) -> None:
+    """
+    Adds the current trace context to outgoing request headers.
+    """
+    span = _current.get()
+    if span is not None:
+        headers["traceparent"] = span.traceparent
+
+
+def headers() -> Dict[str, str]:
+    carrier: Dict[str, str] = {}
+    inject(carrier)
+    return carrier
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+# ------------------------------------------------------------------
+# Tracer
+# ------------------------------------------------------------------
+
+class Tracer:
+    def __init__(
+        self,
+        service: str,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        export: str = TRACE_EXPORT,
+        server_timing: bool = SERVER_TIMING,
+        trusted_callers: Optional[Sequence[str]] = None,
+    ):
+        self.service = service
+        self.sample_rate = sample_rate
+        self.server_timing = server_timing
+        # None trusts every caller's sampled flag (internal services)
+        self.trusted_callers = (
+            None
+            if trusted_callers is None
+            else [ipaddress.ip_network(network, strict=False) for network in trusted_callers]
+        )
+        self.exporter = SpanExporter(export) if export else None
+
+    @contextmanager
+    def span(self, name: str, kind: Optional[str] = None, **tags):
+        """
+        Times the block as a child of the current span. A no-op outside
+        a traced request.
+        """
+        parent = _current.get()
+        if parent is None:
+            yield None
+            return
+
+        span = Span(parent.trace, name, parent.span_id, kind, tags)
+        token = _current.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as exc:
+            span.tags["error"] = type(exc).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            try:
+                _current.reset(token)
+            except ValueError:
+                # Async generators can be finalized outside the context that opened the span
+                pass
+            self._finish(span)
+
+    def record(self, name: str, duration: float, **tags):
+        """
+        Adds a child span for a stage that was timed elsewhere and has
+        just ended, e.g. a queue wait.
+        """
+        parent = _current.get()
+        if parent is None:
+            return
+        span = Span(parent.trace, name, parent.span_id, None, tags)
+        span.start -= duration
+        span.duration = duration
+        self._finish(span)
+
+    def _finish(self, span: Span):
+        trace = span.trace
+        if trace.timings is not None and span.kind != "SERVER":
+            trace.timings[span.name] = trace.timings.get(span.name, 0.0) + span.duration
+        if trace.sampled and self.exporter is not None:
+            self.exporter.add(self._zipkin(span))
+
+    def _zipkin(self, span: Span) -> dict:
+        encoded = {
+            "traceId": span.trace.trace_id,
+            "id": span.span_id,
+            "name": span.name,
+            "timestamp": int(span.start * 1e6),
+            "duration": max(1, int(span.duration * 1e6)),
+            "localEndpoint": {"serviceName": self.service},
+        }
+        if span.parent_id:
+            encoded["parentId"] = span.parent_id
+        if span.kind:
+            encoded["kind"] = span.kind
+        if span.tags:
+            encoded["tags"] = {key: str(value) for key, value in span.tags.items()}
+        return encoded
+
+    async def middleware(self, request, call_next):
+        """
+        HTTP middleware: continues the caller's trace (or samples a new
+        one), opens the server span and adds the Server-Timing header.
+        """
+        if request.url.path in UNTRACED_PATHS:
+            return await call_next(request)
+
+        parent = parse_traceparent(request.headers.get("traceparent"))
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+            if not self._trusts(request.client.host if request.client else None):
+                sampled = self._sample()
+        else:
+            trace_id, parent_id = _new_id(16), None
+            sampled = self._sample()
+
+        if not sampled and not self.server_timing:
+            return await call_next(request)
+
+        trace = _Trace(trace_id, sampled, {} if self.server_timing else None)
+        span = Span(
+            trace,
+            f"{request.method} {request.url.path}",
+            parent_id,
+            "SERVER",
+            {"http.method": request.method, "http.path": request.url.path},
+        )
+        token = _current.set(span)
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+            span.tags["http.status_code"] = response.status_code
+        except BaseException as exc:
+            span.tags["error"] = type(exc).__name__
+            raise
+        finally:
+            # For streaming responses this covers the time to the headers
+            span.duration = time.perf_counter() - started
+            _current.reset(token)
+            self._finish(span)
+
+        if trace.timings is not None:
+            timings = {**trace.timings, "total": span.duration}
+            response.headers["Server-Timing"] = server_timing(timings)
+        response.headers["traceparent"] = span.traceparent
+        return response
+
+    def _sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _trusts(self, host: Optional[str]) -> bool:
+        if self.trusted_callers is None:
+            return True
+        try:
+            address = ipaddress.ip_address(host)
+        except (TypeError, ValueError):
+            return False
+        return any(address in network for network in self.trusted_callers)
+
+    def start(self):
+        # Also runs at a zero sample rate: callers' sampled traces are continued
+        if self.exporter is not None:
+            self.exporter.start()
+
+    async def stop(self):
+        if self.exporter is not None:
+            await self.exporter.stop()
+
+    def stats(self) -> dict:
+        return {
+            "service": self.service,
+            "sample_rate": self.sample_rate,
+            "server_timing": self.server_timing,
+            "trusted_callers": (
+                None if self.trusted_callers is None else [str(n) for n in self.trusted_callers]
+            ),
+            "exporter": self.exporter.stats() if self.exporter else None,
+        }
+
+
+# ------------------------------------------------------------------
+# Span export
+# ------------------------------------------------------------------
+
+class SpanExporter:
+    """
+    Buffers finished spans and writes them in batches, to a Zipkin v2
+    HTTP endpoint or, for a `file:` target, to a JSONL file. Spans may
+    finish in worker threads, so the buffer is locked. A full buffer
+    drops new spans rather than growing.
+    """
+
+    def __init__(self, target: str, max_spans: int = 10000, flush_interval: float = 1.0):
+        self.target = target
+        self.max_spans = max_spans
+        self.flush_interval = flush_interval
+
+        self._spans: List[dict] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def add(self, span: dict):
+        with self._lock:
+            if len(self._spans) >= self.max_spans:
+                self.dropped += 1
+                return
+            self._spans.append(span)
+
+    def start(self):
+        self._task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        with self._lock:
+            batch, self._spans = self._spans, []
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self._write, batch)
+            self.exported += len(batch)
+        except Exception as exc:
+            # Tracing failures should not affect request handling
+            self.failed += len(batch)
+            logger.debug(f"Failed to export {len(batch)} spans: {exc}")
+
+    def _write(self, batch: List[dict]):
+        if self.target.startswith("file:"):
+            path = self.target[len("file:"):]
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(span) + "\n" for span in batch))
+            return
+
+        request = urllib.request.Request(
+            self.target,
+            data=json.dumps(batch).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=5.0):
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "target": self.target,
+            "buffered": len(self._spans),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
@@ -0,0 +1,152 @@
+import time
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import List, Optional
+
+import httpx
+
+logger = logging.getLogger("gateway.backends")
+
+# ------------------------------------------------------------------
+# LLM backend pool
+# ------------------------------------------------------------------
+#
+# Requests go to the healthy backend with the fewest outstanding calls,
+# with ties broken by the lower latency EWMA, and no backend takes more
+# than `max_concurrency` calls at once, so a slow one cannot hold every
+# slot the dispatcher hands out. Health checking is passive:
+# a backend that fails `failure_threshold` calls in a row is ejected for
+# `ejection_time` seconds, then gets traffic again on probation. If every
+# backend is ejected, the one due back soonest is used anyway rather
+# than failing outright. Only transport errors and 5xx responses count
+# as failures: a 4xx (e.g. a prompt over the context length) is the
+# request's fault, not the backend's.
+
+
+@dataclass
+class Backend:
+    url: str
+    outstanding: int = 0
+    ewma_latency: Optional[float] = None
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    requests: int = 0
+    failures: int = 0
+    ejections: int = 0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+
+def is_backend_failure(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+class BackendPool:
+    def __init__(
+        self,
+        urls: List[str],
+        failure_threshold: int = 3,
+        ejection_time: float = 30.0,
+        ewma_alpha: float = 0.2,
+        max_concurrency: Optional[int] = None,
+    ):
+        if not urls:
+            raise ValueError("At least one LLM backend is required")
+
+        self.backends = [Backend(url.rstrip("/")) for url in urls]
+        # Calls in flight per backend; None for no limit
+        self.max_concurrency = max_concurrency
+        self.failure_threshold = failure_threshold
+        self.ejection_time = ejection_time
+        self.ewma_alpha = ewma_alpha
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    @property
+    def primary(self) -> Backend:
+        return self.backends[0]
+
+    def has_capacity(self, backend: Backend) -> bool:
+        return self.max_concurrency is None or backend.outstanding < self.max_concurrency
+
+    def choose(self) -> Backend:
+        now = time.monotonic()
+        available = [b for b in self.backends if self.has_capacity(b)]
+        candidates = [b for b in available if b.healthy(now)]
+
+        if not candidates:
+            # The dispatcher admits at most max_concurrency calls per backend,
+            # so some backend always has room, even if it is still ejected
+            return min(available or self.backends, key=lambda b: b.ejected_until)
+
+        return min(
+            candidates,
+            key=lambda b: (b.outstanding, b.ewma_latency or 0.0),
+        )
+
+    @asynccontextmanager
+    async def lease(self):
+        """
+        Picks a backend and tracks the call made against it. Transport
+        errors and 5xx responses raised in the block count as failures;
+        other exceptions and cancellation count as neither success nor
+        failure.
+        """
+        backend = self.choose()
+        backend.outstanding += 1
+        backend.requests += 1
+        start = time.monotonic()
+
+        try:
+            yield backend
+
+        except Exception as exc:
+            if is_backend_failure(exc):
+                self._record_failure(backend)
+            raise
+
+        else:
+            self._record_success(backend, time.monotonic() - start)
+
+        finally:
+            backend.outstanding -= 1
+
+    def _record_success(self, backend: Backend, latency: float):
+        backend.consecutive_failures = 0
+        if backend.ewma_latency is None:
+            backend.ewma_latency = latency
+        else:
+            backend.ewma_latency += self.ewma_alpha * (latency - backend.ewma_latency)
+
+    def _record_failure(self, backend: Backend):
+        backend.failures += 1
+        backend.consecutive_failures += 1
+
+        if backend.consecutive_failures >= self.failure_threshold:
+            backend.ejected_until = time.monotonic() + self.ejection_time
+            backend.consecutive_failures = 0
+            backend.ejections += 1
+            logger.warning(
+                f"Ejecting LLM backend {backend.url} for {self.ejection_time}s."
+            )
+
+    def stats(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "url": b.url,
+                "healthy": b.healthy(now),
+                "outstanding": b.outstanding,
+                "max_concurrency": self.max_concurrency,
+                "ewma_latency": b.ewma_latency,
+                "requests": b.requests,
+                "failures": b.failures,
+                "ejections": b.ejections,
+            }
+            for b in self.backends
+        ]
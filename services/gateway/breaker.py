@@ -0,0 +1,132 @@
+import os
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger("gateway.breaker")
+
+# ------------------------------------------------------------------
+# Circuit breakers
+# ------------------------------------------------------------------
+#
+# Each upstream gets a breaker over its most recent call outcomes. When
+# the error rate in that window crosses the threshold, the breaker opens
+# and calls are refused without touching the network. After a cool-down
+# it goes half-open and lets a few probe calls through: a successful
+# probe closes it again, a failed one re-opens it. Every allowed call
+# must end in record_success, record_failure or release, or a half-open
+# breaker stays out of probe slots for good.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        error_rate: float = 0.5,
+        window: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 10.0,
+        half_open_probes: int = 1,
+    ):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes = 0
+
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        """
+        Returns whether a call may go to the upstream now.
+        A refused call is counted but not recorded as a failure.
+        """
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._probes = 0
+            logger.info(f"Circuit '{self.name}' half-open, probing upstream.")
+
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                self.rejected += 1
+                return False
+            self._probes += 1
+
+        return True
+
+    def release(self):
+        """
+        Frees a half-open probe slot taken by allow() for a call that
+        ended without an outcome, e.g. because it was cancelled.
+        """
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record_success(self):
+        if self.state == HALF_OPEN:
+            self.state = CLOSED
+            self._outcomes.clear()
+            logger.info(f"Circuit '{self.name}' closed.")
+        self._outcomes.append(True)
+
+    def record_failure(self):
+        if self.state == HALF_OPEN:
+            self._trip()
+            return
+
+        self._outcomes.append(False)
+        failures = self._outcomes.count(False)
+        if (
+            len(self._outcomes) >= self.min_calls
+            and failures / len(self._outcomes) >= self.error_rate
+        ):
+            self._trip()
+
+    def _trip(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.trips += 1
+        logger.warning(
+            f"Circuit '{self.name}' opened for {self.open_seconds}s."
+        )
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "recent_calls": len(self._outcomes),
+            "recent_failures": self._outcomes.count(False),
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+def _breaker_for(name: str) -> CircuitBreaker:
+    prefix = name.upper()
+    return CircuitBreaker(
+        name,
+        error_rate=float(os.getenv(f"{prefix}_BREAKER_ERROR_RATE", "0.5")),
+        window=int(os.getenv(f"{prefix}_BREAKER_WINDOW", "20")),
+        min_calls=int(os.getenv(f"{prefix}_BREAKER_MIN_CALLS", "5")),
+        open_seconds=float(os.getenv(f"{prefix}_BREAKER_OPEN_SECONDS", "10.0")),
+    )
+
+
+BREAKERS = {name: _breaker_for(name) for name in ("retriever", "policy")}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    return BREAKERS[name]
@@ -0,0 +1,80 @@
+import os
+import logging
+from typing import Dict
+
+import httpx
+
+from common import tracing
+
+logger = logging.getLogger("gateway.clients")
+
+# ------------------------------------------------------------------
+# Upstream HTTP clients
+# ------------------------------------------------------------------
+#
+# One long-lived AsyncClient per upstream, so each keeps its own
+# keep-alive pool, connection limit and timeout. Clients are opened on
+# application startup and closed on shutdown. Each request carries the
+# caller's trace context.
+
+UPSTREAMS = {
+    "retriever": {
+        "timeout": float(os.getenv("RETRIEVER_TIMEOUT", "5.0")),
+        "max_connections": int(os.getenv("RETRIEVER_MAX_CONNECTIONS", "100")),
+    },
+    "policy": {
+        "timeout": float(os.getenv("POLICY_TIMEOUT", "1.0")),
+        "max_connections": int(os.getenv("POLICY_MAX_CONNECTIONS", "100")),
+    },
+    "llm": {
+        "timeout": float(os.getenv("LLM_TIMEOUT", "90.0")),
+        "max_connections": int(os.getenv("LLM_MAX_CONNECTIONS", "500")),
+    },
+    "logger": {
+        "timeout": float(os.getenv("LOGGER_TIMEOUT", "1.0")),
+        "max_connections": int(os.getenv("LOGGER_MAX_CONNECTIONS", "20")),
+    },
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _build_client(settings: dict) -> httpx.AsyncClient:
+    timeout = settings["timeout"]
+    return httpx.AsyncClient(
+        # Connecting should fail fast even when reads are allowed to be slow
+        timeout=httpx.Timeout(timeout, connect=min(timeout, 2.0)),
+        limits=httpx.Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_connections"],
+            keepalive_expiry=30.0,
+        ),
+        event_hooks={"request": [_propagate_trace]},
+    )
+
+
+async def _propagate_trace(request: httpx.Request):
+    tracing.inject(request.headers)
+
+
+async def open_clients():
+    for name, settings in UPSTREAMS.items():
+        _clients[name] = _build_client(settings)
+    logger.info(f"Opened upstream clients: {', '.join(_clients)}")
+
+
+async def close_clients():
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """
+    Returns the shared client for an upstream.
+    Falls back to creating one lazily if startup hooks did not run.
+    """
+    client = _clients.get(name)
+    if client is None:
+        client = _clients[name] = _build_client(UPSTREAMS[name])
+    return client
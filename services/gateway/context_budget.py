@@ -0,0 +1,114 @@
+import re
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("gateway.context_budget")
+
+# ------------------------------------------------------------------
+# Context token budget
+# ------------------------------------------------------------------
+#
+# Prefill time on CPU grows linearly with prompt length, so retrieved
+# context is capped per profile. Documents over budget are compressed
+# extractively: every sentence is scored by its similarity to the query,
+# the best ones are kept until the budget is spent, and the survivors
+# are put back in their original order within each document.
+#
+# Token counts are estimated from characters. The LLM's own tokenizer
+# is not exposed over the OpenAI-compatible API, and a budget only
+# needs to be consistent, not exact.
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+@dataclass
+class BudgetReport:
+    budget: int
+    original_tokens: int
+    kept_tokens: int
+
+    @property
+    def dropped_tokens(self) -> int:
+        return self.original_tokens - self.kept_tokens
+
+    @property
+    def ratio(self) -> float:
+        return self.kept_tokens / self.original_tokens if self.original_tokens else 1.0
+
+
+class ContextBudget:
+    def __init__(self, budgets: Dict[str, int], chars_per_token: float = 4.0):
+        self.budgets = budgets
+        self.chars_per_token = chars_per_token
+
+    def budget_for(self, profile: str) -> Optional[int]:
+        """
+        Returns the token budget for a profile, or None if unlimited.
+        """
+        return self.budgets.get(profile)
+
+    def count_tokens(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token + 0.5)
+
+    def total_tokens(self, docs: List[Dict[str, Any]]) -> int:
+        return sum(self.count_tokens(doc.get("content", "")) for doc in docs)
+
+    @staticmethod
+    def split_sentences(text: str) -> List[str]:
+        return [s.strip() for s in _SENTENCE_BOUNDARY.split(text) if s.strip()]
+
+    def compress(
+        self,
+        docs: List[Dict[str, Any]],
+        sentences: List[List[str]],
+        scores: Optional[np.ndarray],
+        budget: int,
+    ) -> tuple:
+        """
+        Keeps the highest-scoring sentences that fit in the budget.
+
+        `sentences` holds each document's sentences and `scores` their
+        query similarities, flattened in the same order. Without scores,
+        sentences are kept in reading order. Returns the compressed
+        documents and a BudgetReport.
+        """
+        flat = [
+            (doc_index, sentence)
+            for doc_index, doc_sentences in enumerate(sentences)
+            for sentence in doc_sentences
+        ]
+
+        order = (
+            np.argsort(-scores, kind="stable")
+            if scores is not None
+            else range(len(flat))
+        )
+
+        kept = set()
+        spent = 0
+        for index in order:
+            cost = self.count_tokens(flat[index][1])
+            if spent + cost <= budget:
+                kept.add(int(index))
+                spent += cost
+
+        kept_by_doc = [[] for _ in docs]
+        for index, (doc_index, sentence) in enumerate(flat):
+            if index in kept:
+                kept_by_doc[doc_index].append(sentence)
+
+        compressed = [
+            {**doc, "content": " ".join(kept_sentences)}
+            for doc, kept_sentences in zip(docs, kept_by_doc)
+            if kept_sentences
+        ]
+
+        report = BudgetReport(
+            budget=budget,
+            original_tokens=self.total_tokens(docs),
+            kept_tokens=self.total_tokens(compressed),
+        )
+        return compressed, report
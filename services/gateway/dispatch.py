@@ -0,0 +1,163 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger("gateway.dispatch")
+
+# ------------------------------------------------------------------
+# LLM admission control
+# ------------------------------------------------------------------
+#
+# The gateway, not the LLM backend, decides which request runs next.
+# At most `max_concurrency` calls are in flight; the rest wait in a
+# priority queue ordered by profile lane, then (optionally) by prompt
+# size, then by arrival. A full queue is rejected immediately with 429,
+# and a request that waits past its deadline is rejected with 503, so
+# overload shows up as fast failures instead of 90 s upstream timeouts.
+
+
+class LLMDispatcher:
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        priorities: Optional[Dict[str, int]] = None,
+        shortest_first: bool = False,
+        on_admit: Optional[Callable[[str, float], None]] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.priorities = priorities or {}
+        self.shortest_first = shortest_first
+        # Called with (profile, seconds waited) for every admitted request
+        self.on_admit = on_admit
+
+        self.active = 0
+        self._queue: List[tuple] = []
+        self._sequence = itertools.count()
+
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.peak_queue_depth = 0
+        self._waits = deque(maxlen=1000)
+
+    def lane_for(self, profile: str) -> int:
+        """
+        Lower lanes are served first. Unlisted profiles share the
+        lowest-priority lane.
+        """
+        return self.priorities.get(profile, max(self.priorities.values(), default=0))
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for entry in self._queue if not entry[-1].done())
+
+    # --------------------------------------------------------------
+    # Slots
+    # --------------------------------------------------------------
+
+    @asynccontextmanager
+    async def slot(self, profile: str, prompt_size: int = 0):
+        """
+        Holds one LLM concurrency slot for the duration of the block.
+        Raises HTTPException(429) if the queue is full and
+        HTTPException(503) if the queue deadline passes.
+        """
+        await self._acquire(profile, prompt_size)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, profile: str, prompt_size: int):
+        start = time.monotonic()
+
+        if self.active < self.max_concurrency and not self.queue_depth:
+            self.active += 1
+            self._admit(profile, start)
+            return
+
+        if self.queue_depth >= self.max_queue:
+            self.rejected_full += 1
+            logger.warning(f"LLM queue full; rejecting request (profile={profile}).")
+            raise HTTPException(
+                status_code=429,
+                detail="LLM queue full, retry later",
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        size_key = prompt_size if self.shortest_first else 0
+        heapq.heappush(
+            self._queue,
+            (self.lane_for(profile), size_key, next(self._sequence), waiter),
+        )
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth)
+
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            logger.warning(
+                f"LLM queue deadline exceeded after {self.queue_timeout}s "
+                f"(profile={profile})."
+            )
+            raise HTTPException(
+                status_code=503,
+                detail="LLM queue deadline exceeded",
+            )
+
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before cancellation
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+
+        self._admit(profile, start)
+
+    def _admit(self, profile: str, start: float):
+        wait = time.monotonic() - start
+        self.admitted += 1
+        self._waits.append(wait)
+        if self.on_admit is not None:
+            self.on_admit(profile, wait)
+
+    def _release(self):
+        self.active -= 1
+
+        # Hand the slot to the next waiter that is still queued
+        while self._queue:
+            waiter = heapq.heappop(self._queue)[-1]
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+                return
+
+    # --------------------------------------------------------------
+    # Metrics
+    # --------------------------------------------------------------
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "queue_depth": self.queue_depth,
+            "peak_queue_depth": self.peak_queue_depth,
+            "admitted": self.admitted,
+            "rejected_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_mean": sum(waits) / len(waits) if waits else 0.0,
+            "wait_p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0,
+        }
@@ -0,0 +1,96 @@
+import logging
+from typing import Iterable, List, Optional
+
+from policy_engine.matcher import PatternMatcher
+
+logger = logging.getLogger("gateway.guardrails")
+
+# ------------------------------------------------------------------
+# Output guardrail
+# ------------------------------------------------------------------
+#
+# Patterns are compiled once into the policy engine's Aho-Corasick
+# PatternMatcher. A scanner keeps only the current automaton state
+# between chunks, so streamed text is checked in a single pass, a match
+# that straddles two chunks is still found, and nothing already scanned
+# is ever re-read.
+
+# Markers whose presence in a completion means an injection took over
+DEFAULT_OUTPUT_PATTERNS = [
+    "PWNED_SECURE_RAG",
+    "<|system|>",
+    "<|eot_id|>",
+    "<|start_header_id|>",
+    "[SYSTEM ALERT: MANDATORY OVERRIDE]",
+    "ignore previous instructions",
+]
+
+
+class StreamScanner:
+    """
+    Incremental scanner over a stream of text chunks.
+    """
+
+    def __init__(self, matcher: PatternMatcher):
+        self.matcher = matcher
+        self.state = 0
+        self.scanned = 0
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """
+        Scans the next chunk. Returns the first pattern matched, if any.
+        """
+        matches, self.state = self.matcher.resume(self.state, chunk, first=True)
+        if matches:
+            return matches[0][0]
+
+        self.scanned += len(chunk)
+        return None
+
+
+def build_matcher(patterns: Iterable[str]) -> PatternMatcher:
+    # Each pattern is its own key, so a match reports the pattern itself
+    return PatternMatcher((pattern, pattern) for pattern in patterns)
+
+
+class OutputGuard:
+    """
+    Holds the global output patterns and builds per-request scanners.
+    """
+
+    def __init__(self, enabled: bool, patterns: Iterable[str]):
+        self.enabled = enabled
+        self.patterns = list(patterns)
+        self.matcher = build_matcher(self.patterns)
+
+        self.scans = 0
+        self.blocked = 0
+
+    def scanner_for(self, extra_patterns: Optional[List[str]] = None) -> Optional[StreamScanner]:
+        """
+        Returns a scanner for one response, or None if nothing is to be checked.
+        Request-specific patterns (e.g. an injected task's label) get their
+        own small matcher combined with the global patterns.
+        """
+        if extra_patterns:
+            patterns = self.patterns + extra_patterns if self.enabled else extra_patterns
+            matcher = build_matcher(patterns)
+        elif self.enabled:
+            matcher = self.matcher
+        else:
+            return None
+
+        self.scans += 1
+        return StreamScanner(matcher)
+
+    def record_block(self, pattern: str):
+        self.blocked += 1
+        logger.warning(f"Output blocked by guardrail (pattern={pattern!r}).")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "patterns": len(self.patterns),
+            "scans": self.scans,
+            "blocked": self.blocked,
+        }
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger("gateway.hedging")
+
+T = TypeVar("T")
+
+# ------------------------------------------------------------------
+# Hedged requests
+# ------------------------------------------------------------------
+#
+# If the primary call has not returned by the time a high percentile of
+# recent latencies has passed, the same idempotent call is sent to a
+# replica and whichever answers first wins. The loser is cancelled. The
+# delay tracks observed latency, so only the slow tail is duplicated.
+
+
+class LatencyTracker:
+    def __init__(self, percentile: float = 95.0, window: int = 200, min_samples: int = 20):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def threshold(self) -> Optional[float]:
+        """
+        Returns the current hedge delay, or None while there is
+        too little history to estimate it.
+        """
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+
+class Hedger:
+    def __init__(self, tracker: LatencyTracker):
+        self.tracker = tracker
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    async def call(
+        self,
+        primary: Callable[[], Awaitable[T]],
+        replica: Optional[Callable[[], Awaitable[T]]],
+    ) -> T:
+        """
+        Awaits primary(), starting replica() once the hedge delay passes.
+        Returns the first successful result; if both fail, the primary's
+        error is raised.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        delay = self.tracker.threshold() if replica is not None else None
+        primary_task = asyncio.ensure_future(primary())
+        tasks = [primary_task]
+
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+
+            if not done:
+                self.hedged += 1
+                tasks.append(asyncio.ensure_future(replica()))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary_task:
+                            self.hedge_wins += 1
+                        self.tracker.observe(loop.time() - start)
+                        return task.result()
+
+            # Every attempt failed
+            return primary_task.result()
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "delay": self.tracker.threshold(),
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+        }
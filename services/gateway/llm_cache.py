@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Optional
+
+logger = logging.getLogger("gateway.llm_cache")
+
+# ------------------------------------------------------------------
+# Content-addressed LLM response cache
+# ------------------------------------------------------------------
+#
+# The gateway always samples with temperature 0 and a fixed seed, so a
+# completion is fully determined by the model weights, the messages and
+# the sampling parameters. Entries are keyed on a hash of exactly those
+# inputs and stored in a local SQLite file. When the store grows past
+# its byte budget, the least recently used entries are evicted.
+
+
+class LLMResponseCache:
+    def __init__(self, path: str, max_bytes: int, weights_hash: str = "unknown"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.weights_hash = weights_hash
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)"
+        )
+        self._conn.commit()
+
+        self.total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+
+    # --------------------------------------------------------------
+    # Keys
+    # --------------------------------------------------------------
+
+    def key_for(self, payload: dict) -> str:
+        """
+        Hashes everything that determines the completion: model name,
+        weights hash, messages and sampling parameters. Transport-only
+        fields such as `stream` are excluded.
+        """
+        material = {k: v for k, v in payload.items() if k != "stream"}
+        material["weights_hash"] = self.weights_hash
+
+        encoded = json.dumps(material, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    # --------------------------------------------------------------
+    # Lookups (run off the event loop)
+    # --------------------------------------------------------------
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get_sync, key)
+
+    async def put(self, key: str, response: str):
+        await asyncio.to_thread(self._put_sync, key, response)
+
+    def _get_sync(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def _put_sync(self, key: str, response: str):
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO entries (key, response, size, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (key, response, size, now, now),
+            )
+            self.total_bytes += size - (previous[0] if previous else 0)
+
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+
+            for key, size in rows:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.total_bytes -= size
+                self.evictions += 1
+
+    # --------------------------------------------------------------
+    # Metrics
+    # --------------------------------------------------------------
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+        return {
+            "enabled": True,
+            "weights_hash": self.weights_hash,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+async def resolve_weights_hash(client, api_base: str, model_name: str) -> str:
+    """
+    Looks up the model digest from Ollama's native API, so the cache is
+    invalidated whenever the weights behind a model name change.
+    """
+    root = api_base.rstrip("/")
+    if root.endswith("/v1"):
+        root = root[: -len("/v1")]
+
+    try:
+        response = await client.get(f"{root}/api/tags")
+        response.raise_for_status()
+
+        for entry in response.json().get("models", []):
+            if model_name in (entry.get("name"), entry.get("model")):
+                return entry.get("digest", "unknown")
+
+        logger.warning(f"Model '{model_name}' not listed by the LLM backend.")
+
+    except Exception as exc:
+        logger.warning(f"Could not resolve LLM weights hash: {exc}")
+
+    return "unknown"
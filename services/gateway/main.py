@@ -1,12 +1,38 @@
 import os
+import json
+import asyncio
+import hashlib
 import logging
 import time
-import requests
+from contextlib import aclosing, contextmanager
+
+import httpx
+import numpy as np
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Union
 
-from middleware import check_policy, log_telemetry
+from backends import BackendPool
+from breaker import BREAKERS, get_breaker
+from clients import open_clients, close_clients, get_client
+from context_budget import BudgetReport, ContextBudget
+from dispatch import LLMDispatcher
+from hedging import Hedger, LatencyTracker
+from guardrails import DEFAULT_OUTPUT_PATTERNS, OutputGuard, StreamScanner
+from llm_cache import LLMResponseCache, resolve_weights_hash
+from middleware import (
+    POLICY_BACKEND,
+    POLICY_URL,
+    check_policy,
+    check_policy_batch,
+    local_policy,
+    log_telemetry,
+    telemetry_exporter,
+)
+from semantic_cache import CachedAnswer, SemanticCache
+from common import debug, metrics, tracing
+from common.singleflight import SingleFlight
 
 # ------------------------------------------------------------------
 # Setup
@@ -17,10 +43,200 @@ logger = logging.getLogger("gateway")
 
 app = FastAPI(title="Secure RAG Gateway")
 
+# Trace context is forwarded on every upstream call by the shared clients.
+# Clients' sampled flags are only honoured from TRACE_TRUSTED_CALLERS.
+tracer = tracing.Tracer("gateway", trusted_callers=tracing.TRACE_TRUSTED_CALLERS)
+app.middleware("http")(tracer.middleware)
+app.include_router(debug.router)
+
+# Live metrics, served by GET /metrics
+REQUEST_SECONDS = metrics.Histogram(
+    "gateway_request_seconds",
+    "End-to-end chat latency by profile and outcome.",
+    ["endpoint", "profile", "status"],
+)
+FIRST_TOKEN_SECONDS = metrics.Histogram(
+    "gateway_first_token_seconds",
+    "Time to the first streamed token by profile.",
+    ["profile"],
+)
+STAGE_SECONDS = metrics.Histogram(
+    "gateway_stage_seconds",
+    "Time per pipeline stage by profile; batched stages count once per request.",
+    ["stage", "profile"],
+)
+# Profiles kept as label values; any other client-sent profile is
+# recorded as "other", so it cannot open new series
+METRIC_PROFILES = set(os.getenv("METRIC_PROFILES", "P1,P2,P3").split(","))
+EMBEDDING_BATCH_SIZE = metrics.Histogram(
+    "gateway_embedding_batch_size",
+    "Texts sent per retriever /embed call.",
+    low=1,
+    high=4096,
+    per_octave=1,
+)
+CACHE_LOOKUPS = metrics.Counter(
+    "gateway_cache_lookups_total",
+    "Response cache lookups by cache and result.",
+    ["cache", "result"],
+)
+RETRIEVER_GENERATION = metrics.Gauge(
+    "gateway_retriever_generation",
+    "Index generation last reported by the retriever's /embed.",
+)
+
 RETRIEVER_URL = os.getenv("RETRIEVER_URL", "http://retriever:8001")
+
+# Optional replica that slow searches are hedged to
+RETRIEVER_HEDGE_URL = os.getenv("RETRIEVER_HEDGE_URL", "")
+
+# Forward the retriever's query and stored document vectors to the
+# policy classifier, so it never re-encodes them
+POLICY_SEND_EMBEDDINGS = os.getenv("POLICY_SEND_EMBEDDINGS", "true").lower() == "true"
 LLM_API_BASE = os.getenv("LLM_API_BASE", "http://host.docker.internal:11434/v1")
+
+# Comma-separated list of interchangeable LLM servers; defaults to LLM_API_BASE
+LLM_API_BASES = [
+    url.strip()
+    for url in (os.getenv("LLM_API_BASES") or LLM_API_BASE).split(",")
+    if url.strip()
+]
 LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "mistral-7b-instruct:q4km")
 
+# Opt-in response cache; disabled unless a directory is configured
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+LLM_WEIGHTS_HASH = os.getenv("LLM_WEIGHTS_HASH", "")
+
+llm_cache: Optional[LLMResponseCache] = None
+
+# Semantic cache thresholds per profile, e.g. {"P1": 0.95, "P2": 0.98}.
+# Profiles without a threshold never use the semantic cache.
+SEMANTIC_CACHE_THRESHOLDS = json.loads(os.getenv("SEMANTIC_CACHE_THRESHOLDS") or "{}")
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+SEMANTIC_CACHE_MAX_PARTITIONS = int(os.getenv("SEMANTIC_CACHE_MAX_PARTITIONS", "64"))
+
+semantic_cache: Optional[SemanticCache] = (
+    SemanticCache(
+        SEMANTIC_CACHE_THRESHOLDS, SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_MAX_PARTITIONS
+    )
+    if SEMANTIC_CACHE_THRESHOLDS
+    else None
+)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+
+# Each backend takes at most LLM_MAX_CONCURRENCY calls at once
+llm_pool = BackendPool(
+    LLM_API_BASES,
+    failure_threshold=int(os.getenv("LLM_EJECT_AFTER_FAILURES", "3")),
+    ejection_time=float(os.getenv("LLM_EJECT_SECONDS", "30.0")),
+    max_concurrency=LLM_MAX_CONCURRENCY,
+)
+
+# Admission control for LLM calls, up to the pool's total capacity; priority
+# lanes map profiles to lanes, lower first, e.g. {"P3": 0, "P1": 1}.
+llm_dispatcher = LLMDispatcher(
+    max_concurrency=LLM_MAX_CONCURRENCY * len(llm_pool),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "256")),
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "30.0")),
+    priorities=json.loads(os.getenv("LLM_PRIORITIES") or "{}"),
+    shortest_first=os.getenv("LLM_SHORTEST_FIRST", "false").lower() == "true",
+    on_admit=lambda profile, wait: observe_wait("llm_queue", profile, wait),
+)
+
+# Context token budgets per profile, e.g. {"P1": 1024}.
+# Profiles without a budget send retrieved context uncompressed.
+context_budget = ContextBudget(
+    json.loads(os.getenv("CONTEXT_TOKEN_BUDGETS") or "{}"),
+    chars_per_token=float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4.0")),
+)
+
+# Searches still running at this latency percentile are hedged
+retriever_hedger = Hedger(
+    LatencyTracker(percentile=float(os.getenv("RETRIEVER_HEDGE_PERCENTILE", "95")))
+)
+
+# Identical concurrent /chat requests share one execution
+chat_flight = SingleFlight()
+
+# Incremental output scanning; request-level blocklists apply regardless
+output_guard = OutputGuard(
+    enabled=os.getenv("OUTPUT_GUARD_ENABLED", "false").lower() == "true",
+    patterns=json.loads(os.getenv("OUTPUT_GUARD_PATTERNS") or "null")
+    or DEFAULT_OUTPUT_PATTERNS,
+)
+
+debug.register_component(
+    "semantic_cache",
+    lambda: debug.deep_size(semantic_cache) if semantic_cache else None,
+)
+debug.register_component(
+    "llm_cache",
+    lambda: {"disk_bytes": llm_cache.total_bytes} if llm_cache else None,
+)
+debug.register_component(
+    "policy_engine",
+    lambda: debug.deep_size(local_policy.engine) if local_policy else None,
+)
+debug.register_component("telemetry", telemetry_exporter.stats)
+
+# Component state, read when /metrics is scraped
+metrics.Gauge(
+    "gateway_llm_active", "LLM calls holding a slot."
+).set_function(lambda: llm_dispatcher.active)
+metrics.Gauge(
+    "gateway_llm_queue_depth", "LLM calls waiting for a slot."
+).set_function(lambda: llm_dispatcher.queue_depth)
+LLM_REJECTED = metrics.Counter(
+    "gateway_llm_rejected_total", "LLM calls rejected by admission control.", ["reason"]
+)
+LLM_REJECTED.labels("queue_full").set_function(lambda: llm_dispatcher.rejected_full)
+LLM_REJECTED.labels("deadline").set_function(lambda: llm_dispatcher.rejected_timeout)
+metrics.Counter(
+    "gateway_chat_coalesced_total", "Chat requests that joined an identical in-flight request."
+).set_function(lambda: chat_flight.coalesced)
+metrics.Counter(
+    "gateway_telemetry_dropped_total", "Telemetry events dropped because the queue was full."
+).set_function(lambda: telemetry_exporter.dropped)
+
+# ------------------------------------------------------------------
+# Lifecycle events
+# ------------------------------------------------------------------
+
+@app.on_event("startup")
+async def startup_event():
+    global llm_cache
+
+    await open_clients()
+    telemetry_exporter.start()
+    tracer.start()
+
+    if LLM_CACHE_DIR:
+        weights_hash = LLM_WEIGHTS_HASH or await resolve_weights_hash(
+            get_client("llm"), llm_pool.primary.url, LLM_MODEL_NAME
+        )
+        llm_cache = LLMResponseCache(
+            os.path.join(LLM_CACHE_DIR, "responses.sqlite3"),
+            max_bytes=LLM_CACHE_MAX_BYTES,
+            weights_hash=weights_hash,
+        )
+        logger.info(f"LLM response cache enabled (weights={weights_hash}).")
+
+    if local_policy is not None:
+        asyncio.create_task(local_policy.load_classifier(embed_vectors))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Send queued telemetry while the logger client is still open
+    await telemetry_exporter.stop()
+    await tracer.stop()
+    await close_clients()
+
+    if llm_cache is not None:
+        llm_cache.close()
+
 # ------------------------------------------------------------------
 # Request / Response Models
 # ------------------------------------------------------------------
@@ -36,47 +252,113 @@ class ChatRequest(BaseModel):
     topology: str = "sequential"
     profile: str = "P1"
     seed: int = 42
+    collection: str = "default"
 
     # Used when retriever is bypassed
     documents: Optional[List[Dict[str, Any]]] = None
 
+    # Extra strings that must not appear in the response (e.g. an injected label)
+    output_blocklist: Optional[List[str]] = None
+
 
 class ChatResponse(BaseModel):
     response: str
     model: str
     context: List[Dict[str, Any]] = []
 
+
+class BatchChatItem(ChatRequest):
+    # Echoed back so results can be matched in completion order
+    id: str
+
+
+class BatchChatRequest(BaseModel):
+    requests: List[BatchChatItem]
+
 # ------------------------------------------------------------------
 # Helpers
 # ------------------------------------------------------------------
 
-def fetch_documents(request: ChatRequest) -> List[Dict[str, Any]]:
+def split_vectors(
+    result: Dict[str, Any],
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    Separates a search result's vectors from its documents, so they
+    reach the policy service but never the prompt or the client.
+    Returns (documents, vectors) with vectors as {"query", "documents"}
+    keyed by content hash, or None when the retriever sent none.
+    """
+    docs = result.get("documents", [])
+    if "query_embedding" not in result:
+        return docs, None
+
+    embeddings = {}
+    for doc in docs:
+        embedding = doc.pop("embedding", None)
+        if embedding is not None and doc.get("content_hash"):
+            embeddings[doc["content_hash"]] = embedding
+
+    return docs, {"query": result["query_embedding"], "documents": embeddings}
+
+
+def provided_documents(request: ChatRequest) -> List[Dict[str, Any]]:
+    """
+    The client's documents for PI topologies. Any `content_hash` they
+    carry is dropped: only the retriever's hashes are trusted, so the
+    policy check hashes these documents' content itself.
+    """
+    return [
+        {key: value for key, value in doc.items() if key != "content_hash"}
+        for doc in request.documents or []
+    ]
+
+
+async def fetch_documents(
+    request: ChatRequest,
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
     """
     Resolve documents based on topology.
+    Returns the documents and their vectors for the policy check.
     """
     if request.topology in {"pi", "direct_pi"}:
         logger.info(
             f"Retriever bypassed (topology={request.topology}). "
             f"Using provided documents."
         )
-        return request.documents or []
+        return provided_documents(request), None
+
+    breaker = get_breaker("retriever")
+    if not breaker.allow():
+        raise HTTPException(
+            status_code=503,
+            detail="Retriever unavailable (circuit open)",
+        )
 
-    search_term = request.search_query or request.query
+    payload = {
+        "query": request.search_query or request.query,
+        "k": 1,
+        "profile": request.profile,
+        "collection": request.collection,
+        "include_embeddings": POLICY_SEND_EMBEDDINGS,
+    }
 
     try:
-        response = requests.post(
-            f"{RETRIEVER_URL}/search",
-            json={
-                "query": search_term,
-                "k": 1,
-                "profile": request.profile,
-            },
-            timeout=5,
-        )
-        response.raise_for_status()
-        return response.json().get("documents", [])
+        with stage("retrieval", request.profile):
+            response = await retriever_hedger.call(
+                lambda: retriever_post(RETRIEVER_URL, "/search", payload),
+                (lambda: retriever_post(RETRIEVER_HEDGE_URL, "/search", payload))
+                if RETRIEVER_HEDGE_URL
+                else None,
+            )
+        breaker.record_success()
+        return split_vectors(response.json())
+
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
 
     except Exception as exc:
+        record_retriever_outcome(exc)
         logger.error(f"Retriever request failed: {exc}")
         raise HTTPException(
             status_code=503,
@@ -84,6 +366,130 @@ def fetch_documents(request: ChatRequest) -> List[Dict[str, Any]]:
         )
 
 
+async def retriever_post(base_url: str, path: str, payload: Dict[str, Any]) -> httpx.Response:
+    response = await get_client("retriever").post(f"{base_url}{path}", json=payload)
+    response.raise_for_status()
+    return response
+
+
+async def fetch_documents_batch(
+    requests: List[ChatRequest],
+) -> Tuple[List[Union[List[Dict[str, Any]], HTTPException]], List[Optional[Dict[str, Any]]]]:
+    """
+    Resolves documents for many requests with one retriever call.
+    Returns, per request, its documents or the HTTPException it failed
+    with, and per request its vectors for the policy check.
+    """
+    results: List[Any] = [None] * len(requests)
+    vectors: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+    searches = []
+
+    for index, request in enumerate(requests):
+        if request.topology in {"pi", "direct_pi"}:
+            results[index] = provided_documents(request)
+        else:
+            searches.append(index)
+
+    if not searches:
+        return results, vectors
+
+    breaker = get_breaker("retriever")
+    if not breaker.allow():
+        for index in searches:
+            results[index] = HTTPException(
+                status_code=503,
+                detail="Retriever unavailable (circuit open)",
+            )
+        return results, vectors
+
+    payload = {
+        "searches": [
+            {
+                "query": requests[i].search_query or requests[i].query,
+                "k": 1,
+                "profile": requests[i].profile,
+                "collection": requests[i].collection,
+                "include_embeddings": POLICY_SEND_EMBEDDINGS,
+            }
+            for i in searches
+        ]
+    }
+
+    started = time.perf_counter()
+    try:
+        response = await retriever_post(RETRIEVER_URL, "/search/batch", payload)
+        breaker.record_success()
+        observe_stage("retrieval", [requests[i].profile for i in searches], started)
+
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+
+    except Exception as exc:
+        record_retriever_outcome(exc)
+        logger.error(f"Retriever batch request failed: {exc}")
+        for index in searches:
+            results[index] = HTTPException(
+                status_code=503,
+                detail="Retriever unavailable",
+            )
+        return results, vectors
+
+    for index, result in zip(searches, response.json()["results"]):
+        if "error" in result:
+            logger.error(f"Retriever request failed: {result['error']}")
+            results[index] = HTTPException(
+                status_code=503,
+                detail="Retriever unavailable",
+            )
+        else:
+            results[index], vectors[index] = split_vectors(result)
+
+    return results, vectors
+
+
+@contextmanager
+def stage(name: str, profile: str):
+    """
+    Times a pipeline stage into its histogram and, in a traced
+    request, as a span.
+    """
+    label = profile_label(profile)
+    with tracer.span(name, profile=profile), STAGE_SECONDS.labels(name, label).time():
+        yield
+
+
+def profile_label(profile: str) -> str:
+    return profile if profile in METRIC_PROFILES else "other"
+
+
+def observe_wait(name: str, profile: str, seconds: float):
+    STAGE_SECONDS.labels(name, profile_label(profile)).observe(seconds)
+    tracer.record(name, seconds, profile=profile)
+
+
+def observe_stage(name: str, profiles: List[str], started: float):
+    """
+    Records one batched stage against every request that waited on it.
+    """
+    elapsed = time.perf_counter() - started
+    for profile in profiles:
+        STAGE_SECONDS.labels(name, profile_label(profile)).observe(elapsed)
+    tracer.record(name, elapsed, requests=len(profiles))
+
+
+def record_retriever_outcome(exc: Exception):
+    """
+    Client errors (e.g. an unknown collection) mean the retriever is
+    healthy, so only transport errors and 5xx count against the breaker.
+    """
+    breaker = get_breaker("retriever")
+    if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code < 500:
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+
+
 def build_llm_messages(
     request: ChatRequest,
     retrieved_docs: List[Dict[str, Any]],
@@ -124,55 +530,187 @@ def build_llm_messages(
 
     return system_content, request.query
 
-# ------------------------------------------------------------------
-# Endpoint
-# ------------------------------------------------------------------
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_handler(
+def build_llm_payload(
     request: ChatRequest,
-    background_tasks: BackgroundTasks,
-):
-    start_time = time.time()
-
-    logger.info(
-        f"Received query (topology={request.topology}): {request.query}"
-    )
-
-    # 1. Retrieval (or bypass)
-    retrieved_docs = fetch_documents(request)
-
-    # 2. Policy enforcement (before LLM)
-    check_policy(request.query, retrieved_docs)
-
-    # 3. Prompt construction
+    retrieved_docs: List[Dict[str, Any]],
+    stream: bool = False,
+) -> Dict[str, Any]:
     system_content, user_content = build_llm_messages(
         request, retrieved_docs
     )
 
-    llm_payload = {
+    return {
         "model": LLM_MODEL_NAME,
         "messages": [
             {"role": "system", "content": system_content},
             {"role": "user", "content": user_content},
         ],
-        "stream": False,
+        "stream": stream,
         "temperature": 0.0,
         "seed": request.seed,
     }
 
-    # 4. LLM call
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def record_request(endpoint: str, event: Dict[str, Any]):
+    """
+    Adds a finished request to the latency histograms and sends its
+    telemetry event.
+    """
+    profile = profile_label(event["profile"])
+    REQUEST_SECONDS.labels(endpoint, profile, event["status"]).observe(event["latency"])
+    if event.get("first_token_latency") is not None:
+        FIRST_TOKEN_SECONDS.labels(profile).observe(event["first_token_latency"])
+    await log_telemetry(event)
+
+
+async def embed_texts(texts: List[str], collection: Optional[str] = None) -> Tuple[np.ndarray, int]:
+    """
+    Embeds texts with the retriever's dense model. Returns one unit
+    vector per row and the retriever's index generation or, given a
+    collection, the generation of that collection's last change.
+    """
+    breaker = get_breaker("retriever")
+    if not breaker.allow():
+        raise RuntimeError("Retriever circuit open")
+
+    EMBEDDING_BATCH_SIZE.observe(len(texts))
     try:
-        llm_response = requests.post(
-            f"{LLM_API_BASE}/chat/completions",
-            json=llm_payload,
-            timeout=90,
-        )
-        llm_response.raise_for_status()
+        with tracer.span("embedding", texts=len(texts)):
+            response = await retriever_post(
+                RETRIEVER_URL, "/embed", {"texts": texts, "collection": collection}
+            )
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as exc:
+        record_retriever_outcome(exc)
+        raise
+
+    breaker.record_success()
+    data = response.json()
+    RETRIEVER_GENERATION.set(data["generation"])
+    generation = data["collection_generation"] if collection else data["generation"]
+    return np.asarray(data["embeddings"], dtype=np.float32), generation
+
+
+async def embed_vectors(texts: List[str]) -> List[List[float]]:
+    embeddings, _ = await embed_texts(texts)
+    return embeddings.tolist()
+
+
+async def embed_query(text: str, collection: str) -> Tuple[np.ndarray, int]:
+    embeddings, generation = await embed_texts([text], collection)
+    return embeddings[0], generation
+
+
+async def fit_context(
+    request: ChatRequest,
+    retrieved_docs: List[Dict[str, Any]],
+    query_embedding: Optional[np.ndarray] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[BudgetReport]]:
+    """
+    Applies the profile's context token budget.
+
+    Returns the documents to place in the prompt, and a report if they
+    had to be compressed. The documents returned to the caller and
+    inspected by policy are always the full retrieved set.
+    """
+    budget = context_budget.budget_for(request.profile)
+
+    # PI topologies never place retrieved documents in the prompt
+    if (
+        budget is None
+        or request.topology in {"pi", "direct_pi"}
+        or context_budget.total_tokens(retrieved_docs) <= budget
+    ):
+        return retrieved_docs, None
+
+    sentences = [
+        context_budget.split_sentences(doc.get("content", ""))
+        for doc in retrieved_docs
+    ]
+    flat = [sentence for doc_sentences in sentences for sentence in doc_sentences]
+
+    scores = None
+    try:
+        if query_embedding is None:
+            embeddings, _ = await embed_texts([request.query] + flat)
+            query_embedding, embeddings = embeddings[0], embeddings[1:]
+        else:
+            embeddings, _ = await embed_texts(flat)
+        scores = embeddings @ query_embedding
+
+    except Exception as exc:
+        logger.warning(f"Sentence scoring failed, keeping leading sentences: {exc}")
+
+    prompt_docs, report = context_budget.compress(
+        retrieved_docs, sentences, scores, budget
+    )
+    logger.info(
+        f"Context compressed to {budget}-token budget: "
+        f"{report.original_tokens} -> {report.kept_tokens} tokens "
+        f"(ratio={report.ratio:.2f}, dropped={report.dropped_tokens})."
+    )
+    return prompt_docs, report
+
+
+def chat_flight_key(request: ChatRequest) -> str:
+    """
+    Canonical key over every request field, so only requests that
+    would produce the same answer are coalesced.
+    """
+    encoded = json.dumps(request.model_dump(), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def semantic_partition(request: ChatRequest) -> str:
+    """
+    Cache partition for a request. Answers are only comparable when they
+    share a topology, a collection, the same system prompt and a profile
+    (profiles have different context budgets).
+    """
+    prompt_hash = hashlib.sha256(
+        (request.system_prompt or "").encode("utf-8")
+    ).hexdigest()[:16]
+    return f"{request.profile}:{request.topology}:{request.collection}:{prompt_hash}"
+
+
+def prompt_size(llm_payload: Dict[str, Any]) -> int:
+    return sum(len(message["content"]) for message in llm_payload["messages"])
+
+
+async def generate(llm_payload: Dict[str, Any], profile: str) -> Tuple[str, bool]:
+    """
+    Returns the completion for a payload and whether it came from cache.
+    """
+    cache_key = None
+    if llm_cache is not None:
+        cache_key = llm_cache.key_for(llm_payload)
+        cached = await llm_cache.get(cache_key)
+        CACHE_LOOKUPS.labels("llm", "miss" if cached is None else "hit").inc()
+        if cached is not None:
+            return cached, True
+
+    try:
+        async with llm_dispatcher.slot(profile, prompt_size(llm_payload)), llm_pool.lease() as backend:
+            with stage("llm_generation", profile):
+                llm_response = await get_client("llm").post(
+                    f"{backend.url}/chat/completions",
+                    json=llm_payload,
+                )
+                llm_response.raise_for_status()
         generated_text = (
             llm_response.json()["choices"][0]["message"]["content"]
         )
 
+    except HTTPException:
+        raise
+
     except Exception as exc:
         logger.error(f"LLM request failed: {exc}")
         raise HTTPException(
@@ -180,21 +718,514 @@ async def chat_handler(
             detail="LLM unavailable",
         )
 
-    # 5. Telemetry
-    latency = time.time() - start_time
+    if cache_key is not None:
+        await llm_cache.put(cache_key, generated_text)
+
+    return generated_text, False
+
+
+async def stream_generate(llm_payload: Dict[str, Any], profile: str) -> AsyncIterator[str]:
+    """
+    Yields completion text deltas as the LLM produces them.
+    A cached completion is yielded as a single delta.
+    """
+    cache_key = None
+    if llm_cache is not None:
+        cache_key = llm_cache.key_for(llm_payload)
+        cached = await llm_cache.get(cache_key)
+        CACHE_LOOKUPS.labels("llm", "miss" if cached is None else "hit").inc()
+        if cached is not None:
+            yield cached
+            return
+
+    parts = []
+
+    # The slot is held until the stream ends or is closed
+    async with llm_dispatcher.slot(profile, prompt_size(llm_payload)), llm_pool.lease() as backend:
+        with stage("llm_generation", profile):
+            async with get_client("llm").stream(
+                "POST",
+                f"{backend.url}/chat/completions",
+                json={**llm_payload, "stream": True},
+            ) as llm_response:
+                llm_response.raise_for_status()
+
+                # OpenAI-compatible SSE: one "data: {...}" line per chunk
+                async for line in llm_response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+
+    if cache_key is not None:
+        await llm_cache.put(cache_key, "".join(parts))
+
+
+async def generate_guarded(
+    llm_payload: Dict[str, Any],
+    profile: str,
+    scanner: StreamScanner,
+) -> str:
+    """
+    Streams the completion through the output guardrail.
+
+    On the first violation the stream is closed, which drops the
+    upstream connection and stops generation, and 403 is raised.
+    """
+    parts = []
+
+    try:
+        async with aclosing(stream_generate(llm_payload, profile)) as deltas:
+            async for delta in deltas:
+                match = scanner.feed(delta)
+                if match is not None:
+                    output_guard.record_block(match)
+                    raise HTTPException(
+                        status_code=403,
+                        detail="Response blocked by output policy.",
+                    )
+                parts.append(delta)
+
+    except HTTPException:
+        raise
+
+    except Exception as exc:
+        logger.error(f"LLM request failed: {exc}")
+        raise HTTPException(
+            status_code=503,
+            detail="LLM unavailable",
+        )
+
+    return "".join(parts)
+
+
+async def run_llm(
+    llm_payload: Dict[str, Any],
+    profile: str,
+    scanner: Optional[StreamScanner],
+) -> Tuple[str, bool]:
+    """
+    Runs the LLM call, through the output guardrail when one applies.
+    Returns (text, served_from_cache).
+    """
+    if scanner is None:
+        return await generate(llm_payload, profile)
+    return await generate_guarded(llm_payload, profile, scanner), False
+
+
+async def generate_speculatively(
+    request: ChatRequest,
+    retrieved_docs: List[Dict[str, Any]],
+    vectors: Optional[Dict[str, Any]],
+    llm_payload: Dict[str, Any],
+    scanner: Optional[StreamScanner],
+) -> Tuple[str, bool]:
+    """
+    Parallel topology: the LLM call starts while the policy check is
+    still in flight, taking the policy round trip off the critical path.
+
+    The completion is released only once the verdict is in. If policy
+    blocks, the LLM request is cancelled (closing the upstream
+    connection) and the 403 propagates exactly as in the sequential
+    topology.
+    """
+    llm_task = asyncio.create_task(
+        run_llm(llm_payload, request.profile, scanner)
+    )
+
+    try:
+        with stage("policy", request.profile):
+            await check_policy(request.query, retrieved_docs, vectors)
+    except BaseException:
+        llm_task.cancel()
+        await asyncio.gather(llm_task, return_exceptions=True)
+        raise
+
+    return await llm_task
+
+# ------------------------------------------------------------------
+# Endpoint
+# ------------------------------------------------------------------
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat_handler(
+    request: ChatRequest,
+    background_tasks: BackgroundTasks,
+):
+    start_time = time.time()
+
+    logger.info(
+        f"Received query (topology={request.topology}): {request.query}"
+    )
+
+    (response, telemetry), shared = await chat_flight.do(
+        chat_flight_key(request),
+        lambda: answer_chat(request),
+    )
+    if shared:
+        logger.info("Joined an identical in-flight request.")
+
     background_tasks.add_task(
-        log_telemetry,
+        record_request,
+        "chat",
         {
             "timestamp": time.time(),
-            "latency": latency,
-            "profile": request.profile,
-            "status": "success",
-            "topology": request.topology,
+            "latency": time.time() - start_time,
+            **telemetry,
+            "coalesced": shared,
         },
     )
 
-    return ChatResponse(
+    return response
+
+
+async def answer_chat(request: ChatRequest) -> Tuple[ChatResponse, Dict[str, Any]]:
+    """
+    Runs the /chat pipeline once. Returns the response and the
+    request-independent telemetry fields.
+    """
+    start_time = time.time()
+
+    # 0. Semantic cache lookup (opt-in per profile)
+    threshold = semantic_cache.threshold_for(request.profile) if semantic_cache else None
+    query_embedding = None
+
+    if threshold is not None:
+        try:
+            # Only writes to this collection invalidate its cached answers
+            query_embedding, generation = await embed_query(request.query, request.collection)
+        except Exception as exc:
+            logger.warning(f"Semantic cache skipped, embedding failed: {exc}")
+
+    if query_embedding is not None:
+        partition = semantic_partition(request)
+        cached, similarity = semantic_cache.lookup(
+            partition, query_embedding, threshold, generation
+        )
+        if cached is not None:
+            # The answer was checked against the storing request's output
+            # patterns, not this one's; one it would cut counts as a miss
+            cached_scanner = output_guard.scanner_for(request.output_blocklist)
+            if cached_scanner is not None and cached_scanner.feed(cached.response):
+                logger.info("Semantic cache hit skipped, cached answer fails the output guard.")
+                cached = None
+        CACHE_LOOKUPS.labels("semantic", "miss" if cached is None else "hit").inc()
+
+        if cached is not None:
+            # A paraphrase can still be malicious, so the policy check still runs
+            with stage("policy", request.profile):
+                await check_policy(
+                    request.query,
+                    cached.context,
+                    {"query": query_embedding.tolist(), "documents": {}},
+                )
+
+            latency = time.time() - start_time
+            semantic_cache.record_saving(cached.latency, latency)
+            logger.info(f"Semantic cache hit (similarity={similarity:.3f}).")
+
+            response = ChatResponse(
+                response=cached.response,
+                model=LLM_MODEL_NAME,
+                context=cached.context,
+            )
+            return response, {
+                "profile": request.profile,
+                "status": "success",
+                "topology": request.topology,
+                "cache": "semantic",
+            }
+
+    # 1. Retrieval (or bypass)
+    retrieved_docs, vectors = await fetch_documents(request)
+
+    # 2. Prompt construction, within the profile's context budget
+    prompt_docs, budget_report = await fit_context(
+        request, retrieved_docs, query_embedding
+    )
+    llm_payload = build_llm_payload(request, prompt_docs)
+    scanner = output_guard.scanner_for(request.output_blocklist)
+
+    # 3-4. Policy enforcement and LLM call
+    # (served from cache when the exact inputs were seen before)
+    if request.topology == "parallel":
+        generated_text, cache_hit = await generate_speculatively(
+            request, retrieved_docs, vectors, llm_payload, scanner
+        )
+    else:
+        with stage("policy", request.profile):
+            await check_policy(request.query, retrieved_docs, vectors)
+        generated_text, cache_hit = await run_llm(llm_payload, request.profile, scanner)
+
+    # 5. Semantic cache store and telemetry
+    latency = time.time() - start_time
+
+    if query_embedding is not None:
+        semantic_cache.store(
+            partition,
+            query_embedding,
+            CachedAnswer(
+                query=request.query,
+                response=generated_text,
+                context=retrieved_docs,
+                generation=generation,
+                latency=latency,
+            ),
+        )
+
+    response = ChatResponse(
         response=generated_text,
         model=LLM_MODEL_NAME,
         context=retrieved_docs,
     )
+    return response, {
+        "profile": request.profile,
+        "status": "success",
+        "topology": request.topology,
+        "cache": "llm" if cache_hit else None,
+        "context_compression": budget_report.ratio if budget_report else None,
+        "context_dropped_tokens": budget_report.dropped_tokens if budget_report else 0,
+    }
+
+
+@app.post("/chat/stream")
+async def chat_stream_handler(request: ChatRequest):
+    """
+    Streaming variant of /chat using Server-Sent Events.
+
+    Emits a `context` event with the retrieved documents, one `token`
+    event per LLM delta, and a final `done` event with the full response
+    (or an `error` event). Retrieval and policy checks complete before
+    the stream opens, so a blocked request still returns a plain 403.
+    If the output guardrail trips mid-stream, a `blocked` event is sent
+    and the upstream generation is cut off.
+    """
+    start_time = time.time()
+
+    logger.info(
+        f"Received streaming query (topology={request.topology}): {request.query}"
+    )
+
+    retrieved_docs, vectors = await fetch_documents(request)
+    with stage("policy", request.profile):
+        await check_policy(request.query, retrieved_docs, vectors)
+
+    prompt_docs, _ = await fit_context(request, retrieved_docs)
+    llm_payload = build_llm_payload(request, prompt_docs, stream=True)
+    scanner = output_guard.scanner_for(request.output_blocklist)
+
+    async def event_stream():
+        parts = []
+        first_token_latency = None
+        status = "success"
+
+        yield sse_event(
+            "context",
+            {"model": LLM_MODEL_NAME, "context": retrieved_docs},
+        )
+
+        try:
+            async with aclosing(stream_generate(llm_payload, request.profile)) as deltas:
+                async for delta in deltas:
+                    if first_token_latency is None:
+                        first_token_latency = time.time() - start_time
+
+                    match = scanner.feed(delta) if scanner else None
+                    if match is not None:
+                        # Leaving the block closes the upstream request
+                        output_guard.record_block(match)
+                        status = "blocked_output"
+                        break
+
+                    parts.append(delta)
+                    yield sse_event("token", {"text": delta})
+
+            if status == "blocked_output":
+                yield sse_event(
+                    "blocked",
+                    {"detail": "Response blocked by output policy."},
+                )
+            else:
+                yield sse_event("done", {"response": "".join(parts)})
+
+        except HTTPException as exc:
+            # Rejected by admission control
+            status = "rejected"
+            yield sse_event(
+                "error",
+                {"detail": exc.detail, "status_code": exc.status_code},
+            )
+
+        except Exception as exc:
+            status = "error"
+            logger.error(f"LLM stream failed: {exc}")
+            yield sse_event("error", {"detail": "LLM unavailable"})
+
+        finally:
+            # Recorded once the stream ends, including client disconnects
+            await record_request(
+                "stream",
+                {
+                    "timestamp": time.time(),
+                    "latency": time.time() - start_time,
+                    "first_token_latency": first_token_latency,
+                    "profile": request.profile,
+                    "status": status,
+                    "topology": request.topology,
+                    "stream": True,
+                }
+            )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/chat/batch")
+async def chat_batch_handler(batch: BatchChatRequest):
+    """
+    Runs many chat requests in one HTTP call.
+
+    Retrieval is one batched retriever call and policy is one batched
+    inspection. LLM calls then run concurrently up to the dispatcher's
+    capacity. Results stream back as NDJSON in completion order, one
+    line per request: {"id", "status", "response"} on success or
+    {"id", "status", "detail"} on failure.
+    """
+    start_time = time.time()
+    requests = batch.requests
+
+    logger.info(f"Received batch of {len(requests)} queries")
+
+    # 1. Retrieval for the whole batch
+    retrieved, vectors = await fetch_documents_batch(requests)
+
+    # 2. Policy enforcement for every request that retrieved successfully
+    inspected = [i for i, docs in enumerate(retrieved) if not isinstance(docs, HTTPException)]
+    started = time.perf_counter()
+    verdicts = await check_policy_batch(
+        [(requests[i].query, retrieved[i], vectors[i]) for i in inspected]
+    )
+    observe_stage("policy", [requests[i].profile for i in inspected], started)
+    for index, blocked in zip(inspected, verdicts):
+        if blocked:
+            retrieved[index] = HTTPException(
+                status_code=403,
+                detail="Request blocked by security policy.",
+            )
+
+    # 3. LLM calls, never queueing more than the dispatcher can admit
+    concurrency = asyncio.Semaphore(llm_dispatcher.max_concurrency)
+    telemetry: List[Dict[str, Any]] = []
+
+    async def answer(request: BatchChatItem, docs) -> Dict[str, Any]:
+        status = "success"
+        try:
+            if isinstance(docs, HTTPException):
+                raise docs
+
+            async with concurrency:
+                prompt_docs, _ = await fit_context(request, docs)
+                llm_payload = build_llm_payload(request, prompt_docs)
+                scanner = output_guard.scanner_for(request.output_blocklist)
+                generated_text, _ = await run_llm(llm_payload, request.profile, scanner)
+
+            response = ChatResponse(
+                response=generated_text,
+                model=LLM_MODEL_NAME,
+                context=docs,
+            )
+            return {"id": request.id, "status": 200, "response": response.model_dump()}
+
+        except HTTPException as exc:
+            status = "blocked" if exc.status_code == 403 else "error"
+            return {"id": request.id, "status": exc.status_code, "detail": exc.detail}
+
+        finally:
+            telemetry.append(
+                {
+                    "timestamp": time.time(),
+                    "latency": time.time() - start_time,
+                    "profile": request.profile,
+                    "status": status,
+                    "topology": request.topology,
+                    "batch": True,
+                }
+            )
+
+    async def result_stream():
+        tasks = [
+            asyncio.create_task(answer(request, docs))
+            for request, docs in zip(requests, retrieved)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # Client went away: stop generating for the rest of the batch
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.gather(*(record_request("batch", record) for record in telemetry))
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Request and stage latency histograms, cache hit counters and the
+    retriever generation in the Prometheus text format.
+    """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/llm/stats")
+async def llm_stats():
+    return {
+        "dispatch": llm_dispatcher.stats(),
+        "backends": llm_pool.stats(),
+        "singleflight": chat_flight.stats(),
+    }
+
+
+@app.get("/telemetry/stats")
+async def telemetry_stats():
+    return telemetry_exporter.stats()
+
+
+@app.get("/policy/stats")
+async def policy_stats():
+    if local_policy is None:
+        return {"backend": POLICY_BACKEND, "url": POLICY_URL}
+    return {"backend": POLICY_BACKEND, **local_policy.stats()}
+
+
+@app.get("/upstreams/stats")
+async def upstream_stats():
+    return {
+        "breakers": {name: breaker.stats() for name, breaker in BREAKERS.items()},
+        "retriever_hedging": retriever_hedger.stats() if RETRIEVER_HEDGE_URL else None,
+    }
+
+
+@app.get("/guardrails/stats")
+async def guardrails_stats():
+    return {"output": output_guard.stats()}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "llm": llm_cache.stats() if llm_cache else {"enabled": False},
+        "semantic": semantic_cache.stats() if semantic_cache else {"enabled": False},
+    }
@@ -1,8 +1,15 @@
 import os
+import asyncio
+import hashlib
 import logging
-import requests
+import httpx
+from typing import Dict, List, Optional, Set, Tuple
 from fastapi import HTTPException
 
+from breaker import get_breaker
+from clients import get_client
+from telemetry import TelemetryExporter
+
 logger = logging.getLogger("gateway.middleware")
 
 # ------------------------------------------------------------------
@@ -12,26 +19,121 @@ logger = logging.getLogger("gateway.middleware")
 POLICY_URL = os.getenv("POLICY_URL", "http://policy:8002")
 LOGGER_URL = os.getenv("LOGGER_URL", "http://logger:8003")
 
+# "http" calls the policy service; "inprocess" runs its engine in the
+# gateway, for deployments where the two are co-located
+POLICY_BACKEND = os.getenv("POLICY_BACKEND", "http")
+
+if POLICY_BACKEND == "inprocess":
+    from policy_local import LocalPolicy
+
+    local_policy = LocalPolicy.from_env()
+elif POLICY_BACKEND == "http":
+    local_policy = None
+else:
+    raise ValueError("POLICY_BACKEND must be 'http' or 'inprocess'")
+
 # ------------------------------------------------------------------
 # Policy enforcement
 # ------------------------------------------------------------------
 
-def check_policy(query: str, context: list):
+def document_hash(doc: dict) -> str:
+    # `content_hash` is only set on rows from the retriever (see provided_documents)
+    content = doc.get("content", "")
+    return doc.get("content_hash") or hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def document_refs(
+    context: list,
+    resend: Optional[Set[str]] = None,
+    embeddings: Optional[Dict[str, list]] = None,
+) -> List[dict]:
     """
-    Sends the query and retrieved context to the policy service.
-    Raises HTTPException(403) if the request is blocked.
+    Describes context documents to the policy service by content hash.
+
+    The policy service keeps a verdict per hash, so documents are sent
+    without their text. With `resend`, only the documents whose hashes
+    it reported missing are returned, this time with content and, when
+    the retriever supplied it, the stored vector for its classifier.
+    """
+    refs = []
+    for doc in context:
+        digest = document_hash(doc)
+
+        if resend is None:
+            refs.append({"id": doc.get("id"), "hash": digest})
+        elif digest in resend:
+            ref = {"id": doc.get("id"), "hash": digest, "content": doc.get("content", "")}
+            if embeddings and digest in embeddings:
+                ref["embedding"] = embeddings[digest]
+            refs.append(ref)
+
+    return refs
+
+
+def inspect_payload(
+    query: str,
+    context: list,
+    vectors: Optional[dict] = None,
+    resend: Optional[Set[str]] = None,
+) -> dict:
+    """
+    Builds one /inspect item. `vectors` holds the retriever's query
+    vector and stored document vectors ({"query", "documents"}).
     """
+    vectors = vectors or {}
     payload = {
         "query": query,
-        "context": [doc.get("content", "") for doc in context],
+        "documents": document_refs(context, resend, vectors.get("documents")),
     }
+    if vectors.get("query") is not None:
+        payload["query_embedding"] = vectors["query"]
+    return payload
+
+
+async def _post_policy(path: str, payload: dict) -> httpx.Response:
+    breaker = get_breaker("policy")
+    response = await get_client("policy").post(f"{POLICY_URL}{path}", json=payload)
+
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+
+async def check_policy(query: str, context: list, vectors: Optional[dict] = None):
+    """
+    Sends the query and retrieved context to the policy service.
+    Raises HTTPException(403) if the request is blocked.
+    """
+    if local_policy is not None:
+        if (await local_policy.inspect_batch([(query, context, vectors)]))[0]:
+            logger.warning("Request blocked by in-process policy.")
+            raise HTTPException(
+                status_code=403,
+                detail="Request blocked by security policy.",
+            )
+        return
+
+    breaker = get_breaker("policy")
+    if not breaker.allow():
+        # Same fail-open behaviour as an unreachable service, minus the wait
+        logger.warning("Policy circuit open. Proceeding without enforcement.")
+        return
 
     try:
-        response = requests.post(
-            f"{POLICY_URL}/inspect",
-            json=payload,
-            timeout=1.0,
+        response = await _post_policy("/inspect", inspect_payload(query, context, vectors))
+
+        missing = (
+            set(response.json().get("missing", []))
+            if response.status_code == 200
+            else None
         )
+        if missing:
+            # First sighting of these documents: send their text once
+            response = await _post_policy(
+                "/inspect", inspect_payload(query, context, vectors, missing)
+            )
 
         if response.status_code == 403:
             logger.warning("Request blocked by policy service.")
@@ -45,34 +147,157 @@ def check_policy(query: str, context: list):
                 f"Policy service returned unexpected status: {response.status_code}"
             )
 
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
+        breaker.record_failure()
         # Fail-open to avoid blocking experiments if the policy service is unavailable
         logger.warning("Policy service unreachable. Proceeding without enforcement.")
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
+        breaker.record_failure()
         logger.warning("Policy service request timed out. Proceeding without enforcement.")
 
     except HTTPException:
         raise
 
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+
     except Exception as exc:
+        # Any other error (e.g. a dropped connection or a bad body) is the service's
+        breaker.record_failure()
         logger.error(f"Unexpected error in policy middleware: {exc}")
 
 
+async def check_policy_batch(items: List[Tuple[str, list, Optional[dict]]]) -> List[bool]:
+    """
+    Inspects many (query, context, vectors) items in one call to the
+    policy service. Returns one flag per item, True if that item is blocked.
+
+    Falls back to per-item checks if the service has no batch endpoint,
+    and fails open on errors like check_policy.
+    """
+    if not items:
+        return []
+
+    if local_policy is not None:
+        return await local_policy.inspect_batch(items)
+
+    breaker = get_breaker("policy")
+    if not breaker.allow():
+        logger.warning("Policy circuit open. Proceeding without enforcement.")
+        return [False] * len(items)
+
+    payload = {"items": [inspect_payload(*item) for item in items]}
+
+    try:
+        response = await _post_policy("/inspect/batch", payload)
+
+        if response.status_code in (404, 405):
+            return await _check_policy_each(items)
+
+        if response.status_code != 200:
+            # 5xx responses were already counted against the breaker
+            logger.warning(
+                f"Policy service returned unexpected status: {response.status_code}"
+            )
+            return [False] * len(items)
+
+        results = response.json()["results"]
+
+    except (httpx.ConnectError, httpx.TimeoutException) as exc:
+        breaker.record_failure()
+        logger.warning(f"Policy batch check failed ({exc!r}). Proceeding without enforcement.")
+        return [False] * len(items)
+
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+
+    except Exception as exc:
+        breaker.record_failure()
+        logger.error(f"Unexpected error in policy batch middleware: {exc}")
+        return [False] * len(items)
+
+    verdicts = [result.get("blocked", False) for result in results]
+
+    # Resend, with content, only the items that referenced unseen documents
+    resend = [i for i, result in enumerate(results) if result.get("missing")]
+    if resend:
+        resent = await _resend_policy_batch(
+            [inspect_payload(*items[i], set(results[i]["missing"])) for i in resend]
+        )
+        # A failed resend fails open for the resent items only; verdicts
+        # already returned for the others stand
+        for i, result in zip(resend, resent):
+            verdicts[i] = verdicts[i] or result.get("blocked", False)
+
+    if any(verdicts):
+        logger.warning(f"Policy service blocked {sum(verdicts)}/{len(items)} requests.")
+    return verdicts
+
+
+async def _resend_policy_batch(payloads: List[dict]) -> List[dict]:
+    """
+    Sends items again with document content. Returns their results, or
+    empty results (not blocked) if the call fails.
+    """
+    try:
+        response = await _post_policy("/inspect/batch", {"items": payloads})
+        if response.status_code == 200:
+            return response.json()["results"]
+        logger.warning(
+            f"Policy service returned unexpected status on resend: {response.status_code}"
+        )
+
+    except httpx.HTTPError as exc:
+        get_breaker("policy").record_failure()
+        logger.warning(
+            f"Policy resend failed ({exc!r}). {len(payloads)} requests proceed without enforcement."
+        )
+
+    except (ValueError, KeyError) as exc:
+        # Malformed body
+        get_breaker("policy").record_failure()
+        logger.error(f"Unexpected policy resend response: {exc}")
+
+    return [{}] * len(payloads)
+
+
+async def _check_policy_each(items: List[Tuple[str, list, Optional[dict]]]) -> List[bool]:
+    async def blocked(query: str, context: list, vectors: Optional[dict]) -> bool:
+        try:
+            await check_policy(query, context, vectors)
+            return False
+        except HTTPException:
+            return True
+
+    return list(await asyncio.gather(*(blocked(*item) for item in items)))
+
+
 # ------------------------------------------------------------------
 # Telemetry logging
 # ------------------------------------------------------------------
 
-def log_telemetry(metrics: dict):
+async def _send_telemetry(events: List[dict]):
+    response = await get_client("logger").post(
+        f"{LOGGER_URL}/log/batch",
+        json={"events": events},
+    )
+    response.raise_for_status()
+
+
+telemetry_exporter = TelemetryExporter(
+    _send_telemetry,
+    max_queue=int(os.getenv("TELEMETRY_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("TELEMETRY_BATCH_SIZE", "200")),
+    flush_interval=float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "1.0")),
+)
+
+
+async def log_telemetry(metrics: dict):
     """
-    Sends telemetry data to the logger service in the background.
+    Queues telemetry data for the logger service. Never blocks; events
+    are dropped (and counted) if the exporter's queue is full.
     """
-    try:
-        requests.post(
-            f"{LOGGER_URL}/log",
-            json=metrics,
-            timeout=1.0,
-        )
-    except Exception as exc:
-        # Telemetry failures should not affect request handling
-        logger.debug(f"Failed to send telemetry: {exc}")
+    telemetry_exporter.emit(metrics)
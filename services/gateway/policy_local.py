@@ -0,0 +1,168 @@
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from policy_engine import (
+    EmbeddingClassifier,
+    PolicyEngine,
+    VerdictCache,
+    load_bank,
+    load_rules,
+)
+from policy_engine.rules import ACTION_FLAG
+
+logger = logging.getLogger("gateway.policy")
+
+# ------------------------------------------------------------------
+# In-process policy engine
+# ------------------------------------------------------------------
+#
+# With POLICY_BACKEND=inprocess the gateway runs the policy service's
+# engine as a library: the same package and the same rules files,
+# configured by the same variables, baked into the gateway image. The
+# policy stage then costs a cache lookup and a scan instead of an HTTP
+# round trip with the whole context serialized to JSON.
+#
+# Documents are handed over with their text, so there is no hash-only
+# first pass; the verdict cache still skips rescanning documents seen
+# before.
+
+Embedder = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+class LocalPolicy:
+    def __init__(self, engine: PolicyEngine, mode: str = "enforce"):
+        if mode not in ("enforce", "monitor"):
+            raise ValueError("POLICY_MODE must be 'enforce' or 'monitor'")
+
+        self.engine = engine
+        self.mode = mode
+        self.embed: Optional[Embedder] = None
+        self.counters = {"inspected": 0, "matched": 0, "blocked": 0}
+
+    @classmethod
+    def from_env(cls) -> "LocalPolicy":
+        rules = load_rules(os.getenv("POLICY_RULES_PATH", "rules/default_rules.json"))
+        extra = os.getenv("POLICY_EXTRA_RULES", "")
+        for path in filter(None, (p.strip() for p in extra.split(","))):
+            rules.extend(load_rules(path))
+
+        engine = PolicyEngine(
+            rules,
+            VerdictCache(int(os.getenv("POLICY_VERDICT_CACHE_SIZE", "100000"))),
+        )
+        policy = cls(engine, os.getenv("POLICY_MODE", "enforce"))
+        logger.info(f"In-process policy engine ready ({len(rules)} rules, mode={policy.mode}).")
+        return policy
+
+    async def load_classifier(self, embed: Embedder):
+        """
+        Encodes the exemplar bank once the retriever is up, exactly as
+        the standalone service does. Queries without a vector are then
+        encoded with `embed` too.
+        """
+        bank_path = os.getenv("POLICY_CLASSIFIER_BANK", "rules/injection_bank.json")
+        if not bank_path:
+            return
+
+        try:
+            config = load_bank(bank_path)
+        except (OSError, ValueError) as exc:
+            logger.error(f"Embedding classifier disabled: {exc}")
+            return
+
+        while True:
+            try:
+                embeddings = await embed(config["exemplars"])
+                break
+            except Exception as exc:
+                logger.warning(f"Injection bank encoding failed: {exc}")
+                await asyncio.sleep(10)
+
+        self.embed = embed
+        self.engine.set_classifier(
+            EmbeddingClassifier.from_bank(
+                config,
+                embeddings,
+                os.getenv("POLICY_CLASSIFIER_ACTION", ACTION_FLAG),
+            )
+        )
+        logger.info(f"Embedding classifier ready ({self.engine.classifier.stats()}).")
+
+    async def inspect_batch(
+        self, items: List[Tuple[str, list, Optional[dict]]]
+    ) -> List[bool]:
+        """
+        Checks (query, context, vectors) items; True where blocked.
+        """
+        requests = []
+        for query, context, vectors in items:
+            vectors = vectors or {}
+            embeddings = vectors.get("documents") or {}
+            requests.append(
+                {
+                    "query": query,
+                    "query_embedding": vectors.get("query"),
+                    "documents": [
+                        {
+                            "id": doc.get("id"),
+                            "content": doc.get("content", ""),
+                            "embedding": embeddings.get(doc.get("content_hash")),
+                        }
+                        for doc in context
+                    ],
+                }
+            )
+
+        await self._encode_queries(requests)
+        query_scores, document_scores = self.engine.score_items(requests)
+
+        blocked = []
+        for request, query_score, scores in zip(requests, query_scores, document_scores):
+            verdict = self.engine.inspect(
+                request["query"],
+                [],
+                [
+                    {"id": document["id"], "content": document["content"], "score": score}
+                    for document, score in zip(request["documents"], scores)
+                ],
+                query_score,
+            )
+
+            self.counters["inspected"] += 1
+            if verdict.matches:
+                self.counters["matched"] += 1
+                logger.warning(
+                    f"Policy match: {[m.rule_id for m in verdict.matches]} "
+                    f"(blocked={verdict.blocked}, mode={self.mode})"
+                )
+
+            is_blocked = verdict.blocked and self.mode == "enforce"
+            self.counters["blocked"] += is_blocked
+            blocked.append(is_blocked)
+
+        return blocked
+
+    async def _encode_queries(self, requests: List[dict]):
+        unencoded = [r for r in requests if r["query_embedding"] is None]
+        if not unencoded or self.engine.classifier is None:
+            return
+
+        try:
+            encoded = await self.embed([r["query"] for r in unencoded])
+        except Exception as exc:
+            logger.warning(f"Query encoding failed, classifier skipped: {exc}")
+            return
+
+        for request, vector in zip(unencoded, encoded):
+            request["query_embedding"] = vector
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "rules": len(self.engine.rules),
+            **self.counters,
+            "verdict_cache": self.engine.cache.stats(),
+            "classifier": self.engine.classifier.stats() if self.engine.classifier else None,
+        }
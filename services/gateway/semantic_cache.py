@@ -0,0 +1,154 @@
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("gateway.semantic_cache")
+
+# ------------------------------------------------------------------
+# Semantic query cache
+# ------------------------------------------------------------------
+#
+# Answers are cached against the embedding of the query that produced
+# them. A new query is served from cache when its nearest cached
+# neighbour is more similar than the profile's threshold and was
+# answered against the same generation of its collection. Entries live
+# in partitions (profile, topology, collection, system prompt), so PI
+# traffic never shares entries with RAG traffic. Each partition is a ring
+# buffer of unit vectors, and lookup is a single matrix-vector product.
+#
+# Partition keys include a hash of the client's system prompt, so their
+# number is capped: the least recently used partition is evicted past
+# `max_partitions`. A partition's vectors grow in chunks as entries
+# arrive, so a partition holding a few answers stays small.
+
+# Rows a partition's vector array starts with; it doubles up to max_entries
+INITIAL_ROWS = 64
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    response: str
+    context: List[Dict[str, Any]]
+    generation: int
+    latency: float
+
+
+@dataclass
+class _Partition:
+    vectors: np.ndarray
+    entries: List[CachedAnswer] = field(default_factory=list)
+    count: int = 0
+    cursor: int = 0
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        thresholds: Dict[str, float],
+        max_entries: int = 10000,
+        max_partitions: int = 64,
+    ):
+        self.thresholds = thresholds
+        self.max_entries = max_entries
+        self.max_partitions = max_partitions
+        self.partitions: "OrderedDict[str, _Partition]" = OrderedDict()
+
+        self.lookups = 0
+        self.hits = 0
+        self.stale = 0
+        self.evicted = 0
+        self.saved_seconds = 0.0
+
+    def threshold_for(self, profile: str) -> Optional[float]:
+        """
+        Returns the similarity threshold for a profile,
+        or None if semantic caching is disabled for it.
+        """
+        return self.thresholds.get(profile)
+
+    def lookup(
+        self,
+        partition_key: str,
+        embedding: np.ndarray,
+        threshold: float,
+        generation: int,
+    ) -> Tuple[Optional[CachedAnswer], float]:
+        """
+        Returns the nearest cached answer and its similarity,
+        or (None, similarity) if it does not qualify.
+        """
+        self.lookups += 1
+
+        partition = self.partitions.get(partition_key)
+        if partition is None or partition.count == 0:
+            return None, 0.0
+        self.partitions.move_to_end(partition_key)
+
+        similarities = partition.vectors[: partition.count] @ embedding
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+
+        if similarity < threshold:
+            return None, similarity
+
+        entry = partition.entries[best]
+        if entry.generation != generation:
+            # The index changed since this answer was produced
+            self.stale += 1
+            return None, similarity
+
+        self.hits += 1
+        return entry, similarity
+
+    def store(self, partition_key: str, embedding: np.ndarray, entry: CachedAnswer):
+        partition = self.partitions.get(partition_key)
+        if partition is None:
+            partition = self.partitions[partition_key] = _Partition(
+                vectors=np.zeros(
+                    (min(INITIAL_ROWS, self.max_entries), embedding.shape[0]), dtype=np.float32
+                ),
+            )
+            if len(self.partitions) > self.max_partitions:
+                self.partitions.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.partitions.move_to_end(partition_key)
+
+        if partition.count < self.max_entries:
+            slot = partition.count
+            if slot == len(partition.vectors):
+                grown = np.zeros(
+                    (min(slot * 2, self.max_entries), partition.vectors.shape[1]), dtype=np.float32
+                )
+                grown[:slot] = partition.vectors
+                partition.vectors = grown
+            partition.entries.append(entry)
+            partition.count += 1
+        else:
+            # Overwrites the oldest entry once the partition is full
+            slot = partition.cursor
+            partition.entries[slot] = entry
+            partition.cursor = (slot + 1) % self.max_entries
+        partition.vectors[slot] = embedding
+
+    def record_saving(self, original_latency: float, hit_latency: float):
+        self.saved_seconds += max(0.0, original_latency - hit_latency)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "thresholds": self.thresholds,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "stale": self.stale,
+            "evicted": self.evicted,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "saved_seconds": self.saved_seconds,
+            "partitions": {
+                key: partition.count for key, partition in self.partitions.items()
+            },
+        }
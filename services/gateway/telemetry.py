@@ -0,0 +1,140 @@
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger("gateway.telemetry")
+
+# ------------------------------------------------------------------
+# Telemetry exporter
+# ------------------------------------------------------------------
+#
+# Request handlers only enqueue events; a single background task sends
+# them to the logger in batches, whenever `batch_size` events are
+# waiting or `flush_interval` seconds have passed since the first of
+# them arrived. The queue is bounded: when the logger falls behind,
+# new events are dropped and counted rather than held in memory, so
+# telemetry never slows down or grows the gateway under load. A failed
+# batch is retried once; batches lost after that are logged as a
+# warning at most once per `warn_interval` seconds.
+
+Sender = Callable[[List[dict]], Awaitable[None]]
+
+
+class TelemetryExporter:
+    def __init__(
+        self,
+        send: Sender,
+        max_queue: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        retry_delay: float = 0.5,
+        warn_interval: float = 60.0,
+    ):
+        self.send = send
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.warn_interval = warn_interval
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[dict] = []
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.sent = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+
+        # Lost events since the last warning, which is rate-limited
+        self._unreported = 0
+        self._warned_at: Optional[float] = None
+
+    def emit(self, event: dict):
+        try:
+            self._queue.put_nowait(event)
+            self.enqueued += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops the exporter after sending whatever is still queued.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+        # A batch interrupted mid-collection or mid-send goes out first
+        if self._batch:
+            await self._send(self._batch)
+
+        while not self._queue.empty():
+            await self._send(self._drain([]))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            self._batch = batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                self._drain(batch)
+                remaining = deadline - loop.time()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._send(batch)
+            self._batch = []
+
+    def _drain(self, batch: List[dict]) -> List[dict]:
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _send(self, batch: List[dict]):
+        for attempt in range(2):
+            try:
+                await self.send(batch)
+                self.sent += len(batch)
+                self.batches += 1
+                return
+            except Exception as exc:
+                # Telemetry failures should not affect request handling
+                error = exc
+            if attempt == 0:
+                self.retries += 1
+                await asyncio.sleep(self.retry_delay)
+
+        self.failed += len(batch)
+        self._unreported += len(batch)
+
+        now = time.monotonic()
+        if self._warned_at is None or now - self._warned_at >= self.warn_interval:
+            logger.warning(
+                f"Failed to send telemetry, {self._unreported} events lost "
+                f"since the last warning: {error}"
+            )
+            self._unreported = 0
+            self._warned_at = now
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed": self.failed,
+        }
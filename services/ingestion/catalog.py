@@ -0,0 +1,271 @@
+import re
+import logging
+from typing import Optional, Tuple
+
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------
+# Collection catalog
+# ------------------------------------------------------------------
+#
+# Every collection is backed by its own table so that create and drop
+# are single DDL statements. Aliases are rows in a separate table and
+# can be repointed inside one transaction, which makes blue/green
+# reindexing an atomic switch for readers.
+
+DEFAULT_COLLECTION = "default"
+DEFAULT_TABLE = "documents"
+
+_NAME_PATTERN = re.compile(r"^[a-z][a-z0-9_]{0,47}$")
+
+
+class CatalogError(Exception):
+    """Raised for invalid or conflicting collection operations."""
+
+
+def validate_name(name: str) -> str:
+    """
+    Ensures a collection or alias name is safe to embed in a table name.
+    """
+    if not _NAME_PATTERN.match(name):
+        raise CatalogError(
+            f"Invalid name '{name}'. Use lowercase letters, digits and "
+            f"underscores (max 48 characters, starting with a letter)."
+        )
+    return name
+
+
+def table_for(collection: str) -> str:
+    """
+    Maps a collection name to its backing table.
+    The default collection keeps the legacy `documents` table.
+    """
+    if collection == DEFAULT_COLLECTION:
+        return DEFAULT_TABLE
+    return f"{DEFAULT_TABLE}_{collection}"
+
+
+def passages_table_for(table_name: str) -> str:
+    """
+    Maps a collection table to the table holding its chunked passages.
+    """
+    return f"{table_name}_passages"
+
+
+def init_catalog(cur):
+    """
+    Creates the catalog tables and registers the default collection.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS collections (
+            name TEXT PRIMARY KEY,
+            table_name TEXT NOT NULL UNIQUE,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """
+    )
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS collection_aliases (
+            alias TEXT PRIMARY KEY,
+            collection TEXT NOT NULL
+                REFERENCES collections(name) ON DELETE CASCADE,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO collections (name, table_name)
+        VALUES (%s, %s)
+        ON CONFLICT (name) DO NOTHING
+        """,
+        (DEFAULT_COLLECTION, DEFAULT_TABLE),
+    )
+
+    # Brings collections created by earlier versions up to the current layout
+    cur.execute("SELECT table_name FROM collections")
+    for (table_name,) in cur.fetchall():
+        create_collection_table(cur, table_name)
+
+
+def create_collection_table(cur, table_name: str):
+    """
+    Creates a collection's document table and its passage table.
+    Passages link back to their parent document and are removed with it.
+    """
+    passages_table = passages_table_for(table_name)
+
+    cur.execute(
+        sql.SQL("""
+            CREATE TABLE IF NOT EXISTS {} (
+                id TEXT PRIMARY KEY,
+                content TEXT,
+                metadata JSONB,
+                embedding vector(384),
+                content_hash TEXT
+            )
+            """
+        ).format(sql.Identifier(table_name))
+    )
+    # Tables created before content hashing was introduced
+    cur.execute(
+        sql.SQL("ALTER TABLE {} ADD COLUMN IF NOT EXISTS content_hash TEXT").format(
+            sql.Identifier(table_name)
+        )
+    )
+    cur.execute(
+        sql.SQL("""
+            CREATE TABLE IF NOT EXISTS {} (
+                id TEXT PRIMARY KEY,
+                doc_id TEXT NOT NULL REFERENCES {} (id) ON DELETE CASCADE,
+                ordinal INTEGER NOT NULL,
+                content TEXT,
+                token_count INTEGER,
+                embedding vector(384)
+            )
+            """
+        ).format(sql.Identifier(passages_table), sql.Identifier(table_name))
+    )
+    cur.execute(
+        sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} (doc_id)").format(
+            sql.Identifier(f"{passages_table}_doc_id_idx"),
+            sql.Identifier(passages_table),
+        )
+    )
+
+
+def truncate_collection_table(cur, table_name: str):
+    """
+    Empties a collection's documents and passages in one statement.
+    """
+    cur.execute(
+        sql.SQL("TRUNCATE TABLE {}, {}").format(
+            sql.Identifier(passages_table_for(table_name)),
+            sql.Identifier(table_name),
+        )
+    )
+
+
+def resolve(cur, name: str) -> Optional[Tuple[str, str]]:
+    """
+    Resolves a collection or alias name to (collection, table_name).
+    Returns None if neither exists.
+    """
+    cur.execute(
+        """
+        SELECT name, table_name FROM collections
+        WHERE name = COALESCE(
+            (SELECT collection FROM collection_aliases WHERE alias = %s),
+            %s
+        )
+        """,
+        (name, name),
+    )
+    row = cur.fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def create_collection(cur, name: str) -> str:
+    """
+    Creates a collection and its backing table. Idempotent.
+    """
+    validate_name(name)
+
+    cur.execute("SELECT 1 FROM collection_aliases WHERE alias = %s", (name,))
+    if cur.fetchone():
+        raise CatalogError(f"'{name}' is already used as an alias.")
+
+    table_name = table_for(name)
+    create_collection_table(cur, table_name)
+    cur.execute(
+        """
+        INSERT INTO collections (name, table_name)
+        VALUES (%s, %s)
+        ON CONFLICT (name) DO NOTHING
+        """,
+        (name, table_name),
+    )
+    return table_name
+
+
+def drop_collection(cur, name: str) -> Optional[str]:
+    """
+    Drops a collection, its table and every alias pointing at it.
+    Returns the dropped table name, or None if the collection does not exist.
+    """
+    if name == DEFAULT_COLLECTION:
+        raise CatalogError("The default collection cannot be dropped.")
+
+    cur.execute(
+        "DELETE FROM collections WHERE name = %s RETURNING table_name",
+        (name,),
+    )
+    row = cur.fetchone()
+    if not row:
+        return None
+
+    cur.execute(
+        sql.SQL("DROP TABLE IF EXISTS {}, {}").format(
+            sql.Identifier(passages_table_for(row[0])),
+            sql.Identifier(row[0]),
+        )
+    )
+    return row[0]
+
+
+def set_alias(cur, alias: str, collection: str):
+    """
+    Points an alias at a collection, replacing any previous target.
+    """
+    validate_name(alias)
+
+    cur.execute("SELECT 1 FROM collections WHERE name = %s", (alias,))
+    if cur.fetchone():
+        raise CatalogError(f"'{alias}' is already used as a collection name.")
+
+    cur.execute("SELECT 1 FROM collections WHERE name = %s", (collection,))
+    if not cur.fetchone():
+        raise CatalogError(f"Collection '{collection}' does not exist.")
+
+    cur.execute(
+        """
+        INSERT INTO collection_aliases (alias, collection)
+        VALUES (%s, %s)
+        ON CONFLICT (alias) DO UPDATE
+        SET collection = EXCLUDED.collection,
+            updated_at = now()
+        """,
+        (alias, collection),
+    )
+
+
+def drop_alias(cur, alias: str) -> bool:
+    cur.execute(
+        "DELETE FROM collection_aliases WHERE alias = %s RETURNING alias",
+        (alias,),
+    )
+    return cur.fetchone() is not None
+
+
+def list_collections(cur):
+    cur.execute(
+        """
+        SELECT c.name, c.table_name, c.created_at,
+               COALESCE(array_agg(a.alias) FILTER (WHERE a.alias IS NOT NULL), '{}')
+        FROM collections c
+        LEFT JOIN collection_aliases a ON a.collection = c.name
+        GROUP BY c.name, c.table_name, c.created_at
+        ORDER BY c.name
+        """
+    )
+    return [
+        {
+            "name": row[0],
+            "table": row[1],
+            "created_at": row[2].isoformat(),
+            "aliases": list(row[3]),
+        }
+        for row in cur.fetchall()
+    ]
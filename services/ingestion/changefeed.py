@@ -0,0 +1,66 @@
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------
+# Change feed
+# ------------------------------------------------------------------
+#
+# Every write to a collection appends a row to a durable change log in
+# the same transaction as the write itself. The generation number is the
+# log's sequence value, so it is strictly increasing across collections.
+# A NOTIFY is issued alongside; Postgres delivers it only on commit, so
+# listeners never observe a generation whose data is not yet visible.
+#
+# Publishers take a transaction-level advisory lock before drawing a
+# generation, so generations also become visible in order: consumers
+# read the log with `generation > last applied`, and a lower generation
+# committing after a higher one would otherwise be skipped for good.
+# The lock is held from publish to commit, which callers keep short by
+# publishing as the last step before committing.
+
+CHANNEL = "document_changes"
+
+OP_UPSERT = "upsert"
+OP_DELETE = "delete"
+OP_TRUNCATE = "truncate"
+OP_DROP = "drop"
+
+
+def init_changefeed(cur):
+    """
+    Creates the change log table.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS document_changes (
+            generation BIGSERIAL PRIMARY KEY,
+            collection TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            doc_ids TEXT[] NOT NULL DEFAULT '{}',
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """
+    )
+
+
+def publish(cur, collection: str, table_name: str, op: str, doc_ids: List[str] = ()) -> int:
+    """
+    Records a change event and notifies listeners on commit.
+    Returns the generation assigned to the event.
+    """
+    # Released on commit or rollback; serializes generation order with commit order
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (CHANNEL,))
+    cur.execute(
+        """
+        INSERT INTO document_changes (collection, table_name, op, doc_ids)
+        VALUES (%s, %s, %s, %s)
+        RETURNING generation
+        """,
+        (collection, table_name, op, list(doc_ids)),
+    )
+    generation = cur.fetchone()[0]
+
+    cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL, str(generation)))
+    return generation
@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+from typing import List
+
+# ------------------------------------------------------------------
+# Passage chunking
+# ------------------------------------------------------------------
+#
+# MiniLM truncates its input at max_seq_length, so anything past the
+# first window of a long document is never embedded. Documents are
+# split on the embedding model's own tokenizer into overlapping windows
+# that each fit the model, and the windows are mapped back onto the
+# original text through the tokenizer's character offsets.
+
+
+@dataclass
+class Passage:
+    doc_index: int
+    ordinal: int
+    text: str
+    token_count: int
+
+
+def chunk_text(tokenizer, text: str, max_tokens: int, overlap: int) -> List[tuple]:
+    """
+    Splits text into windows of at most max_tokens tokens, with `overlap`
+    tokens shared between consecutive windows.
+
+    Returns a list of (passage_text, token_count) tuples. A max_tokens of
+    zero disables chunking and returns the text as a single passage.
+    """
+    encoding = tokenizer(
+        text,
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        verbose=False,
+    )
+    offsets = encoding["offset_mapping"]
+
+    if max_tokens <= 0 or len(offsets) <= max_tokens:
+        return [(text, len(offsets))]
+
+    stride = max_tokens - overlap
+    chunks = []
+
+    for start in range(0, len(offsets), stride):
+        window = offsets[start:start + max_tokens]
+        chunks.append((text[window[0][0]:window[-1][1]], len(window)))
+
+        if start + max_tokens >= len(offsets):
+            break
+
+    return chunks
+
+
+def chunk_documents(tokenizer, texts: List[str], max_tokens: int, overlap: int) -> List[Passage]:
+    """
+    Chunks a batch of documents, keeping a link from each passage
+    back to its parent document.
+    """
+    passages = []
+    for doc_index, text in enumerate(texts):
+        for ordinal, (chunk, token_count) in enumerate(
+            chunk_text(tokenizer, text, max_tokens, overlap)
+        ):
+            passages.append(Passage(doc_index, ordinal, chunk, token_count))
+    return passages
+
+
+def length_bucketed_batches(lengths: List[int], batch_size: int) -> List[List[int]]:
+    """
+    Groups item indices into batches of similar length.
+
+    Sorting by token count before batching means each batch is padded
+    only up to its own longest item, so a handful of long passages do
+    not inflate the cost of every batch they would otherwise land in.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
@@ -1,13 +1,27 @@
 import os
 import json
+import time
+import asyncio
+import hashlib
 import logging
-from fastapi import FastAPI, HTTPException
+from contextlib import contextmanager
+from fastapi import BackgroundTasks, FastAPI, HTTPException
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
+import httpx
+import numpy as np
 import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import execute_values
 from pgvector.psycopg2 import register_vector
-from sentence_transformers import SentenceTransformer
+
+import catalog
+import changefeed
+from common import debug, metrics, startup, tracing
+from catalog import CatalogError, DEFAULT_COLLECTION
+from chunking import chunk_documents, length_bucketed_batches
 
 # ------------------------------------------------------------------
 # Logging
@@ -22,6 +36,10 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+tracer = tracing.Tracer("ingestion")
+app.middleware("http")(tracer.middleware)
+app.include_router(debug.router)
+
 # ------------------------------------------------------------------
 # Configuration
 # ------------------------------------------------------------------
@@ -31,13 +49,137 @@ DB_NAME = os.getenv("POSTGRES_DB", "ragdb")
 DB_USER = os.getenv("POSTGRES_USER", "postgres")
 DB_PASS = os.getenv("POSTGRES_PASSWORD", "postgres")
 
+# Passage chunking (token counts are in embedding-model tokens).
+# MiniLM's window is 256 tokens including special tokens; 0 disables chunking.
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "32"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+
+# Documents are pre-scanned by the policy service so query-time
+# inspection only has to look up verdicts by content hash
+POLICY_URL = os.getenv("POLICY_URL", "http://policy:8002")
+POLICY_SCAN_ON_INGEST = os.getenv("POLICY_SCAN_ON_INGEST", "true").lower() == "true"
+
+# One pooled client for policy calls, opened on startup
+policy_client: Optional[httpx.AsyncClient] = None
+
+if CHUNK_MAX_TOKENS > 0 and not 0 <= CHUNK_OVERLAP < CHUNK_MAX_TOKENS:
+    raise ValueError("CHUNK_OVERLAP must be in [0, CHUNK_MAX_TOKENS)")
+
+# ------------------------------------------------------------------
+# Metrics
+# ------------------------------------------------------------------
+
+STAGE_SECONDS = metrics.Histogram(
+    "ingestion_stage_seconds",
+    "Time per ingestion stage, per request.",
+    ["stage"],
+)
+EMBEDDING_BATCH_SIZE = metrics.Histogram(
+    "ingestion_embedding_batch_size",
+    "Passages encoded per model call.",
+    low=1,
+    high=4096,
+    per_octave=1,
+)
+INGESTED = metrics.Counter(
+    "ingestion_items_total",
+    "Documents and passages written.",
+    ["kind"],
+)
+PUBLISHED_GENERATION = metrics.Gauge(
+    "ingestion_published_generation",
+    "Highest change-feed generation published by this process.",
+)
+STARTUP_PHASE_SECONDS = metrics.Gauge(
+    "ingestion_startup_phase_seconds",
+    "Time each completed startup phase took.",
+    ["phase"],
+)
+READY = metrics.Gauge(
+    "ingestion_ready",
+    "1 once every startup phase is done, else 0.",
+)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times an ingestion stage into its histogram and, in a traced
+    request, as a span.
+    """
+    with tracer.span(name), STAGE_SECONDS.labels(name).time():
+        yield
+
+
+def observe_stage(name: str, started: float):
+    elapsed = time.perf_counter() - started
+    STAGE_SECONDS.labels(name).observe(elapsed)
+    tracer.record(name, elapsed)
+
+
+def record_generation(generation: int):
+    # Concurrent requests can commit out of order
+    PUBLISHED_GENERATION.set(max(PUBLISHED_GENERATION.labels().get(), generation))
+
 # ------------------------------------------------------------------
 # Embedding model
 # ------------------------------------------------------------------
 
-logger.info("Loading sentence transformer model from local path...")
-model = SentenceTransformer("./model_data", device="cpu")
-logger.info("Embedding model loaded.")
+# Loaded by the "model" startup phase
+model = None
+
+debug.register_component(
+    "model",
+    lambda: debug.module_size(model) if model is not None else {"loaded": False},
+)
+
+
+def load_model():
+    """
+    Imports sentence-transformers (and with it torch) and loads the
+    model. Blocking; run it off the event loop.
+    """
+    global model
+    from sentence_transformers import SentenceTransformer
+
+    logger.info("Loading sentence transformer model from local path...")
+    model = SentenceTransformer("./model_data", device="cpu")
+    logger.info("Embedding model loaded.")
+
+
+def warm_up_model():
+    """
+    Chunks and encodes a throwaway document, so lazy tokenizer, kernel
+    and allocator initialization is not paid by the first ingest.
+    """
+    passages = chunk_documents(
+        model.tokenizer, ["warm-up document"] * 4, CHUNK_MAX_TOKENS, CHUNK_OVERLAP
+    )
+    model.encode([passage.text for passage in passages], batch_size=len(passages))
+
+
+def embed_passages(passages) -> np.ndarray:
+    """
+    Encodes passages in length-bucketed batches and returns the
+    embeddings in the original passage order.
+    """
+    embeddings = np.zeros(
+        (len(passages), model.get_sentence_embedding_dimension()),
+        dtype=np.float32,
+    )
+
+    lengths = [passage.token_count for passage in passages]
+    for batch in length_bucketed_batches(lengths, EMBED_BATCH_SIZE):
+        EMBEDDING_BATCH_SIZE.observe(len(batch))
+        with tracer.span("encode_batch", size=len(batch)):
+            embeddings[batch] = model.encode(
+                [passages[i].text for i in batch],
+                batch_size=len(batch),
+                convert_to_numpy=True,
+            )
+
+    return embeddings
 
 # ------------------------------------------------------------------
 # Request models
@@ -51,6 +193,20 @@ class Document(BaseModel):
 
 class IngestRequest(BaseModel):
     documents: List[Document]
+    collection: str = DEFAULT_COLLECTION
+
+
+class DeleteRequest(BaseModel):
+    ids: List[str]
+    collection: str = DEFAULT_COLLECTION
+
+
+class CollectionRequest(BaseModel):
+    name: str
+
+
+class AliasRequest(BaseModel):
+    collection: str
 
 # ------------------------------------------------------------------
 # Database helpers
@@ -69,8 +225,7 @@ def get_db_connection():
         raise
 
 
-@app.on_event("startup")
-def startup_db():
+def init_schema():
     """
     Initializes the database schema and required extensions.
     """
@@ -83,16 +238,9 @@ def startup_db():
         cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
         
         register_vector(conn)
-        
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id TEXT PRIMARY KEY,
-                content TEXT,
-                metadata JSONB,
-                embedding vector(384)
-            )
-            """
-        )
+
+        catalog.init_catalog(cur)
+        changefeed.init_changefeed(cur)
 
         cur.close()
         conn.close()
@@ -100,50 +248,267 @@ def startup_db():
 
     except Exception as exc:
         logger.critical(f"Startup initialization failed: {exc}")
+        raise
+
+# ------------------------------------------------------------------
+# Startup phases
+# ------------------------------------------------------------------
+
+phases = startup.StartupPhases(
+    retry_delay=float(os.getenv("STARTUP_RETRY_DELAY", "5.0")),
+)
+phases.add("database", lambda: asyncio.to_thread(init_schema))
+phases.add("model", lambda: asyncio.to_thread(load_model))
+phases.add("warmup", lambda: asyncio.to_thread(warm_up_model), after=["model"])
+
+for phase in phases.phases.values():
+    STARTUP_PHASE_SECONDS.labels(phase.name).set_function(lambda phase=phase: phase.seconds or 0.0)
+READY.set_function(lambda: phases.ready)
+
+
+def require_ready():
+    """
+    Rejects a request with 503 until startup has finished, for callers
+    that do not go through a readiness-aware load balancer.
+    """
+    if not phases.ready:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Starting up (pending: {', '.join(phases.pending())})",
+            headers={"Retry-After": "5"},
+        )
+
+
+@app.on_event("startup")
+async def startup_event():
+    global policy_client
+    policy_client = httpx.AsyncClient(timeout=30.0)
+    tracer.start()
+
+    # Schema setup, model loading and warm-up run in the background,
+    # so the server answers liveness probes immediately
+    phases.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await phases.stop()
+    await tracer.stop()
+    await policy_client.aclose()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+async def prescan_documents(documents, embeddings) -> int:
+    """
+    Sends freshly ingested documents, with the vectors just stored for
+    them, to the policy service, which caches a verdict per content hash.
+    Returns the number of documents flagged.
+    Best effort: verdicts are computed lazily on first query otherwise.
+    """
+    try:
+        response = await policy_client.post(
+            f"{POLICY_URL}/scan",
+            headers=tracing.headers(),
+            json={
+                "documents": [
+                    {
+                        "id": doc.id,
+                        "content": doc.text,
+                        "embedding": embeddings[doc.id],
+                    }
+                    for doc in documents
+                ]
+            },
+        )
+        response.raise_for_status()
+
+    except Exception as exc:
+        logger.warning(f"Policy pre-scan skipped: {exc}")
+        return 0
+
+    flagged = [r["id"] for r in response.json()["results"] if r["rule_ids"]]
+    if flagged:
+        logger.warning(f"Policy rules matched {len(flagged)} ingested documents.")
+    return len(flagged)
 
 
+async def prescan_after_ingest(documents, embeddings):
+    """
+    Runs the pre-scan after the /ingest response is sent, so a slow or
+    unavailable policy service never delays ingestion.
+    """
+    with stage("prescan"):
+        await prescan_documents(documents, embeddings)
+
 # ------------------------------------------------------------------
 # Endpoints
 # ------------------------------------------------------------------
 
+@app.get("/health/live")
+async def health_live():
+    """
+    Liveness: the process is up and serving, ready or not.
+    """
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """
+    Readiness: startup phase states and timings, and whether the model
+    is loaded and warmed up. 503 until every phase is done.
+    """
+    report = {
+        **phases.report(),
+        "model_loaded": model is not None,
+        "warmed_up": phases.done("warmup"),
+    }
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+# A plain def: FastAPI runs it in its thread pool, so database writes,
+# chunking and encoding never block the loop (or the health probes)
 @app.post("/ingest")
-async def ingest_documents(request: IngestRequest):
-    logger.info(f"Received ingestion request for {len(request.documents)} documents.")
+def ingest_documents(request: IngestRequest, background_tasks: BackgroundTasks):
+    logger.info(
+        f"Received ingestion request for {len(request.documents)} documents "
+        f"(collection={request.collection})."
+    )
+    require_ready()
 
     conn = get_db_connection()
     register_vector(conn)
     cur = conn.cursor()
 
     try:
+        # Unknown names are created on first ingest; aliases resolve to their target
+        resolved = catalog.resolve(cur, request.collection)
+        if resolved:
+            collection, table_name = resolved
+        else:
+            collection = request.collection
+            table_name = catalog.create_collection(cur, collection)
+
+        passages_table = catalog.passages_table_for(table_name)
+
+        insert_query = sql.SQL("""
+            INSERT INTO {} (id, content, metadata, embedding, content_hash)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (id) DO UPDATE
+            SET content = EXCLUDED.content,
+                metadata = EXCLUDED.metadata,
+                embedding = EXCLUDED.embedding,
+                content_hash = EXCLUDED.content_hash
+            """
+        ).format(sql.Identifier(table_name))
+
+        delete_passages_query = sql.SQL(
+            "DELETE FROM {} WHERE doc_id = ANY(%s)"
+        ).format(sql.Identifier(passages_table))
+
+        insert_passages_query = sql.SQL(
+            "INSERT INTO {} (id, doc_id, ordinal, content, token_count, embedding) VALUES %s"
+        ).format(sql.Identifier(passages_table))
+
+        # Last write wins for IDs repeated within one request
+        documents = list({doc.id: doc for doc in request.documents}.values())
+
+        # Chunk every document, then embed all passages of the request together
+        with stage("chunking"):
+            passages = chunk_documents(
+                model.tokenizer,
+                [doc.text for doc in documents],
+                CHUNK_MAX_TOKENS,
+                CHUNK_OVERLAP,
+            )
+        with stage("embedding"):
+            passage_embeddings = embed_passages(passages)
+        write_started = time.perf_counter()
+
+        logger.info(
+            f"Chunked {len(documents)} documents into {len(passages)} passages."
+        )
+
+        passages_by_doc = {}
+        for index, passage in enumerate(passages):
+            passages_by_doc.setdefault(passage.doc_index, []).append(index)
+
+        cur.execute(delete_passages_query, ([doc.id for doc in documents],))
+
         indexed_count = 0
+        doc_embeddings = {}
 
-        for doc in request.documents:
+        for doc_index, doc in enumerate(documents):
             logger.info(f"Indexing document: {doc.id}")
 
-            # Generate embedding
-            embedding = model.encode(doc.text).tolist()
+            # The document vector is the mean of its passage vectors
+            passage_indices = passages_by_doc[doc_index]
+            embedding = passage_embeddings[passage_indices].mean(axis=0).tolist()
+            doc_embeddings[doc.id] = embedding
 
             # Serialize metadata
             metadata_json = json.dumps(doc.metadata)
 
             # Insert or update document
             cur.execute(
-                """
-                INSERT INTO documents (id, content, metadata, embedding)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (id) DO UPDATE
-                SET content = EXCLUDED.content,
-                    metadata = EXCLUDED.metadata,
-                    embedding = EXCLUDED.embedding
-                """,
-                (doc.id, doc.text, metadata_json, embedding),
+                insert_query,
+                (doc.id, doc.text, metadata_json, embedding, content_hash(doc.text)),
+            )
+
+            execute_values(
+                cur,
+                insert_passages_query,
+                [
+                    (
+                        f"{doc.id}#{passages[i].ordinal}",
+                        doc.id,
+                        passages[i].ordinal,
+                        passages[i].text,
+                        passages[i].token_count,
+                        passage_embeddings[i],
+                    )
+                    for i in passage_indices
+                ],
             )
 
             indexed_count += 1
 
+        # Published in the same transaction, so the event commits with the data
+        generation = changefeed.publish(
+            cur,
+            collection,
+            table_name,
+            changefeed.OP_UPSERT,
+            [doc.id for doc in documents],
+        )
+
         conn.commit()
-        logger.info(f"Successfully indexed {indexed_count} documents.")
-        return {"status": "success", "indexed": indexed_count}
+        observe_stage("write", write_started)
+        INGESTED.labels("documents").inc(indexed_count)
+        INGESTED.labels("passages").inc(len(passages))
+        record_generation(generation)
+        logger.info(
+            f"Successfully indexed {indexed_count} documents into '{collection}' "
+            f"(generation={generation})."
+        )
+
+        if POLICY_SCAN_ON_INGEST:
+            background_tasks.add_task(prescan_after_ingest, documents, doc_embeddings)
+
+        return {
+            "status": "success",
+            "indexed": indexed_count,
+            "collection": collection,
+            "generation": generation,
+            "prescan": "scheduled" if POLICY_SCAN_ON_INGEST else "disabled",
+        }
+
+    except CatalogError as exc:
+        conn.rollback()
+        raise HTTPException(status_code=400, detail=str(exc))
 
     except Exception as exc:
         logger.error(f"Ingestion failed: {exc}")
@@ -156,25 +521,46 @@ async def ingest_documents(request: IngestRequest):
 
 
 @app.post("/reset")
-def reset_database():
+def reset_database(collection: str = DEFAULT_COLLECTION):
     """
-    Clears all stored documents.
-    Used to ensure a clean state between experiments.
+    Clears all documents stored in a single collection.
+    Used to ensure a clean state between experiments without
+    affecting other collections on the same stack.
     """
-    logger.warning("Reset request received. Truncating documents table.")
+    logger.warning(f"Reset request received for collection '{collection}'.")
 
     conn = None
     try:
         conn = get_db_connection()
-        conn.autocommit = True
         cur = conn.cursor()
 
-        cur.execute("TRUNCATE TABLE documents;")
+        resolved = catalog.resolve(cur, collection)
+        if not resolved:
+            cur.close()
+            conn.close()
+            raise HTTPException(
+                status_code=404,
+                detail=f"Collection '{collection}' not found",
+            )
+
+        catalog.truncate_collection_table(cur, resolved[1])
+        generation = changefeed.publish(
+            cur, resolved[0], resolved[1], changefeed.OP_TRUNCATE
+        )
+        conn.commit()
+        record_generation(generation)
 
         cur.close()
         conn.close()
-        logger.info("Database reset completed.")
-        return {"status": "success", "message": "Vector database truncated"}
+        logger.info(f"Collection '{resolved[0]}' reset completed.")
+        return {
+            "status": "success",
+            "message": f"Collection '{resolved[0]}' truncated",
+            "generation": generation,
+        }
+
+    except HTTPException:
+        raise
 
     except Exception as exc:
         logger.error(f"Database reset failed: {exc}")
@@ -183,6 +569,154 @@ def reset_database():
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.post("/delete")
+def delete_documents(request: DeleteRequest):
+    """
+    Removes documents by ID from a collection.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        resolved = catalog.resolve(cur, request.collection)
+        if not resolved:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Collection '{request.collection}' not found",
+            )
+        collection, table_name = resolved
+
+        cur.execute(
+            sql.SQL("DELETE FROM {} WHERE id = ANY(%s) RETURNING id").format(
+                sql.Identifier(table_name)
+            ),
+            (request.ids,),
+        )
+        deleted_ids = [row[0] for row in cur.fetchall()]
+
+        generation = changefeed.publish(
+            cur, collection, table_name, changefeed.OP_DELETE, deleted_ids
+        )
+        conn.commit()
+        record_generation(generation)
+
+        logger.info(
+            f"Deleted {len(deleted_ids)} documents from '{collection}' "
+            f"(generation={generation})."
+        )
+        return {
+            "status": "success",
+            "deleted": len(deleted_ids),
+            "collection": collection,
+            "generation": generation,
+        }
+
+    except HTTPException:
+        conn.rollback()
+        raise
+
+    except Exception as exc:
+        logger.error(f"Deletion failed: {exc}")
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=str(exc))
+
+    finally:
+        cur.close()
+        conn.close()
+
+
+# ------------------------------------------------------------------
+# Collection management
+# ------------------------------------------------------------------
+
+def run_catalog_operation(operation, *args):
+    """
+    Executes a catalog operation in its own transaction.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        result = operation(cur, *args)
+        conn.commit()
+        return result
+
+    except CatalogError as exc:
+        conn.rollback()
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    except Exception as exc:
+        conn.rollback()
+        logger.error(f"Catalog operation failed: {exc}")
+        raise HTTPException(status_code=500, detail=str(exc))
+
+    finally:
+        cur.close()
+        conn.close()
+
+
+@app.get("/collections")
+def list_collections():
+    return {"collections": run_catalog_operation(catalog.list_collections)}
+
+
+@app.post("/collections")
+def create_collection(request: CollectionRequest):
+    table_name = run_catalog_operation(catalog.create_collection, request.name)
+    logger.info(f"Collection '{request.name}' ready (table={table_name}).")
+    return {"status": "success", "collection": request.name}
+
+
+def drop_and_publish(cur, name: str):
+    """
+    Drops a collection and records the drop in the change feed.
+    Returns the event generation, or None if the collection is unknown.
+    """
+    table_name = catalog.drop_collection(cur, name)
+    if table_name is None:
+        return None
+    return changefeed.publish(cur, name, table_name, changefeed.OP_DROP)
+
+
+@app.delete("/collections/{name}")
+def drop_collection(name: str):
+    generation = run_catalog_operation(drop_and_publish, name)
+    if generation is None:
+        raise HTTPException(status_code=404, detail=f"Collection '{name}' not found")
+    record_generation(generation)
+    logger.warning(f"Collection '{name}' dropped.")
+    return {"status": "success", "collection": name, "generation": generation}
+
+
+@app.put("/aliases/{alias}")
+def set_alias(alias: str, request: AliasRequest):
+    """
+    Atomically points an alias at a collection.
+    Readers resolving the alias switch over on commit.
+    """
+    run_catalog_operation(catalog.set_alias, alias, request.collection)
+    logger.info(f"Alias '{alias}' now points to '{request.collection}'.")
+    return {"status": "success", "alias": alias, "collection": request.collection}
+
+
+@app.delete("/aliases/{alias}")
+def drop_alias(alias: str):
+    if not run_catalog_operation(catalog.drop_alias, alias):
+        raise HTTPException(status_code=404, detail=f"Alias '{alias}' not found")
+    return {"status": "success", "alias": alias}
+
+# ------------------------------------------------------------------
+# Metrics
+# ------------------------------------------------------------------
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """
+    Stage latency histograms, embedding batch sizes and the published
+    generation in the Prometheus text format.
+    """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # ------------------------------------------------------------------
 # Local entrypoint
 # ------------------------------------------------------------------
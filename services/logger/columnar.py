@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+logger = logging.getLogger("logger.columnar")
+
+# ------------------------------------------------------------------
+# Columnar telemetry store
+# ------------------------------------------------------------------
+#
+# Events are buffered in memory and written as Parquet files under
+# hive-style hourly partitions (date=YYYY-MM-DD/hour=HH), so a query
+# over a time range only opens the partitions it overlaps. Fields the
+# reports group or aggregate on get their own typed column; everything
+# else is kept as a JSON string in `attributes`, as are values of the
+# typed columns that do not convert (a non-numeric latency, say), so
+# every event the JSONL log accepts also lands here.
+#
+# Rows a flush fails to write stay buffered for the next one, up to
+# `max_buffered` rows; beyond that the oldest are dropped and counted.
+#
+# Aggregates run on Arrow columns: grouping, percentiles (t-digest,
+# approximate) and rates never materialize Python objects per event.
+# Buffered events that are not on disk yet are included in queries.
+
+SCHEMA = pa.schema(
+    [
+        ("timestamp", pa.float64()),
+        ("latency", pa.float64()),
+        ("first_token_latency", pa.float64()),
+        ("profile", pa.string()),
+        ("topology", pa.string()),
+        ("status", pa.string()),
+        ("attributes", pa.string()),
+    ]
+)
+
+GROUP_COLUMNS = ("profile", "topology", "status")
+METRIC_COLUMNS = ("latency", "first_token_latency")
+ERROR_STATUSES = ["error", "rejected"]
+BLOCKED_STATUSES = ["blocked", "blocked_output"]
+
+_CORE = set(SCHEMA.names) - {"attributes"}
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _row(event: dict) -> dict:
+    row = {name: event.get(name) for name in _CORE}
+    extra = {key: value for key, value in event.items() if key not in _CORE}
+
+    for name in ("timestamp", "latency", "first_token_latency"):
+        if row[name] is not None:
+            number = _number(row[name])
+            if number is None:
+                extra[name] = row[name]
+            row[name] = number
+    for name in GROUP_COLUMNS:
+        if row[name] is not None:
+            row[name] = str(row[name])
+
+    if row["timestamp"] is None:
+        row["timestamp"] = time.time()
+
+    row["attributes"] = json.dumps(extra) if extra else None
+    return row
+
+
+class ColumnarStore:
+    def __init__(
+        self,
+        root: str,
+        flush_rows: int = 10000,
+        flush_interval: float = 60.0,
+        max_buffered: Optional[int] = None,
+    ):
+        self.root = root
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered or flush_rows * 10
+
+        self._rows: List[dict] = []
+        # Rows being written by a flush, still served from memory
+        self._writing: List[dict] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+        self.files = 0
+        self.written = 0
+        self.dropped = 0
+
+    def open(self):
+        os.makedirs(self.root, exist_ok=True)
+        self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+        await self.flush()
+
+    def append(self, events: List[dict]):
+        self._rows.extend(_row(event) for event in events)
+        if len(self._rows) >= self.flush_rows:
+            asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        """
+        Writes buffered rows. Never raises: rows that could not be
+        written are kept for the next flush.
+        """
+        async with self._lock:
+            rows, self._rows = self._rows, []
+            self._writing = unwritten = rows
+            try:
+                if rows:
+                    unwritten = await asyncio.to_thread(self._write, rows)
+            except Exception as exc:
+                logger.error(f"Parquet flush failed, keeping {len(rows)} rows buffered: {exc}")
+            finally:
+                self._requeue(unwritten)
+                self._writing = []
+
+    def _requeue(self, rows: List[dict]):
+        if not rows:
+            return
+        self._rows = rows + self._rows
+
+        excess = len(self._rows) - self.max_buffered
+        if excess > 0:
+            del self._rows[:excess]
+            self.dropped += excess
+            logger.warning(f"Parquet buffer full, dropped the {excess} oldest rows.")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def _write(self, rows: List[dict]) -> List[dict]:
+        """
+        Writes rows as one file per hourly partition they fall in.
+        Returns the rows of partitions that could not be written.
+        """
+        table = pa.Table.from_pylist(rows, schema=SCHEMA)
+        hours = pc.floor(pc.divide(table["timestamp"], 3600.0))
+        unwritten = []
+
+        for hour in pc.unique(hours).to_pylist():
+            part = table.filter(pc.equal(hours, hour))
+            stamp = time.gmtime(hour * 3600)
+            directory = os.path.join(
+                self.root,
+                f"date={time.strftime('%Y-%m-%d', stamp)}",
+                f"hour={time.strftime('%H', stamp)}",
+            )
+            try:
+                os.makedirs(directory, exist_ok=True)
+                pq.write_table(
+                    part,
+                    os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet"),
+                    compression="zstd",
+                )
+            except (OSError, pa.ArrowException) as exc:
+                logger.error(f"Failed to write partition {directory}: {exc}")
+                unwritten.extend(part.to_pylist())
+                continue
+
+            self.files += 1
+            self.written += part.num_rows
+
+        return unwritten
+
+    # --------------------------------------------------------------
+    # Queries
+    # --------------------------------------------------------------
+
+    def load(self, start: Optional[float] = None, end: Optional[float] = None) -> pa.Table:
+        """
+        Returns events in [start, end), reading only overlapping partitions.
+        """
+        tables = []
+
+        if any(name.startswith("date=") for name in os.listdir(self.root)):
+            dataset = ds.dataset(
+                self.root,
+                format="parquet",
+                partitioning=ds.partitioning(
+                    pa.schema([("date", pa.string()), ("hour", pa.string())]),
+                    flavor="hive",
+                ),
+            )
+            tables.append(
+                dataset.to_table(columns=SCHEMA.names, filter=_range_filter(start, end))
+            )
+
+        buffered = self._writing + self._rows
+        if buffered:
+            table = pa.Table.from_pylist(buffered, schema=SCHEMA)
+            condition = _range_filter(start, end, partitions=False)
+            tables.append(table if condition is None else table.filter(condition))
+
+        if not tables:
+            return SCHEMA.empty_table()
+        return pa.concat_tables(tables)
+
+    def aggregate(
+        self,
+        group_by: Sequence[str] = ("profile", "topology"),
+        bucket: Optional[float] = None,
+        metric: str = "latency",
+        percentiles: Sequence[float] = (50, 95, 99),
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> dict:
+        """
+        Counts, error and block rates, mean and percentiles of `metric`,
+        grouped by `group_by` and, with `bucket` seconds, by time bucket.
+        """
+        unknown = set(group_by) - set(GROUP_COLUMNS)
+        if unknown:
+            raise ValueError(f"Cannot group by {sorted(unknown)}")
+        if metric not in METRIC_COLUMNS:
+            raise ValueError(f"Unknown metric '{metric}'")
+
+        table = self.load(start, end)
+        keys = list(group_by)
+
+        table = table.append_column(
+            "error", pc.cast(pc.is_in(table["status"], pa.array(ERROR_STATUSES)), pa.int8())
+        ).append_column(
+            "blocked", pc.cast(pc.is_in(table["status"], pa.array(BLOCKED_STATUSES)), pa.int8())
+        )
+        if bucket:
+            table = table.append_column(
+                "bucket",
+                pc.multiply(pc.floor(pc.divide(table["timestamp"], bucket)), bucket),
+            )
+            keys.append("bucket")
+
+        quantiles = [p / 100.0 for p in percentiles]
+        grouped = table.group_by(keys).aggregate(
+            [
+                ("timestamp", "count"),
+                ("error", "mean"),
+                ("blocked", "mean"),
+                (metric, "mean"),
+                (metric, "tdigest", pc.TDigestOptions(q=quantiles)),
+            ]
+        )
+
+        groups = []
+        for row in grouped.to_pylist():
+            digest = row.pop(f"{metric}_tdigest") or [None] * len(quantiles)
+            group = {key: row[key] for key in keys}
+            group.update(
+                {
+                    "count": row["timestamp_count"],
+                    "error_rate": row["error_mean"],
+                    "blocked_rate": row["blocked_mean"],
+                    "mean": row[f"{metric}_mean"],
+                }
+            )
+            for p, value in zip(percentiles, digest):
+                group[f"p{p:g}"] = None if value != value else value
+            groups.append(group)
+
+        groups.sort(key=lambda g: tuple(str(g[key]) for key in keys))
+        return {"metric": metric, "events": table.num_rows, "groups": groups}
+
+    def stats(self) -> dict:
+        return {
+            "root": self.root,
+            "buffered": len(self._rows),
+            "written": self.written,
+            "dropped": self.dropped,
+            "files": self.files,
+        }
+
+
+def _partition_of(timestamp: float):
+    stamp = time.gmtime(timestamp)
+    return time.strftime("%Y-%m-%d", stamp), time.strftime("%H", stamp)
+
+
+def _range_filter(start: Optional[float], end: Optional[float], partitions: bool = True):
+    """
+    Filter for [start, end). The date and hour terms let the dataset
+    skip whole hourly partitions; the timestamp terms trim the edges.
+    """
+    date, hour = ds.field("date"), ds.field("hour")
+    terms = []
+    if start is not None:
+        terms.append(ds.field("timestamp") >= start)
+        if partitions:
+            first_date, first_hour = _partition_of(start)
+            terms.append((date > first_date) | ((date == first_date) & (hour >= first_hour)))
+    if end is not None:
+        terms.append(ds.field("timestamp") < end)
+        if partitions:
+            last_date, last_hour = _partition_of(end)
+            terms.append((date < last_date) | ((date == last_date) & (hour <= last_hour)))
+
+    condition = None
+    for term in terms:
+        condition = term if condition is None else condition & term
+    return condition
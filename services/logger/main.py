@@ -1,15 +1,135 @@
-from fastapi import FastAPI, Request
-import json
+from fastapi import FastAPI, HTTPException, Request, Response
+from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
+import logging
 import os
 
+from columnar import ColumnarStore
+from common import debug
+from writer import RotatingWriter
+
+logging.basicConfig(level=logging.INFO)
+
 app = FastAPI()
+app.include_router(debug.router)
+
+# One long-lived writer; rotated files are gzipped alongside it
+writer = RotatingWriter(
+    "logs/results.jsonl",
+    max_bytes=int(os.getenv("LOG_MAX_BYTES", str(64 * 1024 * 1024))),
+    flush_interval=float(os.getenv("LOG_FLUSH_INTERVAL", "1.0")),
+)
+
+# Trace spans from every service, in Zipkin v2 JSON, one per line
+spans_writer = RotatingWriter(
+    "logs/spans.jsonl",
+    max_bytes=int(os.getenv("LOG_MAX_BYTES", str(64 * 1024 * 1024))),
+    flush_interval=float(os.getenv("LOG_FLUSH_INTERVAL", "1.0")),
+)
+
+# Hourly-partitioned Parquet copy of every event, for aggregate queries
+LOG_PARQUET_DIR = os.getenv("LOG_PARQUET_DIR", "logs/parquet")
+store = (
+    ColumnarStore(
+        LOG_PARQUET_DIR,
+        flush_rows=int(os.getenv("LOG_PARQUET_FLUSH_ROWS", "10000")),
+        flush_interval=float(os.getenv("LOG_PARQUET_FLUSH_INTERVAL", "60.0")),
+    )
+    if LOG_PARQUET_DIR
+    else None
+)
+
+
+debug.register_component("jsonl", writer.stats)
+debug.register_component("parquet", lambda: store.stats() if store else None)
+
+
+class LogBatch(BaseModel):
+    events: List[dict]
+
+
+@app.on_event("startup")
+async def startup_event():
+    writer.open()
+    spans_writer.open()
+    if store is not None:
+        store.open()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await writer.close()
+    await spans_writer.close()
+    if store is not None:
+        await store.close()
 
-# Ensure logs dir exists
-os.makedirs("logs", exist_ok=True)
 
 @app.post("/log")
 async def log(request: Request):
     data = await request.json()
-    with open("logs/results.jsonl", "a") as f:
-        f.write(json.dumps(data) + "\n")
-    return {"status": "logged"}
\ No newline at end of file
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Event must be a JSON object")
+    writer.write([data])
+    if store is not None:
+        store.append([data])
+    return {"status": "logged"}
+
+
+@app.post("/log/batch")
+async def log_batch(batch: LogBatch):
+    # Flushed as a group: one write per batch, however many events
+    writer.write(batch.events, flush=True)
+    if store is not None:
+        store.append(batch.events)
+    return {"status": "logged", "count": len(batch.events)}
+
+
+@app.post("/api/v2/spans", status_code=202)
+async def collect_spans(spans: List[dict]):
+    """
+    Zipkin-compatible span collector, so services can export traces
+    here or to any Zipkin/Jaeger collector interchangeably.
+    """
+    spans_writer.write(spans)
+    return Response(status_code=202)
+
+
+@app.get("/query")
+async def query(
+    group_by: str = "profile,topology",
+    bucket: Optional[float] = None,
+    metric: str = "latency",
+    percentiles: str = "50,95,99",
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+):
+    """
+    Aggregates events in [start, end) (epoch seconds): count, error and
+    block rates, mean and percentiles of `metric`, grouped by the given
+    columns and, with `bucket` seconds, by time bucket.
+    """
+    if store is None:
+        raise HTTPException(status_code=404, detail="Columnar store disabled")
+
+    try:
+        return await asyncio.to_thread(
+            store.aggregate,
+            [column for column in group_by.split(",") if column],
+            bucket,
+            metric,
+            [float(p) for p in percentiles.split(",")],
+            start,
+            end,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "jsonl": writer.stats(),
+        "spans": spans_writer.stats(),
+        "parquet": store.stats() if store is not None else None,
+    }
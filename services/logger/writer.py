@@ -0,0 +1,112 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import asyncio
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger("logger.writer")
+
+# ------------------------------------------------------------------
+# Rotating JSONL writer
+# ------------------------------------------------------------------
+#
+# One file handle stays open for the life of the process. Events are
+# appended to its buffer and flushed once per batch or once per flush
+# interval, whichever comes first, so many small requests share a
+# single write to disk. When the file passes `max_bytes` it is renamed
+# with a timestamp and gzipped in a worker thread, off the event loop,
+# while new events go to a fresh file.
+
+
+class RotatingWriter:
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, flush_interval: float = 1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+
+        self._file = None
+        self._size = 0
+        self._dirty = False
+        self._flusher: Optional[asyncio.Task] = None
+        self._compressions = set()
+
+        self.events = 0
+        self.flushes = 0
+        self.rotations = 0
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+        self.flush()
+        self._file.close()
+        if self._compressions:
+            await asyncio.gather(*self._compressions, return_exceptions=True)
+
+    def write(self, events: List[dict], flush: bool = False):
+        """
+        Appends events, one JSON line each. `flush` forces them to disk
+        now; otherwise the periodic flusher picks them up.
+        """
+        data = "".join(json.dumps(event) + "\n" for event in events)
+        self._file.write(data)
+        self._size += len(data.encode("utf-8"))
+        self._dirty = True
+        self.events += len(events)
+
+        if flush:
+            self.flush()
+        if self._size >= self.max_bytes:
+            self._rotate()
+
+    def flush(self):
+        if self._dirty:
+            self._file.flush()
+            self._dirty = False
+            self.flushes += 1
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def _rotate(self):
+        self.flush()
+        self._file.close()
+
+        base, ext = os.path.splitext(self.path)
+        rotated = f"{base}-{time.strftime('%Y%m%dT%H%M%S')}-{self.rotations}{ext}"
+        os.rename(self.path, rotated)
+
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = 0
+        self.rotations += 1
+
+        task = asyncio.ensure_future(asyncio.to_thread(_compress, rotated))
+        self._compressions.add(task)
+        task.add_done_callback(self._compressions.discard)
+        logger.info(f"Rotated telemetry log to {rotated}.gz")
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "bytes": self._size,
+            "events": self.events,
+            "flushes": self.flushes,
+            "rotations": self.rotations,
+            "pending_compressions": len(self._compressions),
+        }
+
+
+def _compress(path: str):
+    with open(path, "rb") as src, gzip.open(f"{path}.gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
@@ -0,0 +1,399 @@
+import os
+import asyncio
+import logging
+import httpx
+from contextlib import contextmanager
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+from typing import List, Optional, Tuple
+
+from policy_engine import (
+    EmbeddingClassifier,
+    PolicyEngine,
+    VerdictCache,
+    load_bank,
+    load_rules,
+)
+from policy_engine.rules import ACTION_BLOCK, ACTION_FLAG
+from common import debug, metrics, tracing
+
+# ------------------------------------------------------------------
+# Logging
+# ------------------------------------------------------------------
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("policy")
+
+# ------------------------------------------------------------------
+# App setup
+# ------------------------------------------------------------------
+
+app = FastAPI(title="Policy Service")
+
+tracer = tracing.Tracer("policy")
+app.middleware("http")(tracer.middleware)
+app.include_router(debug.router)
+
+# ------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------
+
+# Default rules are exported from the harness payload set; extra rule
+# files (comma-separated paths) are layered on top.
+POLICY_RULES_PATH = os.getenv("POLICY_RULES_PATH", "rules/default_rules.json")
+POLICY_EXTRA_RULES = os.getenv("POLICY_EXTRA_RULES", "")
+
+# "enforce" blocks matching requests; "monitor" only reports matches,
+# which keeps baseline (undefended) experiments runnable.
+POLICY_MODE = os.getenv("POLICY_MODE", "enforce")
+
+# Per-document verdicts kept by content hash
+POLICY_VERDICT_CACHE_SIZE = int(os.getenv("POLICY_VERDICT_CACHE_SIZE", "100000"))
+
+if POLICY_MODE not in ("enforce", "monitor"):
+    raise ValueError("POLICY_MODE must be 'enforce' or 'monitor'")
+
+# Injection exemplars for the embedding classifier (empty disables it).
+# Exemplars are encoded by the retriever, whose model produced the
+# stored document vectors the classifier compares against.
+POLICY_CLASSIFIER_BANK = os.getenv("POLICY_CLASSIFIER_BANK", "rules/injection_bank.json")
+POLICY_CLASSIFIER_ACTION = os.getenv("POLICY_CLASSIFIER_ACTION", ACTION_FLAG)
+RETRIEVER_URL = os.getenv("RETRIEVER_URL", "http://retriever:8001")
+
+# One pooled client for retriever calls, opened on startup
+retriever_client: Optional[httpx.AsyncClient] = None
+
+# ------------------------------------------------------------------
+# Engine
+# ------------------------------------------------------------------
+
+rules = load_rules(POLICY_RULES_PATH)
+for path in filter(None, (p.strip() for p in POLICY_EXTRA_RULES.split(","))):
+    rules.extend(load_rules(path))
+
+engine = PolicyEngine(rules, VerdictCache(POLICY_VERDICT_CACHE_SIZE))
+logger.info(f"Policy engine ready ({len(rules)} rules, mode={POLICY_MODE}).")
+
+stats = {"inspected": 0, "matched": 0, "blocked": 0}
+
+debug.register_component("matcher", lambda: debug.deep_size(engine.matcher))
+debug.register_component(
+    "verdict_cache",
+    lambda: {**engine.cache.stats(), **debug.deep_size(engine.cache)},
+)
+debug.register_component(
+    "classifier",
+    lambda: {"bank_bytes": engine.classifier.bank.nbytes} if engine.classifier else None,
+)
+
+# ------------------------------------------------------------------
+# Metrics
+# ------------------------------------------------------------------
+
+STAGE_SECONDS = metrics.Histogram(
+    "policy_stage_seconds",
+    "Time per policy stage, per call.",
+    ["stage"],
+)
+CLASSIFIER_BATCH_SIZE = metrics.Histogram(
+    "policy_classifier_batch_size",
+    "Vectors scored per classifier call.",
+    low=1,
+    high=4096,
+    per_octave=1,
+)
+VERDICTS = metrics.Counter(
+    "policy_verdicts_total",
+    "Inspected requests by outcome.",
+    ["outcome"],
+)
+VERDICT_CACHE = metrics.Counter(
+    "policy_verdict_cache_total",
+    "Per-document verdict cache lookups by result.",
+    ["result"],
+)
+VERDICT_CACHE_ENTRIES = metrics.Gauge(
+    "policy_verdict_cache_entries",
+    "Documents with a cached verdict.",
+)
+
+for _outcome in stats:
+    VERDICTS.labels(_outcome).set_function(lambda outcome=_outcome: stats[outcome])
+VERDICT_CACHE.labels("hit").set_function(lambda: engine.cache.hits)
+VERDICT_CACHE.labels("miss").set_function(lambda: engine.cache.misses)
+VERDICT_CACHE_ENTRIES.set_function(lambda: engine.cache.stats()["entries"])
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times a policy stage into its histogram and, in a traced request,
+    as a span.
+    """
+    with tracer.span(name), STAGE_SECONDS.labels(name).time():
+        yield
+
+# ------------------------------------------------------------------
+# Request models
+# ------------------------------------------------------------------
+
+class DocumentRef(BaseModel):
+    hash: str
+    id: Optional[str] = None
+    # Only needed the first time a document is seen
+    content: Optional[str] = None
+    # Stored document vector, scored by the classifier alongside content
+    embedding: Optional[List[float]] = None
+
+
+class InspectRequest(BaseModel):
+    query: str
+    context: List[str] = []
+    documents: List[DocumentRef] = []
+    # Saves the classifier encoding the query when already known
+    query_embedding: Optional[List[float]] = None
+
+
+class BatchInspectRequest(BaseModel):
+    items: List[InspectRequest]
+
+
+class ScanDocument(BaseModel):
+    id: str
+    content: str
+    embedding: Optional[List[float]] = None
+
+
+class ScanRequest(BaseModel):
+    documents: List[ScanDocument]
+
+# ------------------------------------------------------------------
+# Lifecycle events
+# ------------------------------------------------------------------
+
+@app.on_event("startup")
+async def startup_event():
+    global retriever_client
+    retriever_client = httpx.AsyncClient(timeout=30.0)
+    tracer.start()
+    if POLICY_CLASSIFIER_BANK:
+        asyncio.create_task(load_classifier())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await tracer.stop()
+    await retriever_client.aclose()
+
+
+async def load_classifier():
+    """
+    Encodes the exemplar bank once the retriever is up. Until then,
+    requests are checked by signature rules only.
+    """
+    try:
+        config = load_bank(POLICY_CLASSIFIER_BANK)
+    except (OSError, ValueError) as exc:
+        logger.error(f"Embedding classifier disabled: {exc}")
+        return
+
+    while True:
+        embeddings = await embed_texts(config["exemplars"])
+        if embeddings is not None:
+            break
+        await asyncio.sleep(10)
+
+    engine.set_classifier(
+        EmbeddingClassifier.from_bank(config, embeddings, POLICY_CLASSIFIER_ACTION)
+    )
+    logger.info(f"Embedding classifier ready ({engine.classifier.stats()}).")
+
+# ------------------------------------------------------------------
+# Helpers
+# ------------------------------------------------------------------
+
+async def embed_texts(texts: List[str]) -> Optional[List[List[float]]]:
+    """
+    Encodes texts with the retriever's model. Returns None on failure.
+    """
+    try:
+        response = await retriever_client.post(
+            f"{RETRIEVER_URL}/embed",
+            json={"texts": texts},
+            headers=tracing.headers(),
+        )
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    except Exception as exc:
+        logger.warning(f"Embedding request failed: {exc}")
+        return None
+
+
+async def classify(
+    items: List[InspectRequest],
+) -> Tuple[List[Optional[float]], List[List[Optional[float]]]]:
+    """
+    Scores every query and every document sent with content and a
+    vector, across all items, in one batch. Queries without a vector
+    are encoded together in a single retriever call.
+    """
+    query_vectors = [item.query_embedding for item in items]
+    unencoded = [i for i, vector in enumerate(query_vectors) if vector is None]
+    if unencoded and engine.classifier is not None:
+        with stage("query_embedding"):
+            encoded = await embed_texts([items[i].query for i in unencoded]) or []
+        for i, vector in zip(unencoded, encoded):
+            query_vectors[i] = vector
+
+    requests = [
+        {
+            "query_embedding": vector,
+            "documents": [document.model_dump() for document in item.documents],
+        }
+        for item, vector in zip(items, query_vectors)
+    ]
+    if engine.classifier is not None:
+        CLASSIFIER_BATCH_SIZE.observe(
+            sum(vector is not None for vector in query_vectors)
+            + sum(
+                d.embedding is not None and d.content is not None
+                for item in items
+                for d in item.documents
+            )
+        )
+
+    with stage("classifier"):
+        return engine.score_items(requests)
+
+
+async def evaluate_batch(items: List[InspectRequest]) -> List[dict]:
+    query_scores, document_scores = await classify(items)
+    with stage("rules"):
+        return [
+            evaluate(item, query_score, scores)
+            for item, query_score, scores in zip(items, query_scores, document_scores)
+        ]
+
+
+def evaluate(
+    request: InspectRequest,
+    query_score: Optional[float] = None,
+    document_scores: Optional[List[Optional[float]]] = None,
+) -> dict:
+    scores = document_scores or [None] * len(request.documents)
+    verdict = engine.inspect(
+        request.query,
+        request.context,
+        [
+            {**document.model_dump(exclude={"embedding"}), "score": score}
+            for document, score in zip(request.documents, scores)
+        ],
+        query_score,
+    )
+
+    stats["inspected"] += 1
+    if verdict.matches:
+        stats["matched"] += 1
+        logger.warning(
+            f"Policy match: {[m.rule_id for m in verdict.matches]} "
+            f"(blocked={verdict.blocked}, mode={POLICY_MODE})"
+        )
+
+    result = verdict.to_dict()
+    result["blocked"] = verdict.blocked and POLICY_MODE == "enforce"
+    if result["blocked"]:
+        stats["blocked"] += 1
+    return result
+
+# ------------------------------------------------------------------
+# Endpoints
+# ------------------------------------------------------------------
+
+@app.post("/inspect")
+async def inspect(request: InspectRequest):
+    """
+    Returns 200 with the matches if the request may proceed,
+    or 403 if a blocking rule matched.
+
+    Documents may be sent as hashes only. Hashes without a cached
+    verdict are listed under "missing" and must be resent with content.
+    """
+    result = (await evaluate_batch([request]))[0]
+    if result["blocked"]:
+        return JSONResponse(status_code=403, content=result)
+    return result
+
+
+@app.post("/inspect/batch")
+async def inspect_batch(request: BatchInspectRequest):
+    """
+    Inspects many requests in one call. Always returns 200 with one
+    result per item, in order.
+    """
+    return {"results": await evaluate_batch(request.items)}
+
+
+@app.post("/scan")
+async def scan_documents(request: ScanRequest):
+    """
+    Computes and caches verdicts for documents, e.g. at ingestion time.
+    Documents sent with their stored vector are also classified.
+    """
+    scored = [
+        i for i, document in enumerate(request.documents)
+        if document.embedding is not None
+    ]
+    vectors = [request.documents[i].embedding for i in scored]
+
+    scores = [None] * len(request.documents)
+    if vectors and engine.classifier is not None:
+        CLASSIFIER_BATCH_SIZE.observe(len(vectors))
+    with stage("classifier"):
+        for i, score in zip(scored, engine.classify(vectors) or []):
+            scores[i] = score
+
+    results = []
+    with stage("scan"):
+        for document, score in zip(request.documents, scores):
+            digest, found = engine.scan_document(document.content, score)
+            results.append(
+                {
+                    "id": document.id,
+                    "hash": digest,
+                    "blocked": any(
+                        engine.rules[rule_id].action == ACTION_BLOCK for rule_id, _ in found
+                    ),
+                    "rule_ids": [rule_id for rule_id, _ in found],
+                }
+            )
+    return {"results": results}
+
+
+@app.get("/rules")
+async def list_rules():
+    return {
+        "mode": POLICY_MODE,
+        "rules": [rule.__dict__ for rule in engine.rules.values()],
+    }
+
+
+@app.get("/stats")
+async def policy_stats():
+    return {
+        "mode": POLICY_MODE,
+        "rules": len(engine.rules),
+        **stats,
+        "verdict_cache": engine.cache.stats(),
+        "classifier": engine.classifier.stats() if engine.classifier else None,
+    }
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Stage latency histograms, classifier batch sizes and verdict cache
+    counters in the Prometheus text format.
+    """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
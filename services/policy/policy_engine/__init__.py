@@ -0,0 +1,18 @@
+from .classifier import EmbeddingClassifier, load_bank
+from .engine import Match, PolicyEngine, Verdict
+from .matcher import PatternMatcher
+from .rules import Rule, load_rules
+from .verdicts import VerdictCache, content_hash
+
+__all__ = [
+    "EmbeddingClassifier",
+    "Match",
+    "PatternMatcher",
+    "PolicyEngine",
+    "Rule",
+    "Verdict",
+    "VerdictCache",
+    "content_hash",
+    "load_bank",
+    "load_rules",
+]
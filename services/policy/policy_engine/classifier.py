@@ -0,0 +1,132 @@
+import json
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from .rules import ACTION_BLOCK, ACTION_FLAG, Rule
+
+logger = logging.getLogger("policy.classifier")
+
+# ------------------------------------------------------------------
+# Embedding classifier
+# ------------------------------------------------------------------
+#
+# Signature rules only catch the exact strings they list. The classifier
+# compares texts against a bank of known injection embeddings instead, so
+# paraphrases land near the exemplars they rephrase. A text's features are
+# its highest and mean top-k cosine similarity to the bank; without a
+# trained head the score is the highest similarity, with one it is the
+# head's probability.
+#
+# Vectors come from the retriever's model: document vectors are the ones
+# ingestion stored in pgvector, so scoring never re-encodes a document.
+#
+# Bank files are JSON: {"version": 1, "threshold", "top_k", "head":
+# {"weights": [w_max, w_mean], "bias"} | null, "exemplars": [...]},
+# exported by data/scripts/export_injection_bank.py.
+
+CLASSIFIER_RULE_ID = "clf-embedding"
+
+
+@dataclass(frozen=True)
+class LogisticHead:
+    weights: np.ndarray
+    bias: float
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-(features @ self.weights + self.bias)))
+
+
+def load_bank(path: str) -> dict:
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    if not data.get("exemplars"):
+        raise ValueError(f"Injection bank {path} has no exemplars")
+
+    logger.info(f"Loaded {len(data['exemplars'])} injection exemplars from {path}")
+    return data
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class EmbeddingClassifier:
+    def __init__(
+        self,
+        bank: np.ndarray,
+        threshold: float,
+        top_k: int = 3,
+        head: Optional[LogisticHead] = None,
+        action: str = ACTION_FLAG,
+    ):
+        if action not in (ACTION_BLOCK, ACTION_FLAG):
+            raise ValueError(f"Unknown classifier action '{action}'")
+
+        self.bank = normalize(np.asarray(bank, dtype=np.float32))
+        self.threshold = threshold
+        self.top_k = min(top_k, len(self.bank))
+        self.head = head
+        self.rule = Rule(
+            id=CLASSIFIER_RULE_ID,
+            pattern="",
+            category="prompt_injection",
+            action=action,
+        )
+
+    @classmethod
+    def from_bank(cls, config: dict, embeddings: List[List[float]], action: str):
+        """
+        Builds a classifier from a bank file and its encoded exemplars.
+        """
+        head = config.get("head")
+        return cls(
+            np.asarray(embeddings, dtype=np.float32),
+            threshold=float(config.get("threshold", 0.75)),
+            top_k=int(config.get("top_k", 3)),
+            head=LogisticHead(
+                weights=np.asarray(head["weights"], dtype=np.float32),
+                bias=float(head["bias"]),
+            )
+            if head
+            else None,
+            action=action,
+        )
+
+    @property
+    def dimension(self) -> int:
+        return self.bank.shape[1]
+
+    def features(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Returns an (n, 2) array of [max, mean top-k] similarities.
+        """
+        similarities = normalize(vectors) @ self.bank.T
+        top = -np.partition(-similarities, self.top_k - 1, axis=1)[:, : self.top_k]
+        return np.stack([top.max(axis=1), top.mean(axis=1)], axis=1)
+
+    def score(self, vectors) -> np.ndarray:
+        """
+        Scores a batch of vectors with one matrix product.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        if not len(vectors):
+            return np.zeros(0, dtype=np.float32)
+
+        features = self.features(vectors)
+        if self.head is not None:
+            return self.head.predict(features)
+        return features[:, 0]
+
+    def stats(self) -> dict:
+        return {
+            "exemplars": len(self.bank),
+            "dimension": self.dimension,
+            "threshold": self.threshold,
+            "head": self.head is not None,
+            "action": self.rule.action,
+        }
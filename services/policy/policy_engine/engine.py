@@ -0,0 +1,194 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .classifier import CLASSIFIER_RULE_ID, EmbeddingClassifier
+from .matcher import PatternMatcher
+from .rules import ACTION_BLOCK, Rule
+from .verdicts import DocumentMatches, VerdictCache, content_hash
+
+# ------------------------------------------------------------------
+# Policy engine
+# ------------------------------------------------------------------
+
+
+@dataclass
+class Match:
+    rule_id: str
+    category: str
+    action: str
+    source: str
+    offset: int
+
+
+@dataclass
+class Verdict:
+    blocked: bool
+    matches: List[Match] = field(default_factory=list)
+
+    # Hashes of documents that were referenced without content and
+    # have no cached verdict; the caller must resend them with content
+    missing: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "blocked": self.blocked,
+            "matches": [match.__dict__ for match in self.matches],
+            "missing": self.missing,
+        }
+
+
+class PolicyEngine:
+    def __init__(
+        self,
+        rules: List[Rule],
+        cache: Optional[VerdictCache] = None,
+        classifier: Optional[EmbeddingClassifier] = None,
+    ):
+        self.rules: Dict[str, Rule] = {rule.id: rule for rule in rules}
+        self.matcher = PatternMatcher((rule.id, rule.pattern) for rule in rules)
+        self.cache = cache or VerdictCache()
+        self.classifier = None
+        if classifier is not None:
+            self.set_classifier(classifier)
+
+    def set_classifier(self, classifier: EmbeddingClassifier):
+        """
+        Enables embedding classification. Cached document verdicts were
+        computed without it, so they are dropped.
+        """
+        self.classifier = classifier
+        self.rules[CLASSIFIER_RULE_ID] = classifier.rule
+        self.cache.clear()
+
+    def classify(self, vectors) -> Optional[list]:
+        """
+        Scores a batch of embeddings, or returns None without a classifier.
+        """
+        if self.classifier is None:
+            return None
+        return self.classifier.score(vectors).tolist()
+
+    def score_items(self, items: List[dict]) -> tuple:
+        """
+        Classifier scores for a batch of inspect items, each
+        {"query_embedding"?, "documents": [{"content"?, "embedding"?}]},
+        from one matrix product. Documents are scored only when sent
+        with content, since only then is their verdict computed. Returns
+        per item the query score and one score per document (None where
+        unscored).
+        """
+        query_scores = [None] * len(items)
+        document_scores = [[None] * len(item["documents"]) for item in items]
+        if self.classifier is None:
+            return query_scores, document_scores
+
+        dimension = self.classifier.dimension
+        vectors, owners = [], []
+        for i, item in enumerate(items):
+            vector = item.get("query_embedding")
+            if vector is not None and len(vector) == dimension:
+                vectors.append(vector)
+                owners.append((i, None))
+            for j, document in enumerate(item["documents"]):
+                vector = document.get("embedding")
+                if (
+                    document.get("content") is not None
+                    and vector is not None
+                    and len(vector) == dimension
+                ):
+                    vectors.append(vector)
+                    owners.append((i, j))
+
+        for (i, j), score in zip(owners, self.classify(vectors)):
+            if j is None:
+                query_scores[i] = score
+            else:
+                document_scores[i][j] = score
+
+        return query_scores, document_scores
+
+    def _classifier_hit(self, score: Optional[float]) -> bool:
+        return (
+            score is not None
+            and self.classifier is not None
+            and score >= self.classifier.threshold
+        )
+
+    def find(self, text: str) -> DocumentMatches:
+        """
+        Returns (rule_id, offset) for the first occurrence of each rule.
+        """
+        found = {}
+        for rule_id, end in self.matcher.scan(text):
+            if rule_id not in found:
+                found[rule_id] = end - len(self.rules[rule_id].pattern)
+        return list(found.items())
+
+    def _matches(self, found: DocumentMatches, source: str) -> List[Match]:
+        return [
+            Match(
+                rule_id=rule_id,
+                category=self.rules[rule_id].category,
+                action=self.rules[rule_id].action,
+                source=source,
+                offset=offset,
+            )
+            for rule_id, offset in found
+        ]
+
+    def scan(self, text: str, source: str) -> List[Match]:
+        return self._matches(self.find(text), source)
+
+    def scan_document(self, content: str, score: Optional[float] = None) -> tuple:
+        """
+        Scans a document once and caches the result under its content
+        hash, together with the classifier's verdict when the document's
+        score is given. Returns (hash, matches).
+        """
+        digest = content_hash(content)
+        found = self.cache.get(digest)
+        if found is None:
+            found = self.find(content)
+            if self._classifier_hit(score):
+                found.append((CLASSIFIER_RULE_ID, 0))
+            self.cache.put(digest, found)
+        return digest, found
+
+    def inspect(
+        self,
+        query: str,
+        context: List[str],
+        documents: Optional[List[dict]] = None,
+        query_score: Optional[float] = None,
+    ) -> Verdict:
+        """
+        Scans the query and each context chunk, and resolves documents
+        ({"id", "hash", "content"?, "score"?}) through the verdict cache.
+        Every character is visited once; chunks are scanned separately
+        so no match can straddle two of them. Classifier scores, when
+        given, are computed by the caller in one batch via classify().
+        """
+        matches = self.scan(query, "query")
+        if self._classifier_hit(query_score):
+            matches.extend(self._matches([(CLASSIFIER_RULE_ID, 0)], "query"))
+        for index, chunk in enumerate(context):
+            matches.extend(self.scan(chunk, f"context[{index}]"))
+
+        missing = []
+        for index, document in enumerate(documents or []):
+            source = f"document[{document.get('id', index)}]"
+
+            if document.get("content") is not None:
+                _, found = self.scan_document(
+                    document["content"], document.get("score")
+                )
+            else:
+                found = self.cache.get(document["hash"])
+                if found is None:
+                    missing.append(document["hash"])
+                    continue
+
+            matches.extend(self._matches(found, source))
+
+        blocked = any(match.action == ACTION_BLOCK for match in matches)
+        return Verdict(blocked=blocked, matches=matches, missing=missing)
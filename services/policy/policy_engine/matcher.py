@@ -0,0 +1,111 @@
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+# ------------------------------------------------------------------
+# Multi-pattern matcher
+# ------------------------------------------------------------------
+#
+# All rule patterns are compiled into one Aho-Corasick automaton, so a
+# text is scanned once regardless of how many rules there are. Matching
+# is case-insensitive. While the automaton sits in its root state, a
+# precompiled character class jumps straight to the next position that
+# can start a pattern, which skips most benign text at C speed.
+
+
+class PatternMatcher:
+    def __init__(self, patterns: Iterable[Tuple[str, str]]):
+        """
+        `patterns` is an iterable of (key, pattern) pairs. A match reports
+        the keys of every pattern that ends at that position.
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[Tuple[str, ...]] = [()]
+        self.size = 0
+
+        for key, pattern in patterns:
+            if pattern:
+                self._insert(key, pattern.lower())
+                self.size += 1
+
+        self._link()
+
+        first_chars = "".join(sorted(self._goto[0]))
+        self._root_skip = (
+            re.compile(f"[{re.escape(first_chars)}]") if first_chars else None
+        )
+
+    def _insert(self, key: str, pattern: str):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append(())
+            state = next_state
+        self._outputs[state] += (key,)
+
+    def _link(self):
+        # Breadth-first, so every failure target is linked before it is used
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+
+                # Patterns that are suffixes of this one end here too
+                self._outputs[child] += self._outputs[self._fail[child]]
+
+    def scan(self, text: str) -> List[Tuple[str, int]]:
+        """
+        Returns (key, end_offset) for every pattern occurrence in text.
+        """
+        return self.resume(0, text)[0]
+
+    def resume(self, state: int, text: str, first: bool = False) -> Tuple[List[Tuple[str, int]], int]:
+        """
+        Scans text from an automaton state returned by an earlier call, so
+        a stream can be checked chunk by chunk without re-reading anything
+        and a match straddling two chunks is still found. Returns the
+        matches and the state to resume from; with `first`, stops at the
+        first match.
+        """
+        if self._root_skip is None:
+            return [], 0
+
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        text = text.lower()
+        matches = []
+
+        position = 0
+        length = len(text)
+
+        while position < length:
+            if state == 0:
+                jump = self._root_skip.search(text, position)
+                if jump is None:
+                    break
+                position = jump.start()
+
+            char = text[position]
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            for key in outputs[state]:
+                matches.append((key, position + 1))
+            if first and matches:
+                return matches, state
+
+            position += 1
+
+        return matches, state
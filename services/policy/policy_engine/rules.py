@@ -0,0 +1,49 @@
+import json
+import logging
+from dataclasses import dataclass
+from typing import List
+
+logger = logging.getLogger("policy.rules")
+
+# ------------------------------------------------------------------
+# Rule definitions
+# ------------------------------------------------------------------
+#
+# Rules files are JSON: {"version": 1, "rules": [{"id", "pattern",
+# "category", "action"}, ...]}. The default set is exported from the
+# harness payloads by data/scripts/export_policy_rules.py; deployments
+# can layer their own files on top.
+
+ACTION_BLOCK = "block"
+ACTION_FLAG = "flag"
+
+
+@dataclass(frozen=True)
+class Rule:
+    id: str
+    pattern: str
+    category: str = "custom"
+    action: str = ACTION_BLOCK
+
+
+def load_rules(path: str) -> List[Rule]:
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    rules = []
+    for entry in data.get("rules", []):
+        action = entry.get("action", ACTION_BLOCK)
+        if action not in (ACTION_BLOCK, ACTION_FLAG):
+            raise ValueError(f"Rule {entry.get('id')} has unknown action '{action}'")
+
+        rules.append(
+            Rule(
+                id=entry["id"],
+                pattern=entry["pattern"],
+                category=entry.get("category", "custom"),
+                action=action,
+            )
+        )
+
+    logger.info(f"Loaded {len(rules)} rules from {path}")
+    return rules
@@ -0,0 +1,58 @@
+import hashlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# ------------------------------------------------------------------
+# Document verdict cache
+# ------------------------------------------------------------------
+#
+# Retrieved documents repeat across requests, so each document's rule
+# matches are computed once and kept under the hash of its content.
+# Hashes are always computed here from the content itself, never taken
+# from the caller, so a cached verdict can only ever describe the exact
+# text it was computed from. The cache lives for the life of the
+# process, which also ties every entry to the currently loaded rules.
+
+# (rule_id, offset) pairs for one document
+DocumentMatches = List[Tuple[str, int]]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, DocumentMatches]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str) -> Optional[DocumentMatches]:
+        matches = self._entries.get(digest)
+        if matches is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return matches
+
+    def put(self, digest: str, matches: DocumentMatches):
+        self._entries[digest] = matches
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,39 @@
+import logging
+from typing import Optional
+
+logger = logging.getLogger("retriever.catalog")
+
+# ------------------------------------------------------------------
+# Collection resolution
+# ------------------------------------------------------------------
+#
+# The catalog tables are owned by the ingestion service. The retriever
+# only reads them, resolving a collection or alias name to the table
+# that backs it. Resolution happens per request so an alias switch on
+# the ingestion side takes effect on the very next search.
+
+DEFAULT_COLLECTION = "default"
+DEFAULT_TABLE = "documents"
+
+
+def resolve_table(conn, name: str) -> Optional[str]:
+    """
+    Resolves a collection or alias name to its backing table.
+    Returns None if the name is unknown.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT table_name FROM collections
+            WHERE name = COALESCE(
+                (SELECT collection FROM collection_aliases WHERE alias = %s),
+                %s
+            )
+            """,
+            (name, name),
+        )
+        row = cur.fetchone()
+        return row[0] if row else None
+    finally:
+        cur.close()
@@ -0,0 +1,254 @@
+import time
+import select
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, List
+
+import psycopg2
+from psycopg2 import sql
+
+logger = logging.getLogger("retriever.changefeed")
+
+# ------------------------------------------------------------------
+# Change-feed consumer
+# ------------------------------------------------------------------
+#
+# The ingestion service appends every write to `document_changes` and
+# issues a NOTIFY on commit. This consumer LISTENs on a dedicated
+# connection, reads the log from the last applied generation and hands
+# the changes to the sparse indexes. The log is the source of truth;
+# notifications only wake the consumer up, and a periodic poll covers
+# any that are missed while reconnecting. Publishers commit generations
+# in order (under an advisory lock), so reading everything past the last
+# applied generation cannot skip a change that commits late.
+#
+# The consumer runs in its own thread, but the set of loaded indexes
+# belongs to the event loop: dropping an index is handed to the loop
+# with call_soon_threadsafe, ahead of waking any wait_for() callers.
+
+CHANNEL = "document_changes"
+
+
+class ChangeFeedConsumer:
+    def __init__(
+        self,
+        db_config,
+        get_ranker: Callable[[str], object],
+        drop_ranker: Callable[[str], None],
+        poll_interval: float = 5.0,
+    ):
+        self.db_config = db_config
+        self.get_ranker = get_ranker
+        self.drop_ranker = drop_ranker
+        self.poll_interval = poll_interval
+
+        self.applied_generation = 0
+        # Last applied generation that changed each table, so callers can
+        # tell whether one collection changed without watching them all
+        self.table_generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._waiters = []
+        self._stopped = threading.Event()
+        self._thread = None
+        self._loop = None
+
+    # --------------------------------------------------------------
+    # Lifecycle
+    # --------------------------------------------------------------
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """
+        Records the current head of the log and starts consuming from it.
+        `loop` is the event loop that owns the loaded indexes.
+
+        Must run before any sparse index is built: every index snapshot is
+        then taken at or after the starting generation, so no change can
+        fall between a snapshot and the consumer.
+        """
+        self._loop = loop
+        try:
+            conn = psycopg2.connect(**self.db_config)
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT COALESCE(MAX(generation), 0) FROM document_changes")
+                head = cur.fetchone()[0]
+                cur.execute(
+                    "SELECT table_name, MAX(generation) FROM document_changes "
+                    "WHERE generation <= %s GROUP BY table_name",
+                    (head,),
+                )
+                self.table_generations.update(cur.fetchall())
+                self._advance(head)
+            finally:
+                conn.close()
+        except Exception as exc:
+            # The log does not exist yet, so there is nothing to skip
+            logger.warning(f"Could not read change log head: {exc}")
+
+        logger.info(f"Change feed starting at generation {self.applied_generation}.")
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name="changefeed",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    async def wait_for(self, generation: int, timeout: float) -> bool:
+        """
+        Waits until the given generation has been applied.
+        Returns False if the timeout expires first.
+        """
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            if self.applied_generation >= generation:
+                return True
+            waiter = (generation, loop, loop.create_future())
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(waiter[2], timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    # --------------------------------------------------------------
+    # Consumer loop
+    # --------------------------------------------------------------
+
+    def _run(self):
+        while not self._stopped.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.db_config)
+                conn.autocommit = True
+
+                cur = conn.cursor()
+                cur.execute(sql.SQL("LISTEN {}").format(sql.Identifier(CHANNEL)))
+
+                # Catch up on anything committed while disconnected
+                self._consume(cur)
+
+                while not self._stopped.is_set():
+                    ready, _, _ = select.select([conn], [], [], self.poll_interval)
+                    if ready:
+                        conn.poll()
+                        conn.notifies.clear()
+                    self._consume(cur)
+
+            except Exception as exc:
+                logger.error(f"Change feed error: {exc}. Reconnecting...")
+                time.sleep(1.0)
+
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _consume(self, cur):
+        cur.execute(
+            """
+            SELECT generation, table_name, op, doc_ids
+            FROM document_changes
+            WHERE generation > %s
+            ORDER BY generation
+            """,
+            (self.applied_generation,),
+        )
+        rows = cur.fetchall()
+        if not rows:
+            return
+
+        # Group by table so each index is rebuilt once per batch
+        changes_by_table: Dict[str, List[tuple]] = {}
+        for generation, table_name, op, doc_ids in rows:
+            changes_by_table.setdefault(table_name, []).append(
+                (generation, op, doc_ids)
+            )
+
+        for table_name, changes in changes_by_table.items():
+            try:
+                self._apply_table_changes(cur, table_name, changes)
+            except Exception as exc:
+                # Discard the index rather than serve it stale; it rebuilds on next use
+                logger.error(f"Failed to apply changes to '{table_name}': {exc}")
+                self._drop(table_name)
+
+            self.table_generations[table_name] = changes[-1][0]
+
+        self._advance(rows[-1][0])
+
+    def _apply_table_changes(self, cur, table_name, changes):
+        if any(op == "drop" for _, op, _ in changes):
+            self._drop(table_name)
+            return
+
+        # A single lookup; only the event loop changes the set of indexes
+        ranker = self.get_ranker(table_name)
+        if ranker is None:
+            # Not loaded; it will be built from a fresh snapshot on first use
+            return
+
+        upsert_ids = sorted({
+            doc_id
+            for _, op, doc_ids in changes if op == "upsert"
+            for doc_id in doc_ids
+        })
+
+        contents = {}
+        if upsert_ids:
+            cur.execute(
+                sql.SQL("SELECT id, content FROM {} WHERE id = ANY(%s)").format(
+                    sql.Identifier(table_name)
+                ),
+                (upsert_ids,),
+            )
+            contents = dict(cur.fetchall())
+
+        resolved_changes = []
+        for generation, op, doc_ids in changes:
+            if op == "upsert":
+                # Rows deleted by a later change are simply absent here
+                upserts = {
+                    doc_id: contents[doc_id]
+                    for doc_id in doc_ids if doc_id in contents
+                }
+                resolved_changes.append((generation, op, upserts, []))
+            else:
+                resolved_changes.append((generation, op, {}, list(doc_ids)))
+
+        ranker.apply_changes(resolved_changes)
+
+    def _drop(self, table_name: str):
+        self._loop.call_soon_threadsafe(self.drop_ranker, table_name)
+
+    def _advance(self, generation: int):
+        with self._lock:
+            if generation > self.applied_generation:
+                self.applied_generation = generation
+
+            for target, loop, future in self._waiters:
+                if target <= self.applied_generation:
+                    loop.call_soon_threadsafe(_resolve, future)
+
+    def table_generation(self, table_name: str) -> int:
+        return self.table_generations.get(table_name, 0)
+
+    def status(self) -> dict:
+        return {
+            "applied_generation": self.applied_generation,
+            "running": self._thread is not None and self._thread.is_alive(),
+        }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
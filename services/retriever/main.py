@@ -1,14 +1,24 @@
 import os
+import time
 import logging
 import asyncio
+from collections import OrderedDict
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import sql
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
 
+from catalog import DEFAULT_COLLECTION, DEFAULT_TABLE, resolve_table
+from changefeed import ChangeFeedConsumer
 from rankers.dense import DenseRanker
-from rankers.sparse import SparseRanker
+from rankers.sparse import SparseRanker, ensure_tokenizer
 from rankers.fuser import RRFMerger
+from common import debug, metrics, startup, tracing
+from common.singleflight import SingleFlight
 
 # ------------------------------------------------------------------
 # Setup
@@ -18,6 +28,10 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("retriever")
 app = FastAPI(title="Hybrid Retriever Service")
 
+tracer = tracing.Tracer("retriever")
+app.middleware("http")(tracer.middleware)
+app.include_router(debug.router)
+
 # ------------------------------------------------------------------
 # Database configuration
 # ------------------------------------------------------------------
@@ -33,10 +47,219 @@ DB_CONFIG = {
 # Component initialization
 # ------------------------------------------------------------------
 
-dense_ranker = DenseRanker(DB_CONFIG)
-sparse_ranker = SparseRanker(DB_CONFIG)
+# The model itself is loaded by the "model" startup phase
+dense_ranker = DenseRanker(
+    DB_CONFIG,
+    passage_overfetch=int(os.getenv("PASSAGE_OVERFETCH", "4")),
+    tracer=tracer,
+)
 merger = RRFMerger()
 
+# Identical concurrent searches share one execution
+search_flight = SingleFlight()
+
+debug.register_component(
+    "dense_model",
+    lambda: {
+        **debug.module_size(dense_ranker.model),
+        "dimension": dense_ranker.model.get_sentence_embedding_dimension(),
+    }
+    if dense_ranker.model is not None
+    else {"loaded": False},
+)
+debug.register_component(
+    "sparse_indexes",
+    lambda: {
+        table: ranker.memory_report(debug.deep_size)
+        for table, ranker in list(sparse_rankers.items())
+    },
+)
+
+# One BM25 index per collection table, evicted least-recently-used
+SPARSE_INDEX_CAPACITY = int(os.getenv("SPARSE_INDEX_CAPACITY", "8"))
+sparse_rankers: "OrderedDict[str, SparseRanker]" = OrderedDict()
+
+# ------------------------------------------------------------------
+# Metrics
+# ------------------------------------------------------------------
+
+STAGE_SECONDS = metrics.Histogram(
+    "retriever_stage_seconds",
+    "Time per search stage; batch searches are timed per batch.",
+    ["stage", "mode"],
+)
+EMBEDDING_BATCH_SIZE = metrics.Histogram(
+    "retriever_embedding_batch_size",
+    "Texts encoded per model call.",
+    ["endpoint"],
+    low=1,
+    high=4096,
+    per_octave=1,
+)
+SEARCHES = metrics.Counter(
+    "retriever_searches_total",
+    "Searches served, by whether they joined an identical in-flight search.",
+    ["result"],
+)
+APPLIED_GENERATION = metrics.Gauge(
+    "retriever_applied_generation",
+    "Last ingestion generation applied from the change feed.",
+)
+SPARSE_GENERATION = metrics.Gauge(
+    "retriever_sparse_index_generation",
+    "Ingestion generation each loaded sparse index reflects.",
+    ["table"],
+)
+SPARSE_DOCUMENTS = metrics.Gauge(
+    "retriever_sparse_index_documents",
+    "Documents in each loaded sparse index.",
+    ["table"],
+)
+STARTUP_PHASE_SECONDS = metrics.Gauge(
+    "retriever_startup_phase_seconds",
+    "Time each completed startup phase took.",
+    ["phase"],
+)
+READY = metrics.Gauge(
+    "retriever_ready",
+    "1 once every startup phase is done, else 0.",
+)
+
+
+@contextmanager
+def stage(name: str, mode: str):
+    """
+    Times a search stage into its histogram and, in a traced request,
+    as a span.
+    """
+    with tracer.span(name, mode=mode), STAGE_SECONDS.labels(name, mode).time():
+        yield
+
+
+def get_sparse_ranker(table: str) -> SparseRanker:
+    """
+    Returns the sparse ranker for a collection table.
+    A build is scheduled in the background the first time a table is seen.
+    """
+    ranker = sparse_rankers.get(table)
+    if ranker is not None:
+        sparse_rankers.move_to_end(table)
+        return ranker
+
+    ranker = SparseRanker(DB_CONFIG, table=table)
+    sparse_rankers[table] = ranker
+    ranker.build_task = asyncio.create_task(ranker.build_index_background())
+    SPARSE_GENERATION.labels(table).set_function(lambda: ranker.generation)
+    SPARSE_DOCUMENTS.labels(table).set_function(lambda: len(ranker.doc_ids))
+
+    while len(sparse_rankers) > SPARSE_INDEX_CAPACITY:
+        evicted = next(iter(sparse_rankers))
+        drop_sparse_ranker(evicted)
+        logger.info(f"Evicted sparse index for '{evicted}'.")
+
+    return ranker
+
+
+def drop_sparse_ranker(table: str):
+    sparse_rankers.pop(table, None)
+    SPARSE_GENERATION.remove(table)
+    SPARSE_DOCUMENTS.remove(table)
+
+
+# Keeps loaded sparse indexes in sync with ingestion writes
+change_feed = ChangeFeedConsumer(
+    DB_CONFIG,
+    get_ranker=sparse_rankers.get,
+    drop_ranker=drop_sparse_ranker,
+    poll_interval=float(os.getenv("CHANGEFEED_POLL_INTERVAL", "5.0")),
+)
+APPLIED_GENERATION.set_function(lambda: change_feed.applied_generation)
+
+
+def resolve_collection(collection: str) -> Optional[str]:
+    """
+    Resolves a collection or alias name to its table, or None.
+    """
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        return resolve_table(conn, collection)
+    finally:
+        conn.close()
+
+
+def lookup_table(collection: str) -> str:
+    """
+    Resolves a collection or alias name, raising 404 if it is unknown.
+    """
+    table = resolve_collection(collection)
+    if table is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Collection '{collection}' not found",
+        )
+    return table
+
+# ------------------------------------------------------------------
+# Startup phases
+# ------------------------------------------------------------------
+
+def check_database():
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        conn.cursor().execute("SELECT 1")
+    finally:
+        conn.close()
+
+
+async def build_default_index():
+    """
+    Builds the default collection's sparse index before the service
+    reports ready, so searches never see it empty. Raises if the build
+    failed, so the phase is retried.
+    """
+    ranker = sparse_rankers.get(DEFAULT_TABLE)
+    if ranker is None:
+        ranker = get_sparse_ranker(DEFAULT_TABLE)
+    elif not ranker.is_ready and not ranker.is_building:
+        ranker.build_task = asyncio.create_task(ranker.build_index_background())
+
+    await asyncio.shield(ranker.build_task)
+    if not ranker.is_ready:
+        raise RuntimeError(f"Sparse index for '{DEFAULT_TABLE}' failed to build")
+
+
+phases = startup.StartupPhases(
+    retry_delay=float(os.getenv("STARTUP_RETRY_DELAY", "5.0")),
+)
+phases.add("database", lambda: asyncio.to_thread(check_database))
+phases.add("model", lambda: asyncio.to_thread(dense_ranker.load))
+phases.add("warmup", lambda: asyncio.to_thread(dense_ranker.warm_up), after=["model"])
+phases.add("tokenizer", lambda: asyncio.to_thread(ensure_tokenizer))
+# The feed must start first so no change slips past an index snapshot
+phases.add(
+    "change_feed",
+    lambda: asyncio.to_thread(change_feed.start, asyncio.get_running_loop()),
+    after=["database"],
+)
+phases.add("sparse_index", build_default_index, after=["change_feed", "tokenizer"])
+
+for phase in phases.phases.values():
+    STARTUP_PHASE_SECONDS.labels(phase.name).set_function(lambda phase=phase: phase.seconds or 0.0)
+READY.set_function(lambda: phases.ready)
+
+
+def require_ready():
+    """
+    Rejects a request with 503 until startup has finished, for callers
+    that do not go through a readiness-aware load balancer.
+    """
+    if not phases.ready:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Starting up (pending: {', '.join(phases.pending())})",
+            headers={"Retry-After": "5"},
+        )
+
 # ------------------------------------------------------------------
 # Request models
 # ------------------------------------------------------------------
@@ -45,6 +268,26 @@ class SearchRequest(BaseModel):
     query: str
     k: int = 5
     profile: Optional[str] = "P1"
+    collection: str = DEFAULT_COLLECTION
+    # Adds stored document vectors and the query vector to the response,
+    # so the policy classifier does not have to re-encode them
+    include_embeddings: bool = False
+
+
+class BatchSearchRequest(BaseModel):
+    searches: List[SearchRequest]
+
+
+class WaitRequest(BaseModel):
+    generation: int
+    collection: Optional[str] = None
+    timeout: float = 30.0
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+    # Also report this collection's own generation
+    collection: Optional[str] = None
 
 # ------------------------------------------------------------------
 # Lifecycle events
@@ -52,84 +295,377 @@ class SearchRequest(BaseModel):
 
 @app.on_event("startup")
 async def startup_event():
-    # Start a non-blocking sparse index build on startup
-    asyncio.create_task(sparse_ranker.build_index_background())
+    tracer.start()
+
+    # Model loading, warm-up and the default index build run in the
+    # background, so the server answers liveness probes immediately
+    phases.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await phases.stop()
+    change_feed.stop()
+    await tracer.stop()
 
 # ------------------------------------------------------------------
 # Endpoints
 # ------------------------------------------------------------------
 
+@app.get("/health/live")
+async def health_live():
+    """
+    Liveness: the process is up and serving, ready or not.
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """
+    Readiness: startup phase states and timings, whether the model is
+    loaded and warmed up, and the applied change-feed and default sparse
+    index generations. 503 until every phase is done.
+    """
+    ranker = sparse_rankers.get(DEFAULT_TABLE)
+    report = {
+        **phases.report(),
+        "model_loaded": dense_ranker.model is not None,
+        "warmed_up": phases.done("warmup"),
+        "applied_generation": change_feed.applied_generation,
+        "sparse_index_generation": (
+            ranker.generation if ranker is not None and ranker.is_ready else None
+        ),
+    }
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
 @app.post("/refresh")
-async def refresh_index(background_tasks: BackgroundTasks):
+async def refresh_index(
+    background_tasks: BackgroundTasks,
+    collection: str = DEFAULT_COLLECTION,
+):
     """
-    Triggers a background rebuild of the sparse index.
+    Triggers a background rebuild of a collection's sparse index.
     Intended to be called after document ingestion.
     """
-    logger.info("Received index refresh request.")
-    background_tasks.add_task(sparse_ranker.build_index_background)
-    return {"status": "refresh_scheduled"}
+    logger.info(f"Received index refresh request (collection={collection}).")
+    require_ready()
+    table = lookup_table(collection)
 
-@app.post("/search")
-async def search(request: SearchRequest):
-    logger.info(f"Hybrid search request received: '{request.query}'")
+    ranker = sparse_rankers.get(table)
+    if ranker is None:
+        # First sighting schedules the build itself
+        get_sparse_ranker(table)
+    else:
+        background_tasks.add_task(ranker.build_index_background)
 
-    try:
-        # Fetch more candidates than requested to improve fusion quality
-        candidate_k = request.k * 2
+    return {"status": "refresh_scheduled", "collection": collection}
 
-        dense_hits = dense_ranker.search(request.query, k=candidate_k)
-        sparse_hits = sparse_ranker.search(request.query, k=candidate_k)
+@app.get("/generation")
+async def current_generation():
+    return change_feed.status()
 
-        logger.info(
-            f"Retrieved candidates | Dense: {len(dense_hits)}, "
-            f"Sparse: {len(sparse_hits)}"
+@app.post("/wait")
+async def wait_for_generation(request: WaitRequest):
+    """
+    Blocks until the given ingestion generation is searchable.
+
+    Dense search reads pgvector directly and is current on commit, so
+    this waits for the change feed to reach the generation and, if a
+    collection is given, for that collection's sparse index to be built.
+    """
+    require_ready()
+    deadline = time.monotonic() + request.timeout
+
+    if not await change_feed.wait_for(request.generation, request.timeout):
+        raise HTTPException(
+            status_code=504,
+            detail=f"Generation {request.generation} not applied in time",
         )
 
-        # Fuse dense and sparse results
-        merged_results = merger.merge(
-            dense_hits,
-            sparse_hits,
-            limit=request.k,
+    if request.collection:
+        ranker = get_sparse_ranker(lookup_table(request.collection))
+
+        if not ranker.is_ready and ranker.build_task is not None:
+            remaining = max(0.0, deadline - time.monotonic())
+            try:
+                await asyncio.wait_for(asyncio.shield(ranker.build_task), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+        if not ranker.is_ready:
+            raise HTTPException(
+                status_code=504,
+                detail=f"Sparse index for '{request.collection}' not ready in time",
+            )
+
+    return {"status": "ready", "generation": change_feed.applied_generation}
+
+@app.post("/embed")
+def embed(request: EmbedRequest):
+    """
+    Encodes texts with the dense model (unit-normalized), together with
+    the change-feed generation at encode time and, if a collection is
+    given, the generation of that collection's last change. Lets other
+    services reuse the retriever's model instead of loading their own.
+    """
+    require_ready()
+    generation = change_feed.applied_generation
+    collection_generation = None
+    if request.collection:
+        table = resolve_collection(request.collection)
+        # A collection that does not exist yet has never changed
+        collection_generation = change_feed.table_generation(table) if table else 0
+    EMBEDDING_BATCH_SIZE.labels("embed").observe(len(request.texts))
+    with tracer.span("embedding", batch_size=len(request.texts)):
+        embeddings = dense_ranker.model.encode(
+            request.texts,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
         )
+    return {
+        "embeddings": embeddings.tolist(),
+        "generation": generation,
+        "collection_generation": collection_generation,
+    }
 
-        # Fetch full document content for the ranked results
-        final_docs = fetch_documents(merged_results)
+@app.post("/search")
+async def search(request: SearchRequest):
+    logger.info(
+        f"Hybrid search request received "
+        f"(collection={request.collection}): '{request.query}'"
+    )
+
+    require_ready()
+    table = lookup_table(request.collection)
+    sparse_ranker = get_sparse_ranker(table)
 
-        return {"documents": final_docs}
+    try:
+        # Ranking is blocking work, so it runs off the event loop
+        result, shared = await search_flight.do(
+            f"{table}:{request.k}:{request.include_embeddings}:{request.query}",
+            lambda: asyncio.to_thread(
+                run_search,
+                request.query,
+                request.k,
+                table,
+                sparse_ranker,
+                request.include_embeddings,
+            ),
+        )
+        SEARCHES.labels("coalesced" if shared else "executed").inc()
+        if shared:
+            logger.info("Joined an identical in-flight search.")
+
+        return result
 
     except Exception as exc:
         logger.error(f"Search failed: {exc}")
         raise HTTPException(status_code=500, detail=str(exc))
 
+
+@app.post("/search/batch")
+async def search_batch(request: BatchSearchRequest):
+    """
+    Runs many searches in one call. Searches against the same table
+    share one embedding batch and one document fetch. Results come back
+    in request order; an unknown collection yields an error entry for
+    that search rather than failing the batch.
+    """
+    logger.info(f"Batch search request received ({len(request.searches)} searches)")
+    require_ready()
+
+    results: List[Optional[dict]] = [None] * len(request.searches)
+    tables: Dict[str, str] = {}
+    groups: Dict[tuple, List[int]] = {}
+
+    for index, search in enumerate(request.searches):
+        try:
+            if search.collection not in tables:
+                tables[search.collection] = lookup_table(search.collection)
+        except HTTPException as exc:
+            results[index] = {"error": exc.detail, "status": exc.status_code}
+            continue
+
+        key = (tables[search.collection], search.k, search.include_embeddings)
+        groups.setdefault(key, []).append(index)
+
+    try:
+        for (table, k, include_embeddings), indices in groups.items():
+            group_results = await asyncio.to_thread(
+                run_search_batch,
+                [request.searches[i].query for i in indices],
+                k,
+                table,
+                get_sparse_ranker(table),
+                include_embeddings,
+            )
+            for index, result in zip(indices, group_results):
+                results[index] = result
+
+        return {"results": results}
+
+    except Exception as exc:
+        logger.error(f"Batch search failed: {exc}")
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@app.get("/search/stats")
+async def search_stats():
+    return {"singleflight": search_flight.stats()}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Stage latency histograms, embedding batch sizes and index
+    generations in the Prometheus text format.
+    """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # ------------------------------------------------------------------
 # Helpers
 # ------------------------------------------------------------------
 
-def fetch_documents(ranked_results):
+def run_search(
+    query: str,
+    k: int,
+    table: str,
+    sparse_ranker: SparseRanker,
+    include_embeddings: bool = False,
+) -> dict:
     """
-    Fetches document content and metadata for ranked document IDs.
-    Preserves the ranking order.
+    Runs hybrid ranking for one query and returns the search response.
+    """
+    # Fetch more candidates than requested to improve fusion quality
+    candidate_k = k * 2
+
+    EMBEDDING_BATCH_SIZE.labels("search").observe(1)
+    with stage("embedding", "single"):
+        embedding = dense_ranker.encode([query])[0]
+    with stage("dense", "single"):
+        dense_hits = dense_ranker.search(
+            query, k=candidate_k, table=table, embedding=embedding
+        )
+    with stage("sparse", "single"):
+        sparse_hits = sparse_ranker.search(query, k=candidate_k)
+
+    logger.info(
+        f"Retrieved candidates | Dense: {len(dense_hits)}, "
+        f"Sparse: {len(sparse_hits)}"
+    )
+
+    # Fuse dense and sparse results
+    with stage("fusion", "single"):
+        merged_results = merger.merge(
+            dense_hits,
+            sparse_hits,
+            limit=k,
+        )
+
+    # Fetch full document content for the ranked results
+    with stage("fetch", "single"):
+        documents = fetch_documents(merged_results, table, include_embeddings)
+
+    result = {"documents": documents}
+    if include_embeddings:
+        result["query_embedding"] = embedding
+    return result
+
+
+def run_search_batch(
+    queries: List[str],
+    k: int,
+    table: str,
+    sparse_ranker: SparseRanker,
+    include_embeddings: bool = False,
+) -> List[dict]:
+    """
+    Batched run_search over one table. Returns one response per query.
+    """
+    candidate_k = k * 2
+
+    EMBEDDING_BATCH_SIZE.labels("search").observe(len(queries))
+    with stage("embedding", "batch"):
+        embeddings = dense_ranker.encode(queries)
+    with stage("dense", "batch"):
+        dense_batches = dense_ranker.search_batch(
+            queries, k=candidate_k, table=table, embeddings=embeddings
+        )
+    with stage("sparse", "batch"):
+        sparse_batches = [sparse_ranker.search(query, k=candidate_k) for query in queries]
+
+    with stage("fusion", "batch"):
+        merged_batches = [
+            merger.merge(dense_hits, sparse_hits, limit=k)
+            for dense_hits, sparse_hits in zip(dense_batches, sparse_batches)
+        ]
+
+    # One round trip for every document in the batch
+    with stage("fetch", "batch"):
+        doc_map = load_documents(
+            {result["id"] for merged in merged_batches for result in merged},
+            table,
+            include_embeddings,
+        )
+
+    results = []
+    for merged, embedding in zip(merged_batches, embeddings):
+        result = {"documents": assemble_documents(merged, doc_map)}
+        if include_embeddings:
+            result["query_embedding"] = embedding
+        results.append(result)
+    return results
+
+
+def fetch_documents(ranked_results, table=DEFAULT_TABLE, include_embeddings=False):
+    """
+    Fetches document content and metadata for ranked document IDs
+    from the given collection table. Preserves the ranking order.
     """
     if not ranked_results:
         return []
 
-    doc_ids = [result["id"] for result in ranked_results]
+    doc_map = load_documents(
+        [result["id"] for result in ranked_results], table, include_embeddings
+    )
+    return assemble_documents(ranked_results, doc_map)
+
+
+def load_documents(doc_ids, table=DEFAULT_TABLE, include_embeddings=False) -> dict:
+    """
+    Loads content and metadata for a set of document IDs, keyed by ID,
+    optionally with each document's stored vector.
+    """
+    if not doc_ids:
+        return {}
 
     conn = psycopg2.connect(**DB_CONFIG)
     cur = conn.cursor()
 
-    query = "SELECT id, content, metadata FROM documents WHERE id = ANY(%s)"
-    cur.execute(query, (doc_ids,))
+    query = sql.SQL(
+        "SELECT id, content, metadata, content_hash{} FROM {} WHERE id = ANY(%s)"
+    ).format(
+        sql.SQL(", embedding::real[]" if include_embeddings else ""),
+        sql.Identifier(table),
+    )
+    cur.execute(query, (list(doc_ids),))
     rows = cur.fetchall()
 
-    doc_map = {
-        row[0]: {
+    cur.close()
+    conn.close()
+
+    doc_map = {}
+    for row in rows:
+        doc_map[row[0]] = {
             "content": row[1],
             "metadata": row[2],
+            "content_hash": row[3],
         }
-        for row in rows
-    }
+        if include_embeddings:
+            doc_map[row[0]]["embedding"] = row[4]
+    return doc_map
+
 
+def assemble_documents(ranked_results, doc_map) -> list:
     final_output = []
     for result in ranked_results:
         doc_data = doc_map.get(result["id"])
@@ -139,11 +675,12 @@ def fetch_documents(ranked_results):
                     "id": result["id"],
                     "content": doc_data["content"],
                     "metadata": doc_data["metadata"],
+                    "content_hash": doc_data["content_hash"],
                     "score": result["score"],
                     "source_scores": result["source_scores"],
                 }
             )
+            if "embedding" in doc_data:
+                final_output[-1]["embedding"] = doc_data["embedding"]
 
-    cur.close()
-    conn.close()
     return final_output
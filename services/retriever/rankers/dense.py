@@ -1,50 +1,112 @@
 import logging
+from contextlib import nullcontext
+
 import psycopg2
-from sentence_transformers import SentenceTransformer
+from psycopg2 import sql
 
 logger = logging.getLogger("retriever.dense")
 
 
 class DenseRanker:
-    def __init__(self, db_config, model_path="./model_data"):
+    def __init__(self, db_config, model_path="./model_data", passage_overfetch=4, tracer=None):
         self.db_config = db_config
+        # Optional tracing.Tracer for spans around connect and kNN queries
+        self.tracer = tracer
+
+        # Passages fetched per requested document, so that documents with
+        # several matching passages do not crowd others out of the top k
+        self.passage_overfetch = passage_overfetch
+
+        # Loaded by load() during startup, not at construction
+        self.model_path = model_path
+        self.model = None
+
+    def load(self):
+        """
+        Imports sentence-transformers (and with it torch) and loads the
+        model. Blocking; run it off the event loop.
+        """
+        from sentence_transformers import SentenceTransformer
 
         logger.info("Loading dense ranking model...")
-        self.model = SentenceTransformer(model_path, device="cpu")
+        self.model = SentenceTransformer(self.model_path, device="cpu")
         logger.info("Dense ranker initialized.")
 
+    def warm_up(self, batch_sizes=(1, 8)):
+        """
+        Encodes throwaway batches so that lazy kernel and allocator
+        initialization is paid here instead of by the first queries.
+        """
+        for size in batch_sizes:
+            self.encode(["warm-up query"] * size)
+
     def _get_connection(self):
-        return psycopg2.connect(**self.db_config)
+        with self._span("db_connect"):
+            return psycopg2.connect(**self.db_config)
 
-    def search(self, query: str, k: int = 20) -> list:
+    def _span(self, name: str, **tags):
+        return self.tracer.span(name, **tags) if self.tracer else nullcontext()
+
+    def encode(self, texts: list) -> list:
+        """
+        Encodes texts to unit-normalized vectors, as plain lists.
         """
-        Performs semantic search using pgvector.
+        return self.model.encode(texts, normalize_embeddings=True).tolist()
+
+    def search(
+        self,
+        query: str,
+        k: int = 20,
+        table: str = "documents",
+        embedding: list = None,
+    ) -> list:
+        """
+        Performs semantic search using pgvector over the passages of the
+        given collection table, aggregating passage hits to documents.
+        A precomputed query embedding skips encoding.
 
         Returns a list of dictionaries with keys:
         - id: document identifier
-        - score: similarity score
+        - score: similarity score of the document's best passage
+        - passage: ordinal of that passage within the document
         """
         try:
-            embedding = self.model.encode(query).tolist()
+            if embedding is None:
+                embedding = self.encode([query])[0]
 
             conn = self._get_connection()
             cur = conn.cursor()
+            results = self._search_embedding(cur, embedding, k, table)
 
-            # pgvector cosine distance returns a distance value,
-            # so similarity is computed as (1 - distance)
-            cur.execute(
-                """
-                SELECT id, 1 - (embedding <=> %s::vector) AS score
-                FROM documents
-                ORDER BY embedding <=> %s::vector
-                LIMIT %s
-                """,
-                (embedding, embedding, k),
-            )
+            cur.close()
+            conn.close()
+            return results
 
+        except Exception as exc:
+            logger.error(f"Dense search failed: {exc}")
+            return []
+
+    def search_batch(
+        self,
+        queries: list,
+        k: int = 20,
+        table: str = "documents",
+        embeddings: list = None,
+    ) -> list:
+        """
+        Runs several searches against one table, encoding all queries in a
+        single model call (unless given) and sharing one connection.
+        Returns one result list per query, in order.
+        """
+        try:
+            if embeddings is None:
+                embeddings = self.encode(queries)
+
+            conn = self._get_connection()
+            cur = conn.cursor()
             results = [
-                {"id": row[0], "score": float(row[1])}
-                for row in cur.fetchall()
+                self._search_embedding(cur, embedding, k, table)
+                for embedding in embeddings
             ]
 
             cur.close()
@@ -52,5 +114,36 @@ class DenseRanker:
             return results
 
         except Exception as exc:
-            logger.error(f"Dense search failed: {exc}")
-            return []
+            logger.error(f"Dense batch search failed: {exc}")
+            return [[] for _ in queries]
+
+    def _search_embedding(self, cur, embedding: list, k: int, table: str) -> list:
+        # pgvector cosine distance returns a distance value,
+        # so similarity is computed as (1 - distance)
+        with self._span("knn_sql", table=table, limit=k * self.passage_overfetch):
+            cur.execute(
+                sql.SQL("""
+                    SELECT doc_id, ordinal, 1 - (embedding <=> %s::vector) AS score
+                    FROM {}
+                    ORDER BY embedding <=> %s::vector
+                    LIMIT %s
+                    """
+                ).format(sql.Identifier(f"{table}_passages")),
+                (embedding, embedding, k * self.passage_overfetch),
+            )
+            rows = cur.fetchall()
+
+        # Rows arrive best-first, so the first hit per document is its max
+        results = []
+        seen = set()
+        for doc_id, ordinal, score in rows:
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            results.append(
+                {"id": doc_id, "score": float(score), "passage": ordinal}
+            )
+            if len(results) == k:
+                break
+
+        return results
@@ -25,6 +25,10 @@ class RRFMerger:
             else:
                 metadata[doc_id]["dense_rank"] = rank + 1
 
+            # Best-matching passage when documents are chunked
+            if "passage" in item:
+                metadata[doc_id]["dense_passage"] = item["passage"]
+
         # Process sparse retrieval results
         for rank, item in enumerate(sparse_results):
             doc_id = item["id"]
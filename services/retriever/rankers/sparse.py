@@ -1,27 +1,50 @@
 import logging
+import threading
 import psycopg2
+from psycopg2 import sql
 import asyncio
 from rank_bm25 import BM25Okapi
 from nltk.tokenize import word_tokenize
 import nltk
 
-# Ensure required NLTK resources are available
-try:
-    nltk.data.find("tokenizers/punkt")
-except LookupError:
-    nltk.download("punkt", quiet=True)
-
 logger = logging.getLogger("retriever.sparse")
 
 
+def ensure_tokenizer():
+    """
+    Downloads the NLTK tokenizer data if missing and checks that it
+    loads. Blocking (it may hit the network), so it runs as a startup
+    phase rather than at import.
+    """
+    try:
+        nltk.data.find("tokenizers/punkt")
+    except LookupError:
+        nltk.download("punkt", quiet=True)
+
+    # Raises LookupError if the data is still unavailable
+    word_tokenize("warm up")
+
+
 class SparseRanker:
-    def __init__(self, db_config):
+    def __init__(self, db_config, table="documents"):
         self.db_config = db_config
+        self.table = table
         self.bm25 = None
         self.doc_ids = []
         self.is_ready = False
         self.is_building = False
 
+        # Tokenized corpus keyed by document ID, kept so that change-feed
+        # updates only tokenize the documents that actually changed
+        self.doc_tokens = {}
+
+        # Highest change-feed generation reflected in the index
+        self.generation = 0
+
+        self.build_task = None
+        self._lock = threading.Lock()
+        self._pending_changes = []
+
     def _get_connection(self):
         return psycopg2.connect(**self.db_config)
 
@@ -30,34 +53,58 @@ class SparseRanker:
         Blocking method that fetches documents and builds the BM25 index.
         Intended to be executed in a background thread.
         """
-        logger.info("Starting BM25 index build...")
+        logger.info(f"Starting BM25 index build for '{self.table}'...")
         try:
             conn = self._get_connection()
+            conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
             cur = conn.cursor()
 
-            cur.execute("SELECT id, content FROM documents")
+            # Both reads share one snapshot, so the generation matches the rows
+            cur.execute("SELECT COALESCE(MAX(generation), 0) FROM document_changes")
+            snapshot_generation = cur.fetchone()[0]
+
+            cur.execute(
+                sql.SQL("SELECT id, content FROM {}").format(
+                    sql.Identifier(self.table)
+                )
+            )
             rows = cur.fetchall()
 
-            self.doc_ids = [row[0] for row in rows]
-            corpus = [row[1] for row in rows]
+            cur.close()
+            conn.close()
+
+            doc_tokens = {
+                row[0]: word_tokenize(row[1].lower()) for row in rows
+            }
+
+            with self._lock:
+                self.doc_tokens = doc_tokens
+                self.generation = snapshot_generation
+
+                # Replay changes that were committed after the snapshot
+                pending = [
+                    change for change in self._pending_changes
+                    if change[0] > snapshot_generation
+                ]
+                self._pending_changes = []
+                self._apply_locked(pending)
+                self._rebuild_locked()
 
-            tokenized_corpus = [word_tokenize(text.lower()) for text in corpus]
-            self.bm25 = BM25Okapi(tokenized_corpus)
+                self.is_ready = True
 
-            self.is_ready = True
             logger.info(
-                f"Sparse index built successfully with {len(self.doc_ids)} documents."
+                f"Sparse index for '{self.table}' built successfully "
+                f"with {len(self.doc_ids)} documents."
             )
 
-            cur.close()
-            conn.close()
-
         except Exception as exc:
-            logger.error(f"Failed to build sparse index: {exc}")
+            logger.error(f"Failed to build sparse index for '{self.table}': {exc}")
             self.is_ready = False
 
         finally:
-            self.is_building = False
+            with self._lock:
+                self._pending_changes = []
+                self.is_building = False
 
     async def build_index_background(self):
         """
@@ -72,6 +119,56 @@ class SparseRanker:
         loop = asyncio.get_event_loop()
         await loop.run_in_executor(None, self._build_index_sync)
 
+    def apply_changes(self, changes):
+        """
+        Applies change-feed events to the live index.
+
+        Each change is a tuple of (generation, op, upserts, deleted_ids),
+        where upserts maps document IDs to their current content. Changes
+        arriving during a rebuild are also buffered and replayed on top of
+        the rebuilt snapshot.
+        """
+        with self._lock:
+            if self.is_building:
+                self._pending_changes.extend(changes)
+
+            # Until the first build completes there is no live index to patch
+            if not self.is_ready:
+                return
+
+            changes = [change for change in changes if change[0] > self.generation]
+            if not changes:
+                return
+
+            self._apply_locked(changes)
+            self._rebuild_locked()
+
+        logger.info(
+            f"Applied {len(changes)} change(s) to sparse index '{self.table}' "
+            f"(generation={self.generation})."
+        )
+
+    def _apply_locked(self, changes):
+        for generation, op, upserts, deleted_ids in changes:
+            if op == "truncate":
+                self.doc_tokens = {}
+
+            for doc_id in deleted_ids:
+                self.doc_tokens.pop(doc_id, None)
+
+            for doc_id, content in upserts.items():
+                self.doc_tokens[doc_id] = word_tokenize(content.lower())
+
+            self.generation = max(self.generation, generation)
+
+    def _rebuild_locked(self):
+        # BM25Okapi has no incremental API, but rebuilding from cached
+        # tokens avoids the database round trip and re-tokenization
+        self.doc_ids = list(self.doc_tokens.keys())
+        self.bm25 = (
+            BM25Okapi(list(self.doc_tokens.values())) if self.doc_tokens else None
+        )
+
     def search(self, query: str, k: int = 20) -> list:
         """
         Performs keyword search using BM25.
@@ -84,10 +181,17 @@ class SparseRanker:
             logger.warning("Sparse index is not ready. Returning empty results.")
             return []
 
+        # Snapshot both fields together so a concurrent update cannot misalign them
+        with self._lock:
+            bm25, doc_ids = self.bm25, self.doc_ids
+
+        if bm25 is None:
+            return []
+
         tokenized_query = word_tokenize(query.lower())
-        scores = self.bm25.get_scores(tokenized_query)
+        scores = bm25.get_scores(tokenized_query)
 
-        doc_scores = zip(self.doc_ids, scores)
+        doc_scores = zip(doc_ids, scores)
         top_docs = sorted(
             doc_scores,
             key=lambda item: item[1],
@@ -99,3 +203,19 @@ class SparseRanker:
             for doc_id, score in top_docs
             if score > 0
         ]
+
+    def memory_report(self, deep_size) -> dict:
+        """
+        Index counts and the sizes of the BM25 index and the cached token
+        lists, as measured by `deep_size`. Changes wait while it runs.
+        """
+        with self._lock:
+            return {
+                "ready": self.is_ready,
+                "generation": self.generation,
+                "documents": len(self.doc_ids),
+                "vocabulary": len(self.bm25.idf) if self.bm25 is not None else 0,
+                "tokens": sum(len(tokens) for tokens in self.doc_tokens.values()),
+                "bm25": deep_size(self.bm25),
+                "doc_tokens": deep_size(self.doc_tokens),
+            }